@@ -0,0 +1,189 @@
+"""Functions used to record and query the compile and link times of build targets"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+base_folder_path = str(Path(__file__).parent) + "/"
+
+HISTORY_FILENAME = ".scons_compile_history.json"
+# Number of builds kept in the history, oldest ones are dropped first.
+MAX_BUILDS = 20
+
+SOURCE_EXTENSIONS = (".c", ".cc", ".cpp", ".cxx", ".c++", ".m", ".mm", ".s")
+INPUT_EXTENSIONS = (".o", ".obj", ".a", ".lib", ".res")
+
+
+def get_history_path() -> str:
+    return base_folder_path + HISTORY_FILENAME
+
+
+def normalize_path(path: str) -> str:
+    """Returns `path` relative to the root (if it's inside it), with forward slashes."""
+    path = os.path.abspath(path.strip("\"'"))
+    if path.startswith(os.path.abspath(base_folder_path) + os.sep):
+        path = os.path.relpath(path, base_folder_path)
+    return path.replace("\\", "/")
+
+
+def parse_command(args: List[str]) -> Optional[Tuple[str, str, str]]:
+    """
+    Returns the kind (`"compile"` or `"link"`), path and flags hash of the target built by
+    the command `args`, or `None` if it's neither. Compiles are identified by their source,
+    links by their output. The hash covers all arguments except these paths, so that
+    the same target built with different flags is recorded separately.
+    """
+    args = [x.strip("\"'") for x in args]
+    lower = [x.lower() for x in args]
+    output = None
+    skip = set()
+    for i, arg in enumerate(args):
+        if arg == "-o" and i + 1 < len(args):
+            output = i + 1
+        elif (arg.startswith("/Fo") and len(arg) > 3) or lower[i].startswith("/out:"):
+            output = i
+    if output is not None:
+        skip.add(output)
+
+    if "-c" in args or "/c" in lower:
+        sources = [i for i in range(1, len(args)) if lower[i].endswith(SOURCE_EXTENSIONS) and i != output]
+        if len(sources) != 1:
+            return None
+        kind, path = "compile", args[sources[0]]
+        skip.add(sources[0])
+    elif output is not None and any(x.endswith(INPUT_EXTENSIONS) for x in lower[1:]):
+        if lower[output].endswith((".o", ".obj")):
+            return None
+        kind, path = "link", args[output].split(":", 1)[1] if lower[output].startswith("/out:") else args[output]
+    else:
+        return None
+
+    flags = " ".join(x for i, x in enumerate(args) if i not in skip)
+    return kind, normalize_path(path), hashlib.sha256(flags.encode()).hexdigest()[:16]
+
+
+def posix_spawn_with_rusage(sh, escape, cmd, args, env) -> Tuple[int, Optional[int]]:
+    """
+    Same as the POSIX spawn of SCons, but also returns the peak RSS (in bytes) of the
+    command, which includes the processes it waited for (such as the compiler proper).
+    """
+    proc = subprocess.Popen([sh, "-c", " ".join(args)], env=env, close_fds=True)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    # Reported in KiB on Linux and the BSDs, but in bytes on macOS.
+    rss = rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return proc.returncode, rss
+
+
+class CompileHistory:
+    """Records the targets built by the commands spawned by SCons, for a single build."""
+
+    def __init__(self, path: str = ""):
+        self.path = path or get_history_path()
+        self.started = time.time()
+        self.targets: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def wrap_spawn(self, spawn):
+        """Returns a spawn function calling `spawn`, recording the targets it builds."""
+        measure_rss = False
+        if hasattr(os, "wait4"):
+            try:
+                from SCons.Platform.posix import subprocess_spawn
+
+                measure_rss = spawn is subprocess_spawn
+            except ImportError:
+                pass
+
+        def history_spawn(sh, escape, cmd, args, env):
+            target = parse_command(args)
+            if target is None:
+                return spawn(sh, escape, cmd, args, env)
+
+            start = time.perf_counter()
+            if measure_rss:
+                ret, rss = posix_spawn_with_rusage(sh, escape, cmd, args, env)
+            else:
+                ret, rss = spawn(sh, escape, cmd, args, env), None
+            duration = time.perf_counter() - start
+            if ret == 0:
+                self.add(*target, duration, rss)
+            return ret
+
+        return history_spawn
+
+    def add(self, kind: str, path: str, flags: str, duration: float, rss: Optional[int] = None):
+        with self.lock:
+            self.targets.append({"kind": kind, "path": path, "flags": flags, "time": round(duration, 3), "rss": rss})
+
+    def save(self, command: str = ""):
+        """Appends the targets recorded to the history file, if any."""
+        if not self.targets:
+            return
+        builds = load_builds(self.path)
+        builds.append(
+            {
+                "started": round(self.started),
+                "command": command,
+                "targets": sorted(self.targets, key=lambda x: (x["kind"], x["path"], x["flags"])),
+            }
+        )
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8", newline="\n") as file:
+            json.dump({"builds": builds[-MAX_BUILDS:]}, file, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+
+def load_builds(path: str = "") -> List[Dict[str, Any]]:
+    """Returns the builds recorded in the history file, from the oldest to the latest."""
+    try:
+        with open(path or get_history_path(), "r", encoding="utf-8") as file:
+            return cast(List[Dict[str, Any]], json.load(file)["builds"])
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def get_latest_targets(builds: List[Dict[str, Any]], kind: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Returns the latest record of each target path of `builds` (of the given kind, if any)."""
+    latest = {}
+    for build in builds:
+        for target in build["targets"]:
+            if kind is None or target["kind"] == kind:
+                latest[target["path"]] = target
+    return latest
+
+
+def get_compile_times(path: str = "") -> Dict[str, float]:
+    """Returns the latest compile time (in seconds) of each source, by path relative to the root."""
+    return {k: v["time"] for k, v in get_latest_targets(load_builds(path), "compile").items()}
+
+
+def compare_builds(old: Dict[str, Any], new: Dict[str, Any]) -> List[Tuple[str, str, float, float]]:
+    """
+    Returns the kind, path, old and new times of the targets built with the same flags
+    in both `old` and `new`, from the largest regression to the largest improvement.
+    """
+    old_times = {(x["kind"], x["path"], x["flags"]): x["time"] for x in old["targets"]}
+    changes = []
+    for target in new["targets"]:
+        key = (target["kind"], target["path"], target["flags"])
+        if key in old_times:
+            changes.append((target["kind"], target["path"], old_times[key], target["time"]))
+    changes.sort(key=lambda x: (x[2] - x[3], x[1]))
+    return changes
+
+
+def get_directory_totals(targets: Dict[str, Dict[str, Any]], depth: int = 2) -> Dict[str, Tuple[int, float]]:
+    """Returns the number of targets and their total time, by directory truncated to `depth` levels."""
+    totals: Dict[str, Tuple[int, float]] = {}
+    for path, target in targets.items():
+        directory = "/".join(path.split("/")[:-1][:depth]) or "."
+        count, total = totals.get(directory, (0, 0.0))
+        totals[directory] = (count + 1, total + target["time"])
+    return totals
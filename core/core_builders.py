@@ -1,6 +1,6 @@
 """Functions used to generate source files during build time"""
 
-import zlib
+from methods import compress_buffer, embed_buffer, get_embed_compression_mode
 
 
 def escape_string(s):
@@ -30,9 +30,9 @@ def make_certs_header(target, source, env):
         buf = f.read()
         decomp_size = len(buf)
 
-        # Use maximum zlib compression level to further reduce file size
-        # (at the cost of initial build times).
-        buf = zlib.compress(buf, zlib.Z_BEST_COMPRESSION)
+        # Use a high compression level to further reduce file size
+        # (at the cost of initial build times, mitigated by the compression cache).
+        buf = compress_buffer(env, buf)
 
         g.write("/* THIS FILE IS GENERATED DO NOT EDIT */\n")
         g.write("#ifndef CERTS_COMPRESSED_GEN_H\n")
@@ -44,12 +44,11 @@ def make_certs_header(target, source, env):
         if env["builtin_certs"]:
             # Defined here and not in env so changing it does not trigger a full rebuild.
             g.write("#define BUILTIN_CERTS_ENABLED\n")
+            g.write('#include "core/io/compression.h"\n')
             g.write("static const int _certs_compressed_size = " + str(len(buf)) + ";\n")
             g.write("static const int _certs_uncompressed_size = " + str(decomp_size) + ";\n")
-            g.write("static const unsigned char _certs_compressed[] = {\n")
-            for i in range(len(buf)):
-                g.write("\t" + str(buf[i]) + ",\n")
-            g.write("};\n")
+            g.write(f"static const Compression::Mode _certs_compression_mode = {get_embed_compression_mode(env)};\n")
+            g.write(embed_buffer(env, dst, "_certs_compressed", buf))
         g.write("#endif // CERTS_COMPRESSED_GEN_H")
 
 
@@ -1,4 +1,4 @@
-import zlib
+from methods import compress_buffer, embed_buffer, get_embed_compression_mode
 
 
 def run(target, source, env):
@@ -8,9 +8,9 @@ def run(target, source, env):
         buf = f.read()
         decomp_size = len(buf)
 
-        # Use maximum zlib compression level to further reduce file size
-        # (at the cost of initial build times).
-        buf = zlib.compress(buf, zlib.Z_BEST_COMPRESSION)
+        # Use a high compression level to further reduce file size
+        # (at the cost of initial build times, mitigated by the compression cache).
+        buf = compress_buffer(env, buf)
 
         g.write(
             """/* THIS FILE IS GENERATED DO NOT EDIT */
@@ -28,10 +28,12 @@ def run(target, source, env):
 
         g.write("static const int _gdextension_interface_data_compressed_size = " + str(len(buf)) + ";\n")
         g.write("static const int _gdextension_interface_data_uncompressed_size = " + str(decomp_size) + ";\n")
-        g.write("static const unsigned char _gdextension_interface_data_compressed[] = {\n")
-        for i in range(len(buf)):
-            g.write("\t" + str(buf[i]) + ",\n")
-        g.write("};\n")
+        g.write(embed_buffer(env, dst, "_gdextension_interface_data_compressed", buf))
+        g.write(
+            "static const Compression::Mode _gdextension_interface_data_compression_mode = "
+            + get_embed_compression_mode(env)
+            + ";\n"
+        )
 
         g.write(
             """
@@ -42,7 +44,7 @@ class GDExtensionInterfaceDump {
             ERR_FAIL_COND_MSG(fa.is_null(), vformat("Cannot open file '%s' for writing.", p_path));
             Vector<uint8_t> data;
             data.resize(_gdextension_interface_data_uncompressed_size);
-            int ret = Compression::decompress(data.ptrw(), _gdextension_interface_data_uncompressed_size, _gdextension_interface_data_compressed, _gdextension_interface_data_compressed_size, Compression::MODE_DEFLATE);
+            int ret = Compression::decompress(data.ptrw(), _gdextension_interface_data_uncompressed_size, _gdextension_interface_data_compressed, _gdextension_interface_data_compressed_size, _gdextension_interface_data_compression_mode);
             ERR_FAIL_COND_MSG(ret == -1, "Compressed file is corrupt.");
             fa->store_buffer(data.ptr(), data.size());
         };
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+
+# This script packs the XML class reference into a pre-parsed binary format. Classes are
+# located through a sorted index and their strings are shared in a table, so a single
+# class can be decoded without inflating and parsing the whole reference.
+#
+# Layout (little-endian, `uint` are LEB128 varints):
+# - Header: magic "GDDB", version, class count, string count (`<4sIII`).
+# - Class index, sorted by name: name string ID, record offset and size (`<III` each).
+# - String table: end offset of each string in the string data (`<I` each), then the
+#   UTF-8 string data. String IDs start at 1; 0 stands for a missing (`None`) value.
+# - Class records, laid out as written by `write_class`. The path of the XML file a class
+#   was parsed from (`ClassDef.filepath`) isn't stored, as it depends on the checkout; it's
+#   left empty when reading.
+
+import argparse
+import os
+import struct
+import sys
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from make_rst import (
+    AnnotationDef,
+    ClassDef,
+    ConstantDef,
+    EnumDef,
+    MethodDef,
+    ParameterDef,
+    PropertyDef,
+    SignalDef,
+    State,
+    ThemeItemDef,
+    TypeName,
+)
+
+MAGIC = b"GDDB"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+INDEX_ENTRY = struct.Struct("<III")
+OFFSET = struct.Struct("<I")
+
+
+class StringTable:
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        if value not in self.ids:
+            self.strings.append(value)
+            self.ids[value] = len(self.strings)
+        return self.ids[value]
+
+
+class Writer:
+    def __init__(self, strings: StringTable) -> None:
+        self.strings = strings
+        self.data = bytearray()
+
+    def uint(self, value: int) -> None:
+        while value > 0x7F:
+            self.data.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.data.append(value)
+
+    def string(self, value: Optional[str]) -> None:
+        self.uint(self.strings.add(value))
+
+    def type_name(self, value: TypeName) -> None:
+        self.string(value.type_name)
+        self.string(value.enum)
+        self.uint(value.is_bitfield)
+
+    def status(self, deprecated: Optional[str], experimental: Optional[str]) -> None:
+        self.string(deprecated)
+        self.string(experimental)
+
+
+class Reader:
+    def __init__(self, doc: "DocBinary", offset: int) -> None:
+        self.doc = doc
+        self.data = doc.data
+        self.offset = offset
+
+    def uint(self) -> int:
+        value = 0
+        shift = 0
+        while True:
+            byte = self.data[self.offset]
+            self.offset += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def string(self) -> Optional[str]:
+        return self.doc.string(self.uint())
+
+    def type_name(self) -> TypeName:
+        return TypeName(self.string() or "", self.string(), bool(self.uint()))
+
+
+def write_parameters(w: Writer, parameters: List[ParameterDef]) -> None:
+    w.uint(len(parameters))
+    for parameter in parameters:
+        w.string(parameter.name)
+        w.type_name(parameter.type_name)
+        w.string(parameter.default_value)
+
+
+def read_parameters(r: Reader) -> List[ParameterDef]:
+    return [ParameterDef(r.string() or "", r.type_name(), r.string()) for _ in range(r.uint())]
+
+
+def write_constant(w: Writer, constant: ConstantDef) -> None:
+    w.string(constant.name)
+    w.string(constant.value)
+    w.string(constant.text)
+    w.uint(constant.is_bitfield)
+    w.status(constant.deprecated, constant.experimental)
+
+
+def read_constant(r: Reader) -> ConstantDef:
+    constant = ConstantDef(r.string() or "", r.string() or "", r.string(), bool(r.uint()))
+    constant.deprecated, constant.experimental = r.string(), r.string()
+    return constant
+
+
+def write_methods(w: Writer, methods: Dict[str, List[MethodDef]]) -> None:
+    # Overloads are flattened; they are grouped by name again when reading.
+    overloads = [method for name in methods for method in methods[name]]
+    w.uint(len(overloads))
+    for method in overloads:
+        w.string(method.name)
+        w.type_name(method.return_type)
+        write_parameters(w, method.parameters)
+        w.string(method.description)
+        w.string(method.qualifiers)
+        w.status(method.deprecated, method.experimental)
+
+
+def read_methods(r: Reader, definition_name: str) -> Dict[str, List[MethodDef]]:
+    methods: Dict[str, List[MethodDef]] = {}
+    for _ in range(r.uint()):
+        method = MethodDef(r.string() or "", r.type_name(), read_parameters(r), r.string(), r.string())
+        method.definition_name = definition_name
+        method.deprecated, method.experimental = r.string(), r.string()
+        methods.setdefault(method.name, []).append(method)
+    return methods
+
+
+def write_class(w: Writer, class_def: ClassDef) -> None:
+    w.string(class_def.name)
+    w.string(class_def.inherits)
+    w.string(class_def.brief_description)
+    w.string(class_def.description)
+    w.string(class_def.keywords)
+    w.status(class_def.deprecated, class_def.experimental)
+
+    w.uint(len(class_def.tutorials))
+    for link, title in class_def.tutorials:
+        w.string(link)
+        w.string(title)
+
+    w.uint(len(class_def.constants))
+    for constant in class_def.constants.values():
+        write_constant(w, constant)
+
+    w.uint(len(class_def.enums))
+    for enum in class_def.enums.values():
+        w.string(enum.name)
+        w.type_name(enum.type_name)
+        w.uint(enum.is_bitfield)
+        w.uint(len(enum.values))
+        for constant in enum.values.values():
+            write_constant(w, constant)
+
+    w.uint(len(class_def.properties))
+    for prop in class_def.properties.values():
+        w.string(prop.name)
+        w.type_name(prop.type_name)
+        w.string(prop.setter)
+        w.string(prop.getter)
+        w.string(prop.text)
+        w.string(prop.default_value)
+        w.string(prop.overrides)
+        w.status(prop.deprecated, prop.experimental)
+
+    write_methods(w, class_def.constructors)
+    write_methods(w, class_def.methods)
+    write_methods(w, class_def.operators)
+
+    w.uint(len(class_def.signals))
+    for signal in class_def.signals.values():
+        w.string(signal.name)
+        write_parameters(w, signal.parameters)
+        w.string(signal.description)
+        w.status(signal.deprecated, signal.experimental)
+
+    annotations = [annotation for name in class_def.annotations for annotation in class_def.annotations[name]]
+    w.uint(len(annotations))
+    for annotation in annotations:
+        w.string(annotation.name)
+        write_parameters(w, annotation.parameters)
+        w.string(annotation.description)
+        w.string(annotation.qualifiers)
+
+    w.uint(len(class_def.theme_items))
+    for theme_item in class_def.theme_items.values():
+        w.string(theme_item.name)
+        w.type_name(theme_item.type_name)
+        w.string(theme_item.data_name)
+        w.string(theme_item.text)
+        w.string(theme_item.default_value)
+
+
+def read_class(r: Reader) -> ClassDef:
+    class_def = ClassDef(r.string() or "")
+    class_def.inherits = r.string()
+    class_def.brief_description = r.string()
+    class_def.description = r.string()
+    class_def.keywords = r.string()
+    class_def.deprecated, class_def.experimental = r.string(), r.string()
+
+    for _ in range(r.uint()):
+        class_def.tutorials.append((r.string() or "", r.string() or ""))
+
+    for _ in range(r.uint()):
+        constant = read_constant(r)
+        class_def.constants[constant.name] = constant
+
+    for _ in range(r.uint()):
+        enum = EnumDef(r.string() or "", r.type_name(), False)
+        enum.is_bitfield = bool(r.uint())
+        for _ in range(r.uint()):
+            constant = read_constant(r)
+            enum.values[constant.name] = constant
+        class_def.enums[enum.name] = enum
+
+    for _ in range(r.uint()):
+        prop = PropertyDef(r.string() or "", r.type_name(), r.string(), r.string(), r.string(), r.string(), r.string())
+        prop.deprecated, prop.experimental = r.string(), r.string()
+        class_def.properties[prop.name] = prop
+
+    class_def.constructors.update(read_methods(r, "constructor"))
+    class_def.methods.update(read_methods(r, "method"))
+    class_def.operators.update(read_methods(r, "operator"))
+
+    for _ in range(r.uint()):
+        signal = SignalDef(r.string() or "", read_parameters(r), r.string())
+        signal.deprecated, signal.experimental = r.string(), r.string()
+        class_def.signals[signal.name] = signal
+
+    for _ in range(r.uint()):
+        annotation = AnnotationDef(r.string() or "", read_parameters(r), r.string(), r.string())
+        class_def.annotations.setdefault(annotation.name, []).append(annotation)
+
+    for _ in range(r.uint()):
+        theme_item = ThemeItemDef(r.string() or "", r.type_name(), r.string() or "", r.string(), r.string())
+        class_def.theme_items[theme_item.name] = theme_item
+
+    return class_def
+
+
+def pack_classes(classes: Dict[str, ClassDef]) -> bytes:
+    strings = StringTable()
+    # Class names come first, so the ones compared when searching the index are close together.
+    names = sorted(classes, key=lambda name: name.encode("utf-8"))
+    for name in names:
+        strings.add(name)
+
+    records = []
+    for name in names:
+        w = Writer(strings)
+        write_class(w, classes[name])
+        records.append(bytes(w.data))
+
+    string_data = [string.encode("utf-8") for string in strings.strings]
+    string_offsets = []
+    end = 0
+    for string in string_data:
+        end += len(string)
+        string_offsets.append(OFFSET.pack(end))
+
+    offset = HEADER.size + INDEX_ENTRY.size * len(names) + OFFSET.size * len(string_data) + sum(map(len, string_data))
+    index = []
+    for name, record in zip(names, records):
+        index.append(INDEX_ENTRY.pack(strings.ids[name], offset, len(record)))
+        offset += len(record)
+
+    header = HEADER.pack(MAGIC, VERSION, len(names), len(string_data))
+    return b"".join([header] + index + string_offsets + string_data + records)
+
+
+class DocBinary:
+    def __init__(self, data: bytes) -> None:
+        magic, version, self.class_count, self.string_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a version {} binary class reference.".format(VERSION))
+
+        self.data = data
+        self.index_offset = HEADER.size
+        self.string_offsets_offset = self.index_offset + INDEX_ENTRY.size * self.class_count
+        self.string_data_offset = self.string_offsets_offset + OFFSET.size * self.string_count
+        self._strings: Dict[int, str] = {}
+        self._names: Optional[List[str]] = None
+
+    def string_bytes(self, string_id: int) -> bytes:
+        end_offset = self.string_offsets_offset + OFFSET.size * (string_id - 1)
+        start = OFFSET.unpack_from(self.data, end_offset - OFFSET.size)[0] if string_id > 1 else 0
+        end = OFFSET.unpack_from(self.data, end_offset)[0]
+        return self.data[self.string_data_offset + start : self.string_data_offset + end]
+
+    def string(self, string_id: int) -> Optional[str]:
+        if string_id == 0:
+            return None
+        if string_id not in self._strings:
+            self._strings[string_id] = self.string_bytes(string_id).decode("utf-8")
+        return self._strings[string_id]
+
+    def _entry(self, index: int) -> Tuple[int, int, int]:
+        return INDEX_ENTRY.unpack_from(self.data, self.index_offset + INDEX_ENTRY.size * index)
+
+    def class_names(self) -> List[str]:
+        if self._names is None:
+            self._names = [self.string(self._entry(i)[0]) or "" for i in range(self.class_count)]
+        return self._names
+
+    def find_class(self, name: str) -> int:
+        """Returns the index entry of the class `name`, or -1. Only the names compared are read."""
+        # The index is sorted by UTF-8 bytes, so it's searched without decoding the names.
+        key = name.encode("utf-8")
+        low, high = 0, self.class_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.string_bytes(self._entry(middle)[0]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.class_count or self.string_bytes(self._entry(low)[0]) != key:
+            return -1
+        return low
+
+    def get_class(self, name: str) -> Optional[ClassDef]:
+        index = self.find_class(name)
+        if index < 0:
+            return None
+        return read_class(Reader(self, self._entry(index)[1]))
+
+    def get_classes(self) -> Dict[str, ClassDef]:
+        return {name: read_class(Reader(self, self._entry(i)[1])) for i, name in enumerate(self.class_names())}
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    file_list: List[str] = []
+
+    for path in paths:
+        path = path.rstrip("/\\")
+
+        if os.path.basename(path) in ["modules", "platform"]:
+            for subdir, dirs, _ in os.walk(path):
+                if "doc_classes" in dirs:
+                    doc_dir = os.path.join(subdir, "doc_classes")
+                    file_list += (os.path.join(doc_dir, f) for f in os.listdir(doc_dir) if f.endswith(".xml"))
+
+        elif os.path.isdir(path):
+            file_list += (os.path.join(path, f) for f in os.listdir(path) if f.endswith(".xml"))
+
+        elif path.endswith(".xml"):
+            file_list.append(path)
+
+    return sorted(file_list)
+
+
+def parse_classes(file_list: List[str]) -> Dict[str, ClassDef]:
+    state = State()
+    for file in file_list:
+        class_root = ET.parse(file).getroot()
+        state.parse_class(class_root, file)
+    classes: Dict[str, ClassDef] = state.classes
+    return classes
+
+
+def benchmark(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(file_list: List[str], data: bytes, repeat: int, class_name: str) -> None:
+    # Same blob as `make_doc_header` embeds.
+    xml = "".join(open(file, "r", encoding="utf-8").read() for file in file_list).encode("utf-8")
+    xml_compressed = zlib.compress(xml, zlib.Z_BEST_COMPRESSION)
+    data_compressed = zlib.compress(data, zlib.Z_BEST_COMPRESSION)
+
+    def decode_xml() -> None:
+        state = State()
+        for document in zlib.decompress(xml_compressed).decode("utf-8").split("<?xml")[1:]:
+            state.parse_class(ET.fromstring("<?xml" + document), "")
+
+    def decode_binary() -> None:
+        DocBinary(zlib.decompress(data_compressed)).get_classes()
+
+    def decode_binary_class() -> None:
+        DocBinary(zlib.decompress(data_compressed)).get_class(class_name)
+
+    def decode_binary_class_inflated() -> None:
+        DocBinary(data).get_class(class_name)
+
+    print("{:<40} {:>12} {:>12}".format("format", "raw", "compressed"))
+    print("{:<40} {:>12} {:>12}".format("XML", len(xml), len(xml_compressed)))
+    print("{:<40} {:>12} {:>12}".format("binary", len(data), len(data_compressed)))
+    print()
+    print("{:<40} {:>12}".format("decode (best of {})".format(repeat), "time"))
+    for label, function in [
+        ("XML, all classes", decode_xml),
+        ("binary, all classes", decode_binary),
+        ("binary, {}".format(class_name), decode_binary_class),
+        ("binary, {} (already inflated)".format(class_name), decode_binary_class_inflated),
+    ]:
+        print("{:<40} {:>11.2f}ms".format(label, benchmark(function, repeat) * 1000))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pack the XML class reference into a pre-parsed binary format.")
+    parser.add_argument("path", nargs="+", help="A path to an XML file or a directory containing XML files to pack.")
+    parser.add_argument("--output", "-o", help="The binary file to write.")
+    parser.add_argument(
+        "--report", action="store_true", help="Print sizes and decode times compared to the embedded XML blob."
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs for each decode time measurement.")
+    parser.add_argument("--class", dest="class_name", default="Node", help="Class decoded on its own in the report.")
+    args = parser.parse_args()
+
+    file_list = collect_files(args.path)
+    if not file_list:
+        print("No XML files found.")
+        sys.exit(1)
+
+    data = pack_classes(parse_classes(file_list))
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(data)
+        print(f'Packed {len(file_list)} classes into "{args.output}" ({len(data)} bytes).')
+
+    if args.report:
+        report(file_list, data, args.repeat, args.class_name)
+
+
+if __name__ == "__main__":
+    main()
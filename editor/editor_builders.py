@@ -1,112 +1,306 @@
 """Functions used to generate source files during build time"""
 
+import hashlib
 import os
 import os.path
-import shutil
-import subprocess
-import tempfile
-import uuid
-import zlib
+import re
+import struct
 
-from methods import print_warning
+from methods import (
+    compress_buffer,
+    compress_cached,
+    compress_raw,
+    embed_buffer,
+    get_compression_cache,
+    get_embed_bin_path,
+    get_embed_codec,
+    get_embed_compression_mode,
+    get_embed_mode,
+    parallel_map,
+    print_info,
+    write_embed_object,
+    write_file_if_changed,
+)
+
+# Chunk sizes (in KiB) compared when printing the tradeoff in verbose mode; 0 is a single chunk.
+_DOC_CHUNK_SIZES = [0, 64, 128, 256, 512, 1024]
+
+
+def _chunk_doc_data(classes, chunk_size):
+    # Groups consecutive classes into chunks of up to `chunk_size` bytes (or a single one if 0).
+    # A class bigger than a chunk gets a chunk of its own.
+    chunks = [[]]
+    size = 0
+    for data in classes:
+        if chunk_size and chunks[-1] and size + len(data) > chunk_size:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(data)
+        size += len(data)
+    return chunks
+
+
+def _print_doc_chunks_tradeoff(env, classes, decomp_size):
+    print_info("Class reference compression ratio by doc_chunk_size:")
+    for chunk_size in _DOC_CHUNK_SIZES:
+        chunks = _chunk_doc_data(classes, chunk_size * 1024)
+        comp_size = sum(len(compress_buffer(env, b"".join(chunk))) for chunk in chunks)
+        print_info(f"  {chunk_size:>5} KiB: {len(chunks):>4} chunks, ratio {decomp_size / comp_size:.2f}")
 
 
 def make_doc_header(target, source, env):
     dst = str(target[0])
-    with open(dst, "w", encoding="utf-8", newline="\n") as g:
-        buf = ""
-        docbegin = ""
-        docend = ""
-        for src in source:
-            src = str(src)
-            if not src.endswith(".xml"):
-                continue
-            with open(src, "r", encoding="utf-8") as f:
-                content = f.read()
-            buf += content
-
-        buf = (docbegin + buf + docend).encode("utf-8")
-        decomp_size = len(buf)
-
-        # Use maximum zlib compression level to further reduce file size
-        # (at the cost of initial build times).
-        buf = zlib.compress(buf, zlib.Z_BEST_COMPRESSION)
+    classes = []
+    for src in source:
+        src = str(src)
+        if not src.endswith(".xml"):
+            continue
+        with open(src, "r", encoding="utf-8") as f:
+            classes.append(f.read().encode("utf-8"))
 
+    buf = b"".join(classes)
+    decomp_size = len(buf)
+
+    # Unlike `hash()`, which is randomized per process, the digest only changes with the docs.
+    hash_line = 'static const char *_doc_data_hash = "' + hashlib.sha256(buf).hexdigest() + '";\n'
+    # The data is written to an object file instead if one was requested as second target.
+    objects = [] if len(target) > 1 else None
+    chunk_size = max(0, int(env.get("doc_chunk_size", "0")))
+    embed_line = "/* Embedded as: {}, compressed with {} in chunks of {} KiB */\n".format(
+        "object" if objects is not None else get_embed_mode(env), get_embed_codec(env)[0], chunk_size
+    )
+
+    # Leave the header untouched if the docs didn't change, so nothing depending on it gets rebuilt.
+    # Its other outputs (object file or `incbin` data) must still be there.
+    if objects is not None:
+        outputs = [dst, str(target[1])]
+    elif get_embed_mode(env) == "incbin":
+        outputs = [dst, get_embed_bin_path(dst, "_doc_data_compressed")]
+    else:
+        outputs = [dst]
+    if all(os.path.isfile(x) for x in outputs):
+        with open(dst, "r", encoding="utf-8") as f:
+            existing = f.read(1024)
+        if hash_line in existing and embed_line in existing:
+            return
+
+    # Each chunk is compressed independently, so they can be inflated one at a time.
+    # Use a high compression level to further reduce file size
+    # (at the cost of initial build times, mitigated by the compression cache).
+    chunks = _chunk_doc_data(classes, chunk_size * 1024)
+    compressed = [compress_buffer(env, b"".join(chunk)) for chunk in chunks]
+    buf = b"".join(compressed)
+
+    if env.get("verbose", False):
+        print_info(
+            f"Class reference: {len(chunks)} chunks of up to {chunk_size} KiB, compression ratio {decomp_size / len(buf):.2f}."
+        )
+        _print_doc_chunks_tradeoff(env, classes, decomp_size)
+
+    with open(dst, "w", encoding="utf-8", newline="\n") as g:
         g.write("/* THIS FILE IS GENERATED DO NOT EDIT */\n")
+        g.write(embed_line)
         g.write("#ifndef _DOC_DATA_RAW_H\n")
         g.write("#define _DOC_DATA_RAW_H\n")
-        g.write('static const char *_doc_data_hash = "' + str(hash(buf)) + '";\n')
+        g.write('#include "core/io/compression.h"\n')
+        g.write(hash_line)
         g.write("static const int _doc_data_compressed_size = " + str(len(buf)) + ";\n")
         g.write("static const int _doc_data_uncompressed_size = " + str(decomp_size) + ";\n")
-        g.write("static const unsigned char _doc_data_compressed[] = {\n")
-        for i in range(len(buf)):
-            g.write("\t" + str(buf[i]) + ",\n")
+        g.write(
+            "static const Compression::Mode _doc_data_compression_mode = " + get_embed_compression_mode(env) + ";\n"
+        )
+        g.write(embed_buffer(env, dst, "_doc_data_compressed", buf, objects=objects))
+
+        g.write("\nstruct _DocDataChunk {\n")
+        g.write("\tint offset;\n")
+        g.write("\tint compressed_size;\n")
+        g.write("\tint uncompressed_size;\n")
+        g.write("};\n\n")
+        g.write("static const int _doc_data_chunk_count = " + str(len(chunks)) + ";\n")
+        g.write("static const _DocDataChunk _doc_data_chunks[] = {\n")
+        offset = 0
+        for chunk, data in zip(chunks, compressed):
+            g.write("\t{{ {}, {}, {} }},\n".format(offset, len(data), sum(map(len, chunk))))
+            offset += len(data)
         g.write("};\n")
 
         g.write("#endif")
 
+    if objects is not None:
+        write_embed_object(env, target[1], objects)
+
+
+# Escape sequences allowed in PO strings, see GNU gettext's `po-lex.c`.
+_PO_ESCAPES = {
+    b"n": b"\n",
+    b"t": b"\t",
+    b"r": b"\r",
+    b"a": b"\a",
+    b"b": b"\b",
+    b"f": b"\f",
+    b"v": b"\v",
+}
+_PO_ESCAPE_RE = re.compile(rb"\\(x[0-9a-fA-F]{1,2}|[0-7]{1,3}|.)")
+
+
+def _po_unescape(value):
+    def replace(match):
+        code = match.group(1)
+        if code[:1] == b"x":
+            return bytes([int(code[1:], 16)])
+        if code[:1].isdigit():
+            return bytes([int(code, 8) & 0xFF])
+        return _PO_ESCAPES.get(code, code)
+
+    return _PO_ESCAPE_RE.sub(replace, value)
+
+
+def parse_po(data):
+    """
+    Parses the contents of a `.po` file into a dictionary mapping message keys to
+    translations, both encoded as in a `.mo` file. Like `msgfmt`, leaves out obsolete,
+    untranslated and fuzzy messages (except for the header).
+    """
+    messages = {}
+    entry = {}
+    fuzzy = False
+    field = None
+
+    def flush():
+        if b"msgid" in entry:
+            msgstrs = [entry[k] for k in sorted((k for k in entry if k.startswith(b"msgstr")), key=_msgstr_index)]
+            is_header = entry[b"msgid"] == b"" and b"msgctxt" not in entry
+            if msgstrs and msgstrs[0] and (is_header or not fuzzy):
+                key = entry[b"msgid"]
+                if b"msgid_plural" in entry:
+                    key += b"\0" + entry[b"msgid_plural"]
+                if b"msgctxt" in entry:
+                    key = entry[b"msgctxt"] + b"\x04" + key
+                messages[key] = b"\0".join(msgstrs)
+        entry.clear()
+
+    for line in data.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        starts_message = line.startswith((b"#", b"msgctxt", b"msgid "))
+        if starts_message and any(k.startswith(b"msgstr") for k in entry):
+            flush()
+            fuzzy = False
+        if line.startswith(b"#"):
+            # Obsolete messages (`#~`) are comments as well, so they are skipped here.
+            if line.startswith(b"#,") and b"fuzzy" in [x.strip() for x in line[2:].split(b",")]:
+                fuzzy = True
+            continue
+        if line.startswith(b'"'):
+            if field is not None:
+                entry[field] += _po_unescape(line[1:-1])
+            continue
+        field, _, value = line.partition(b" ")
+        entry[field] = _po_unescape(value.strip()[1:-1])
+    flush()
+
+    return messages
+
+
+def _msgstr_index(keyword):
+    # `msgstr` for singular messages, `msgstr[N]` for plural ones.
+    return int(keyword[7:-1]) if keyword.endswith(b"]") else 0
+
+
+def compile_po(data):
+    """
+    Compiles the contents of a `.po` file into a `.mo` file, without a hash table
+    (like `msgfmt --no-hash`), as Godot looks up messages on its own.
+    """
+    messages = parse_po(data)
+    keys = sorted(messages)
+    strings = keys + [messages[key] for key in keys]
+
+    originals_offset = 28
+    translations_offset = originals_offset + 8 * len(keys)
+    data_offset = translations_offset + 8 * len(keys)
+
+    # Magic, revision, string count, original and translation table offsets, hash table size and offset.
+    header = struct.pack("<7I", 0x950412DE, 0, len(keys), originals_offset, translations_offset, 0, data_offset)
+    table = []
+    offset = data_offset
+    for string in strings:
+        table.append(struct.pack("<2I", len(string), offset))
+        offset += len(string) + 1
+
+    return header + b"".join(table) + b"".join(string + b"\0" for string in strings)
+
+
+def _build_translation(path, compile_mo, cache_path, codec, level):
+    with open(path, "rb") as f:
+        buf = f.read()
+    if compile_mo:
+        buf = compile_po(buf)
+    decomp_size = len(buf)
+
+    # Use a high compression level to further reduce file size
+    # (at the cost of initial build times, mitigated by the compression cache).
+    if cache_path is None:
+        return compress_raw(buf, codec, level), decomp_size, None
+    buf, hit = compress_cached(cache_path, buf, codec, level)
+    return buf, decomp_size, hit
+
 
 def make_translations_header(target, source, env, category):
     dst = str(target[0])
 
+    # If more targets are given, each locale's data is written to the matching one (in
+    # the order of `source`) instead, and the header only declares it.
+    locale_sources = [str(x) for x in target[1:]] or [None] * len(source)
+    locales = sorted(
+        zip([str(x) for x in source], locale_sources), key=lambda x: os.path.splitext(os.path.basename(x[0]))[0]
+    )
+    names = [os.path.splitext(os.path.basename(path))[0] for path, _ in locales]
+
+    cache = get_compression_cache(env)
+    cache_path = cache.path if cache is not None else None
+    codec = get_embed_codec(env)
+    # Compiling would erase non-translated messages, so keep the POT as is.
+    results = parallel_map(
+        env,
+        _build_translation,
+        [(path, name != category, cache_path, *codec) for (path, _), name in zip(locales, names)],
+        "translations",
+    )
+
     with open(dst, "w", encoding="utf-8", newline="\n") as g:
         g.write("/* THIS FILE IS GENERATED DO NOT EDIT */\n")
         g.write("#ifndef _{}_TRANSLATIONS_H\n".format(category.upper()))
         g.write("#define _{}_TRANSLATIONS_H\n".format(category.upper()))
-
-        sorted_paths = sorted([str(x) for x in source], key=lambda path: os.path.splitext(os.path.basename(path))[0])
-
-        msgfmt_available = shutil.which("msgfmt") is not None
-
-        if not msgfmt_available:
-            print_warning("msgfmt is not found, using .po files instead of .mo")
+        g.write('#include "core/io/compression.h"\n')
 
         xl_names = []
-        for i in range(len(sorted_paths)):
-            name = os.path.splitext(os.path.basename(sorted_paths[i]))[0]
-            # msgfmt erases non-translated messages, so avoid using it if exporting the POT.
-            if msgfmt_available and name != category:
-                mo_path = os.path.join(tempfile.gettempdir(), uuid.uuid4().hex + ".mo")
-                cmd = "msgfmt " + sorted_paths[i] + " --no-hash -o " + mo_path
-                try:
-                    subprocess.Popen(cmd, shell=True, stderr=subprocess.PIPE).communicate()
-                    with open(mo_path, "rb") as f:
-                        buf = f.read()
-                except OSError as e:
-                    print_warning(
-                        "msgfmt execution failed, using .po file instead of .mo: path=%r; [%s] %s"
-                        % (sorted_paths[i], e.__class__.__name__, e)
-                    )
-                    with open(sorted_paths[i], "rb") as f:
-                        buf = f.read()
-                finally:
-                    try:
-                        os.remove(mo_path)
-                    except OSError as e:
-                        # Do not fail the entire build if it cannot delete a temporary file.
-                        print_warning(
-                            "Could not delete temporary .mo file: path=%r; [%s] %s" % (mo_path, e.__class__.__name__, e)
-                        )
-            else:
-                with open(sorted_paths[i], "rb") as f:
-                    buf = f.read()
-
-                if name == category:
-                    name = "source"
+        for name, (_, locale_source), (buf, decomp_size, hit) in zip(names, locales, results):
+            if name == category:
+                name = "source"
+            if hit is not None:
+                cache.record(hit)
 
-            decomp_size = len(buf)
-            # Use maximum zlib compression level to further reduce file size
-            # (at the cost of initial build times).
-            buf = zlib.compress(buf, zlib.Z_BEST_COMPRESSION)
-
-            g.write("static const unsigned char _{}_translation_{}_compressed[] = {{\n".format(category, name))
-            for j in range(len(buf)):
-                g.write("\t" + str(buf[j]) + ",\n")
-
-            g.write("};\n")
+            data_name = "_{}_translation_{}_compressed".format(category, name)
+            if locale_source is None:
+                g.write(embed_buffer(env, dst, data_name, buf))
+            else:
+                g.write("extern const unsigned char {}[];\n".format(data_name))
+                # Only touch sources whose locale changed, so the others don't get recompiled.
+                write_file_if_changed(
+                    locale_source,
+                    "/* THIS FILE IS GENERATED DO NOT EDIT */\n"
+                    + embed_buffer(env, locale_source, data_name, buf, linkage="extern"),
+                )
 
             xl_names.append([name, len(buf), str(decomp_size)])
 
+        g.write(
+            "static const Compression::Mode _{}_translations_compression_mode = {};\n\n".format(
+                category, get_embed_compression_mode(env)
+            )
+        )
         g.write("struct {}TranslationList {{\n".format(category.capitalize()))
         g.write("\tconst char* lang;\n")
         g.write("\tint comp_size;\n")
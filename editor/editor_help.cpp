@@ -2958,7 +2958,15 @@ void EditorHelp::_load_doc_thread(void *p_udata) {
 
 void EditorHelp::_gen_doc_thread(void *p_udata) {
 	DocTools compdoc;
-	compdoc.load_compressed(_doc_data_compressed, _doc_data_compressed_size, _doc_data_uncompressed_size);
+	// Chunks are inflated one at a time, so the whole reference is never held uncompressed at once.
+	Vector<uint8_t> data;
+	for (int i = 0; i < _doc_data_chunk_count; i++) {
+		const _DocDataChunk &chunk = _doc_data_chunks[i];
+		data.resize(chunk.uncompressed_size);
+		int ret = Compression::decompress(data.ptrw(), chunk.uncompressed_size, _doc_data_compressed + chunk.offset, chunk.compressed_size, _doc_data_compression_mode);
+		ERR_CONTINUE_MSG(ret == -1, "Compressed class reference is corrupt.");
+		compdoc.load_xml(data.ptr(), chunk.uncompressed_size);
+	}
 	doc->merge_from(compdoc); // Ensure all is up to date.
 
 	Ref<Resource> cache_res;
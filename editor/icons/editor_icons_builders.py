@@ -3,7 +3,7 @@
 import os
 from io import StringIO
 
-from methods import to_raw_cstring
+from methods import write_raw_cstring
 
 
 # See also `scene/theme/icons/default_theme_icons_builders.py`.
@@ -14,7 +14,9 @@ def make_editor_icons_action(target, source, env):
     with StringIO() as icons_string, StringIO() as s:
         for svg in svg_icons:
             with open(str(svg), "r") as svgf:
-                icons_string.write("\t%s,\n" % to_raw_cstring(svgf.read()))
+                icons_string.write("\t")
+                write_raw_cstring(icons_string, svgf.read())
+                icons_string.write(",\n")
 
         s.write("/* THIS FILE IS GENERATED DO NOT EDIT */\n")
         s.write("#ifndef _EDITOR_ICONS_H\n")
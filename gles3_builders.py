@@ -1,12 +1,50 @@
 """Functions used to generate source files during build time"""
 
+import json
 import os.path
-from typing import Optional
+import re
+from functools import partial
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
 
-from methods import print_error, to_raw_cstring
+from methods import (
+    build_shader_headers,
+    get_shader_code_size,
+    get_shader_source,
+    minify_shader_lines,
+    print_error,
+    write_raw_cstring,
+)
 
 
 class GLES3HeaderStruct:
+    __slots__ = (
+        "vertex_lines",
+        "fragment_lines",
+        "uniforms",
+        "fbos",
+        "texunits",
+        "texunit_names",
+        "ubos",
+        "ubo_names",
+        "feedbacks",
+        "vertex_included_files",
+        "fragment_included_files",
+        "reading",
+        "line_offset",
+        "vertex_offset",
+        "fragment_offset",
+        "variant_defines",
+        "variant_names",
+        "specialization_names",
+        "specialization_values",
+        # Lookup sets mirroring the lists above, which keep declaration order.
+        "_uniform_set",
+        "_texunit_set",
+        "_ubo_set",
+        "_vertex_included_set",
+        "_fragment_included_set",
+    )
+
     def __init__(self):
         self.vertex_lines = []
         self.fragment_lines = []
@@ -30,163 +68,216 @@ class GLES3HeaderStruct:
         self.specialization_names = []
         self.specialization_values = []
 
+        self._uniform_set = set()
+        self._texunit_set = set()
+        self._ubo_set = set()
+        self._vertex_included_set = set()
+        self._fragment_included_set = set()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+
+
+# Qualifiers dropped from uniform declarations before reading their names.
+_UNIFORM_QUALIFIERS = re.compile(r"uniform|highp|;")
+_UBO_QUALIFIERS = re.compile(r"highp|;|\{")
+
+
+def _declared_names(declaration: str) -> Generator[str, None, None]:
+    """Yields the names declared by a (comma-separated) declaration, without array sizes."""
+    for x in declaration.split(","):
+        x = x.strip()
+        x = x[x.rfind(" ") + 1 :]
+        bracket = x.find("[")
+        if bracket != -1:
+            # Uniform array.
+            x = x[:bracket]
+        yield x
+
+
+def _parse_declarations(line: str) -> Tuple[Tuple[str, str, str], ...]:
+    """
+    Returns the `(kind, name, value)` of the texture units, uniform buffers, uniforms and
+    transform feedback outputs declared on `line`.
+    """
+    declarations = []
+
+    if "uniform" in line:
+        lower = line.lower()
+        if "texunit:" in lower:
+            # texture unit
+            texunitstr = line[line.find(":") + 1 :].strip()
+            if texunitstr == "auto":
+                texunit = "-1"
+            else:
+                texunit = str(int(texunitstr))
+            uline = _UNIFORM_QUALIFIERS.sub("", line[: lower.find("//")])
+            declarations += [("texunit", x, texunit) for x in _declared_names(uline)]
+
+        elif "ubo:" in lower:
+            # uniform buffer object
+            ubostr = line[line.find(":") + 1 :].strip()
+            ubo = str(int(ubostr))
+            uline = line[: lower.find("//")]
+            uline = _UBO_QUALIFIERS.sub("", uline[uline.find("uniform") + len("uniform") :]).strip()
+            declarations += [("ubo", x, ubo) for x in _declared_names(uline)]
+
+        elif "{" not in line and ";" in line:
+            uline = line.replace("uniform", "").replace(";", "")
+            declarations += [("uniform", x, "") for x in _declared_names(uline)]
+
+    if "tfb:" in line and line.lstrip().startswith(("out ", "flat ")):
+        uline = line.replace("flat ", "")
+        uline = uline.replace("out ", "")
+        uline = uline.replace("highp ", "")
+        uline = uline.replace(";", "")
+        uline = uline[uline.find(" ") :].strip()
+
+        if uline.find("//") != -1:
+            name, bind = uline.split("//")
+            if bind.find("tfb:") != -1:
+                name = name.strip()
+                bind = bind.replace("tfb:", "").strip()
+                declarations.append(("feedback", name, bind))
+
+    return tuple(declarations)
+
+
+# `("include", path)` or `("line", line, eqpos, section, text, declarations)`.
+_SourceEntry = Union[Tuple[str, str], Tuple[str, str, int, Optional[str], str, Tuple[Tuple[str, str, str], ...]]]
+
+
+def preprocess_gles3_source(filename: str, lines: List[str]) -> List[_SourceEntry]:
+    """
+    Splits a GLES3 shader source into `("include", path)` and
+    `("line", line, eqpos, section, text, declarations)` entries, holding everything
+    that only depends on the file itself. Whether a line with `=` declares a mode or
+    a specialization depends on the section it is read in.
+    """
+    entries: List[_SourceEntry] = []
+    count = len(lines)
+    index = 0
+    while index < count:
+        line = lines[index]
+
+        section = None
+        if "#[" in line:
+            if "#[modes]" in line:
+                section = "modes"
+            elif "#[specializations]" in line:
+                section = "specializations"
+            elif "#[vertex]" in line:
+                section = "vertex"
+            elif "#[fragment]" in line:
+                section = "fragment"
+        eqpos = line.find("=")
+
+        if section is None and "#include " in line:
+            while "#include " in line:
+                includeline = line.replace("#include ", "").strip()[1:-1]
+                entries.append(("include", os.path.relpath(os.path.dirname(filename) + "/" + includeline)))
+                index += 1
+                line = lines[index] if index < count else ""
+            # The line following includes is never a section header, mode or specialization.
+            section = None
+            eqpos = -1
 
-def include_file_in_gles3_header(filename: str, header_data: GLES3HeaderStruct, depth: int):
-    with open(filename, "r", encoding="utf-8") as fs:
-        line = fs.readline()
+        declarations = _parse_declarations(line) if section is None else ()
+        entries.append(("line", line, eqpos, section, line.rstrip("\r\n"), declarations))
+        index += 1
 
-        while line:
-            if line.find("=") != -1 and header_data.reading == "":
-                # Mode
-                eqpos = line.find("=")
-                defname = line[:eqpos].strip().upper()
-                define = line[eqpos + 1 :].strip()
-                header_data.variant_names.append(defname)
-                header_data.variant_defines.append(define)
-                line = fs.readline()
-                header_data.line_offset += 1
-                header_data.vertex_offset = header_data.line_offset
-                continue
+    return entries
 
-            if line.find("=") != -1 and header_data.reading == "specializations":
-                # Specialization
-                eqpos = line.find("=")
-                specname = line[:eqpos].strip()
-                specvalue = line[eqpos + 1 :]
-                header_data.specialization_names.append(specname)
-                header_data.specialization_values.append(specvalue)
-                line = fs.readline()
-                header_data.line_offset += 1
-                header_data.vertex_offset = header_data.line_offset
-                continue
 
-            if line.find("#[modes]") != -1:
-                # Nothing really, just skip
-                line = fs.readline()
-                header_data.line_offset += 1
-                header_data.vertex_offset = header_data.line_offset
+def include_file_in_gles3_header(filename: str, header_data: GLES3HeaderStruct, depth: int):
+    for entry in get_shader_source(filename, preprocess_gles3_source):
+        if entry[0] == "include":
+            included_file = entry[1]
+            if header_data.reading == "vertex":
+                included_files = header_data.vertex_included_files
+                included_set = header_data._vertex_included_set
+            elif header_data.reading == "fragment":
+                included_files = header_data.fragment_included_files
+                included_set = header_data._fragment_included_set
+            else:
                 continue
 
-            if line.find("#[specializations]") != -1:
-                header_data.reading = "specializations"
-                line = fs.readline()
-                header_data.line_offset += 1
-                header_data.vertex_offset = header_data.line_offset
-                continue
+            if included_file not in included_set:
+                included_set.add(included_file)
+                included_files.append(included_file)
+                if include_file_in_gles3_header(included_file, header_data, depth + 1) is None:
+                    print_error(f'In file "{filename}": #include "{included_file}" could not be found!"')
+            continue
 
-            if line.find("#[vertex]") != -1:
-                header_data.reading = "vertex"
-                line = fs.readline()
-                header_data.line_offset += 1
-                header_data.vertex_offset = header_data.line_offset
-                continue
+        _, line, eqpos, section, text, declarations = entry
 
-            if line.find("#[fragment]") != -1:
-                header_data.reading = "fragment"
-                line = fs.readline()
-                header_data.line_offset += 1
+        if eqpos != -1 and (header_data.reading == "" or header_data.reading == "specializations"):
+            if header_data.reading == "":
+                # Mode
+                header_data.variant_names.append(line[:eqpos].strip().upper())
+                header_data.variant_defines.append(line[eqpos + 1 :].strip())
+            else:
+                # Specialization
+                header_data.specialization_names.append(line[:eqpos].strip())
+                header_data.specialization_values.append(line[eqpos + 1 :])
+            header_data.line_offset += 1
+            header_data.vertex_offset = header_data.line_offset
+            continue
+
+        if section is not None:
+            # Nothing really to do for modes, just skip
+            if section != "modes":
+                header_data.reading = section
+            header_data.line_offset += 1
+            if section == "fragment":
                 header_data.fragment_offset = header_data.line_offset
-                continue
+            else:
+                header_data.vertex_offset = header_data.line_offset
+            continue
+
+        for kind, name, value in declarations:
+            if kind == "texunit":
+                if name not in header_data._texunit_set:
+                    header_data._texunit_set.add(name)
+                    header_data.texunits.append((name, value))
+                    header_data.texunit_names.append(name)
+            elif kind == "ubo":
+                if name not in header_data._ubo_set:
+                    header_data._ubo_set.add(name)
+                    header_data.ubos.append((name, value))
+                    header_data.ubo_names.append(name)
+            elif kind == "uniform":
+                if name not in header_data._uniform_set:
+                    header_data._uniform_set.add(name)
+                    header_data.uniforms.append(name)
+            else:
+                header_data.feedbacks.append((name, value))
+
+        if header_data.reading == "vertex":
+            header_data.vertex_lines.append(text)
+        elif header_data.reading == "fragment":
+            header_data.fragment_lines.append(text)
+
+        header_data.line_offset += 1
 
-            while line.find("#include ") != -1:
-                includeline = line.replace("#include ", "").strip()[1:-1]
+    return header_data
 
-                included_file = os.path.relpath(os.path.dirname(filename) + "/" + includeline)
-                if included_file not in header_data.vertex_included_files and header_data.reading == "vertex":
-                    header_data.vertex_included_files += [included_file]
-                    if include_file_in_gles3_header(included_file, header_data, depth + 1) is None:
-                        print_error(f'In file "{filename}": #include "{includeline}" could not be found!"')
-                elif included_file not in header_data.fragment_included_files and header_data.reading == "fragment":
-                    header_data.fragment_included_files += [included_file]
-                    if include_file_in_gles3_header(included_file, header_data, depth + 1) is None:
-                        print_error(f'In file "{filename}": #include "{includeline}" could not be found!"')
-
-                line = fs.readline()
-
-            if line.find("uniform") != -1 and line.lower().find("texunit:") != -1:
-                # texture unit
-                texunitstr = line[line.find(":") + 1 :].strip()
-                if texunitstr == "auto":
-                    texunit = "-1"
-                else:
-                    texunit = str(int(texunitstr))
-                uline = line[: line.lower().find("//")]
-                uline = uline.replace("uniform", "")
-                uline = uline.replace("highp", "")
-                uline = uline.replace(";", "")
-                lines = uline.split(",")
-                for x in lines:
-                    x = x.strip()
-                    x = x[x.rfind(" ") + 1 :]
-                    if x.find("[") != -1:
-                        # unfiorm array
-                        x = x[: x.find("[")]
-
-                    if x not in header_data.texunit_names:
-                        header_data.texunits += [(x, texunit)]
-                        header_data.texunit_names += [x]
-
-            elif line.find("uniform") != -1 and line.lower().find("ubo:") != -1:
-                # uniform buffer object
-                ubostr = line[line.find(":") + 1 :].strip()
-                ubo = str(int(ubostr))
-                uline = line[: line.lower().find("//")]
-                uline = uline[uline.find("uniform") + len("uniform") :]
-                uline = uline.replace("highp", "")
-                uline = uline.replace(";", "")
-                uline = uline.replace("{", "").strip()
-                lines = uline.split(",")
-                for x in lines:
-                    x = x.strip()
-                    x = x[x.rfind(" ") + 1 :]
-                    if x.find("[") != -1:
-                        # unfiorm array
-                        x = x[: x.find("[")]
-
-                    if x not in header_data.ubo_names:
-                        header_data.ubos += [(x, ubo)]
-                        header_data.ubo_names += [x]
-
-            elif line.find("uniform") != -1 and line.find("{") == -1 and line.find(";") != -1:
-                uline = line.replace("uniform", "")
-                uline = uline.replace(";", "")
-                lines = uline.split(",")
-                for x in lines:
-                    x = x.strip()
-                    x = x[x.rfind(" ") + 1 :]
-                    if x.find("[") != -1:
-                        # unfiorm array
-                        x = x[: x.find("[")]
-
-                    if x not in header_data.uniforms:
-                        header_data.uniforms += [x]
-
-            if (line.strip().find("out ") == 0 or line.strip().find("flat ") == 0) and line.find("tfb:") != -1:
-                uline = line.replace("flat ", "")
-                uline = uline.replace("out ", "")
-                uline = uline.replace("highp ", "")
-                uline = uline.replace(";", "")
-                uline = uline[uline.find(" ") :].strip()
-
-                if uline.find("//") != -1:
-                    name, bind = uline.split("//")
-                    if bind.find("tfb:") != -1:
-                        name = name.strip()
-                        bind = bind.replace("tfb:", "").strip()
-                        header_data.feedbacks += [(name, bind)]
-
-            line = line.replace("\r", "")
-            line = line.replace("\n", "")
 
-            if header_data.reading == "vertex":
-                header_data.vertex_lines += [line]
-            if header_data.reading == "fragment":
-                header_data.fragment_lines += [line]
+def get_gles3_class_name(out_file: str, class_suffix: str) -> str:
+    """Returns the name of the shader class generated in `out_file`."""
+    out_file_base = out_file[out_file.rfind("/") + 1 :]
+    out_file_base = out_file_base[out_file_base.rfind("\\") + 1 :]
+    return out_file_base.replace(".glsl.gen.h", "").title().replace("_", "").replace(".", "") + "Shader" + class_suffix
 
-            line = fs.readline()
-            header_data.line_offset += 1
 
-    return header_data
+def get_gles3_default_specialization(header_data: GLES3HeaderStruct) -> int:
+    """Returns the bits of the specializations enabled by default."""
+    defspec = 0
+    for i, value in enumerate(header_data.specialization_values):
+        defval = value.strip()
+        if defval.upper() == "TRUE" or defval == "1":
+            defspec |= 1 << i
+    return defspec
 
 
 def build_gles3_header(
@@ -195,18 +286,25 @@ def build_gles3_header(
     class_suffix: str,
     optional_output_filename: Optional[str] = None,
     header_data: Optional[GLES3HeaderStruct] = None,
-):
+    minify: bool = False,
+) -> Dict[str, int]:
     header_data = header_data or GLES3HeaderStruct()
     include_file_in_gles3_header(filename, header_data, 0)
 
+    stats = {}
+    if minify:
+        stats["code_size"] = get_shader_code_size(header_data.vertex_lines, header_data.fragment_lines)
+        header_data.vertex_lines = minify_shader_lines(header_data.vertex_lines)
+        header_data.fragment_lines = minify_shader_lines(header_data.fragment_lines)
+        stats["minified_size"] = get_shader_code_size(header_data.vertex_lines, header_data.fragment_lines)
+
     if optional_output_filename is None:
         out_file = filename + ".gen.h"
     else:
         out_file = optional_output_filename
 
     with open(out_file, "w", encoding="utf-8", newline="\n") as fd:
-        defspec = 0
-        defvariant = ""
+        defspec = get_gles3_default_specialization(header_data)
 
         fd.write("/* WARNING, THIS FILE WAS GENERATED, DO NOT EDIT */\n")
 
@@ -217,267 +315,48 @@ def build_gles3_header(
         fd.write("#ifndef " + out_file_ifdef + class_suffix + "_GLES3\n")
         fd.write("#define " + out_file_ifdef + class_suffix + "_GLES3\n")
 
-        out_file_class = (
-            out_file_base.replace(".glsl.gen.h", "").title().replace("_", "").replace(".", "") + "Shader" + class_suffix
-        )
+        out_file_class = get_gles3_class_name(out_file, class_suffix)
         fd.write("\n\n")
         fd.write('#include "' + include + '"\n\n\n')
-        fd.write("class " + out_file_class + " : public Shader" + class_suffix + " {\n\n")
+        # Enums are declared outside the class, so they can parametrize its base, which
+        # provides the binding and uniform functions typed after them.
+        fd.write("struct " + out_file_class + "Enums {\n")
 
-        fd.write("public:\n\n")
-
-        if header_data.uniforms:
-            fd.write("\tenum Uniforms {\n")
-            for x in header_data.uniforms:
-                fd.write("\t\t" + x.upper() + ",\n")
-            fd.write("\t};\n\n")
+        fd.write("\tenum Uniforms {\n")
+        for x in header_data.uniforms:
+            fd.write("\t\t" + x.upper() + ",\n")
+        fd.write("\t};\n\n")
 
         if header_data.variant_names:
             fd.write("\tenum ShaderVariant {\n")
             for x in header_data.variant_names:
                 fd.write("\t\t" + x + ",\n")
-            fd.write("\t};\n\n")
+            fd.write("\t};\n")
         else:
-            fd.write("\tenum ShaderVariant { DEFAULT };\n\n")
-            defvariant = "=DEFAULT"
+            fd.write("\tenum ShaderVariant { DEFAULT };\n")
 
         if header_data.specialization_names:
-            fd.write("\tenum Specializations {\n")
+            fd.write("\n\tenum Specializations {\n")
             counter = 0
             for x in header_data.specialization_names:
                 fd.write("\t\t" + x.upper() + "=" + str(1 << counter) + ",\n")
                 counter += 1
-            fd.write("\t};\n\n")
+            fd.write("\t};\n")
 
-        for i in range(len(header_data.specialization_names)):
-            defval = header_data.specialization_values[i].strip()
-            if defval.upper() == "TRUE" or defval == "1":
-                defspec |= 1 << i
+        fd.write("};\n\n")
 
         fd.write(
-            "\t_FORCE_INLINE_ bool version_bind_shader(RID p_version,ShaderVariant p_variant"
-            + defvariant
-            + ",uint64_t p_specialization="
+            "class "
+            + out_file_class
+            + " : public Shader"
+            + class_suffix
+            + "Typed<"
+            + out_file_class
+            + "Enums,"
             + str(defspec)
-            + ") { return _version_bind_shader(p_version,p_variant,p_specialization); }\n\n"
+            + "> {\n\n"
         )
 
-        if header_data.uniforms:
-            fd.write(
-                "\t_FORCE_INLINE_ int version_get_uniform(Uniforms p_uniform,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { return _version_get_uniform(p_uniform,p_version,p_variant,p_specialization); }\n\n"
-            )
-
-            fd.write(
-                "\t#define _FU if (version_get_uniform(p_uniform,p_version,p_variant,p_specialization)<0) return; \n\n "
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, float p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1f(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, double p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1f(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, uint8_t p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1ui(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, int8_t p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1i(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, uint16_t p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1ui(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, int16_t p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1i(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, uint32_t p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1ui(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, int32_t p_value,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform1i(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_value); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Color& p_color,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU GLfloat col[4]={p_color.r,p_color.g,p_color.b,p_color.a}; glUniform4fv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,col); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Vector2& p_vec2,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU GLfloat vec2[2]={float(p_vec2.x),float(p_vec2.y)}; glUniform2fv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,vec2); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Size2i& p_vec2,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU GLint vec2[2]={GLint(p_vec2.x),GLint(p_vec2.y)}; glUniform2iv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,vec2); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Vector3& p_vec3,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU GLfloat vec3[3]={float(p_vec3.x),float(p_vec3.y),float(p_vec3.z)}; glUniform3fv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,vec3); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Vector4& p_vec4,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU GLfloat vec4[4]={float(p_vec4.x),float(p_vec4.y),float(p_vec4.z),float(p_vec4.w)}; glUniform4fv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,vec4); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, float p_a, float p_b,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform2f(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_a,p_b); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, float p_a, float p_b, float p_c,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform3f(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_a,p_b,p_c); }\n\n"
-            )
-            fd.write(
-                "\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, float p_a, float p_b, float p_c, float p_d,RID p_version,ShaderVariant p_variant"
-                + defvariant
-                + ",uint64_t p_specialization="
-                + str(defspec)
-                + ") { _FU glUniform4f(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),p_a,p_b,p_c,p_d); }\n\n"
-            )
-
-            fd.write(
-                """\t_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Transform3D& p_transform,RID p_version,ShaderVariant p_variant"""
-                + defvariant
-                + """,uint64_t p_specialization="""
-                + str(defspec)
-                + """) {  _FU
-
-                const Transform3D &tr = p_transform;
-
-                GLfloat matrix[16]={ /* build a 16x16 matrix */
-                    (GLfloat)tr.basis.rows[0][0],
-                    (GLfloat)tr.basis.rows[1][0],
-                    (GLfloat)tr.basis.rows[2][0],
-                    (GLfloat)0,
-                    (GLfloat)tr.basis.rows[0][1],
-                    (GLfloat)tr.basis.rows[1][1],
-                    (GLfloat)tr.basis.rows[2][1],
-                    (GLfloat)0,
-                    (GLfloat)tr.basis.rows[0][2],
-                    (GLfloat)tr.basis.rows[1][2],
-                    (GLfloat)tr.basis.rows[2][2],
-                    (GLfloat)0,
-                    (GLfloat)tr.origin.x,
-                    (GLfloat)tr.origin.y,
-                    (GLfloat)tr.origin.z,
-                    (GLfloat)1
-                };
-
-                        glUniformMatrix4fv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,false,matrix);
-
-            }
-
-            """
-            )
-
-            fd.write(
-                """_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Transform2D& p_transform,RID p_version,ShaderVariant p_variant"""
-                + defvariant
-                + """,uint64_t p_specialization="""
-                + str(defspec)
-                + """) {  _FU
-
-                const Transform2D &tr = p_transform;
-
-            GLfloat matrix[16]={ /* build a 16x16 matrix */
-                (GLfloat)tr.columns[0][0],
-                (GLfloat)tr.columns[0][1],
-                (GLfloat)0,
-                (GLfloat)0,
-                (GLfloat)tr.columns[1][0],
-                (GLfloat)tr.columns[1][1],
-                (GLfloat)0,
-                (GLfloat)0,
-                (GLfloat)0,
-                (GLfloat)0,
-                (GLfloat)1,
-                (GLfloat)0,
-                (GLfloat)tr.columns[2][0],
-                (GLfloat)tr.columns[2][1],
-                (GLfloat)0,
-                (GLfloat)1
-            };
-
-                glUniformMatrix4fv(version_get_uniform(p_uniform,p_version,p_variant,p_specialization),1,false,matrix);
-
-            }
-
-            """
-            )
-
-            fd.write(
-                """_FORCE_INLINE_ void version_set_uniform(Uniforms p_uniform, const Projection& p_matrix, RID p_version, ShaderVariant p_variant"""
-                + defvariant
-                + """,uint64_t p_specialization="""
-                + str(defspec)
-                + """) {  _FU
-
-                GLfloat matrix[16];
-
-                for (int i = 0; i < 4; i++) {
-                    for (int j = 0; j < 4; j++) {
-                        matrix[i * 4 + j] = p_matrix.columns[i][j];
-                    }
-                }
-
-                glUniformMatrix4fv(version_get_uniform(p_uniform, p_version, p_variant, p_specialization), 1, false, matrix);
-        }"""
-            )
-
-            fd.write("\n\n#undef _FU\n\n\n")
-
         fd.write("protected:\n\n")
 
         fd.write("\tvirtual void _init() override {\n\n")
@@ -553,11 +432,11 @@ def build_gles3_header(
             fd.write("\t\tstatic const Feedback* _feedbacks=nullptr;\n")
 
         fd.write("\t\tstatic const char _vertex_code[]={\n")
-        fd.write(to_raw_cstring(header_data.vertex_lines))
+        write_raw_cstring(fd, header_data.vertex_lines)
         fd.write("\n\t\t};\n\n")
 
         fd.write("\t\tstatic const char _fragment_code[]={\n")
-        fd.write(to_raw_cstring(header_data.fragment_lines))
+        write_raw_cstring(fd, header_data.fragment_lines)
         fd.write("\n\t\t};\n\n")
 
         fd.write(
@@ -583,8 +462,62 @@ def build_gles3_header(
         fd.write("};\n\n")
         fd.write("#endif\n")
 
+    return stats
+
 
 def build_gles3_headers(target, source, env):
     env.NoCache(target)
-    for x in source:
-        build_gles3_header(str(x), include="drivers/gles3/shader_gles3.h", class_suffix="GLES3")
+    build_shader_headers(
+        env,
+        partial(
+            build_gles3_header,
+            include="drivers/gles3/shader_gles3.h",
+            class_suffix="GLES3",
+            minify=env["shader_minify"],
+        ),
+        target,
+        source,
+    )
+
+
+# Manifest of the GLES3 shaders, listing what each one can compile to at runtime. All
+# variants are compiled with the default specializations when a version is created,
+# other specializations are compiled on first use, so each combination of a variant
+# and specialization bits is a potential compile stall.
+
+
+def get_gles3_manifest_entry(filename: str, class_suffix: str = "GLES3") -> Dict[str, Any]:
+    """Returns the manifest entry of the GLES3 shader `filename`."""
+    header_data = GLES3HeaderStruct()
+    include_file_in_gles3_header(filename, header_data, 0)
+
+    defspec = get_gles3_default_specialization(header_data)
+    variant_count = max(len(header_data.variant_names), 1)
+    return {
+        "file": filename.replace("\\", "/"),
+        "class": get_gles3_class_name(filename + ".gen.h", class_suffix),
+        "variants": header_data.variant_names or ["DEFAULT"],
+        "specializations": [
+            {"name": name, "bit": 1 << i, "default": bool(defspec & (1 << i))}
+            for i, name in enumerate(header_data.specialization_names)
+        ],
+        "default_specialization": defspec,
+        "uniforms": len(header_data.uniforms),
+        "texture_units": len(header_data.texunits),
+        "ubos": len(header_data.ubos),
+        "feedbacks": len(header_data.feedbacks),
+        "compiled_per_version": variant_count,
+        "worst_case_permutations": variant_count << len(header_data.specialization_names),
+    }
+
+
+def build_gles3_manifest(filenames: List[str], output_filename: str, class_suffix: str = "GLES3") -> None:
+    manifest = {"shaders": [get_gles3_manifest_entry(x, class_suffix) for x in sorted(filenames)]}
+    with open(output_filename, "w", encoding="utf-8", newline="\n") as file:
+        json.dump(manifest, file, indent=4)
+        file.write("\n")
+
+
+def build_gles3_manifests(target, source, env):
+    env.NoCache(target)
+    build_gles3_manifest([str(x) for x in source], str(target[0]))
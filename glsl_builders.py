@@ -1,9 +1,22 @@
 """Functions used to generate source files during build time"""
 
+import hashlib
 import os.path
-from typing import Optional
-
-from methods import print_error, to_raw_cstring
+import re
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from methods import (
+    SPIRVCompiler,
+    build_shader_headers,
+    format_buffer,
+    get_shader_code_size,
+    get_shader_source,
+    get_spirv_compiler,
+    minify_shader_lines,
+    print_error,
+    to_raw_cstring,
+)
 
 
 class RDHeaderStruct:
@@ -23,80 +36,285 @@ class RDHeaderStruct:
         self.compute_offset = 0
 
 
-def include_file_in_rd_header(filename: str, header_data: RDHeaderStruct, depth: int) -> RDHeaderStruct:
-    with open(filename, "r", encoding="utf-8") as fs:
-        line = fs.readline()
+def preprocess_rd_source(filename: str, lines: List[str]) -> List[Tuple[str, str]]:
+    """
+    Splits an RD shader source into `("section", name)`, `("include", path)` and
+    `("line", text)` entries, which only depend on the file itself.
+    """
+    entries = []
+    count = len(lines)
+    index = 0
+    while index < count:
+        line = lines[index]
+        comment = line.find("//")
+        if comment != -1:
+            line = line[:comment]
+
+        if "#[vertex]" in line:
+            entries.append(("section", "vertex"))
+            index += 1
+            continue
+
+        if "#[fragment]" in line:
+            entries.append(("section", "fragment"))
+            index += 1
+            continue
+
+        if "#[compute]" in line:
+            entries.append(("section", "compute"))
+            index += 1
+            continue
+
+        while "#include " in line:
+            includeline = line.replace("#include ", "").strip()[1:-1]
+
+            if includeline.startswith("thirdparty/"):
+                included_file = os.path.relpath(includeline)
+
+            else:
+                included_file = os.path.relpath(os.path.dirname(filename) + "/" + includeline)
 
-        while line:
-            index = line.find("//")
-            if index != -1:
-                line = line[:index]
+            entries.append(("include", included_file))
+            index += 1
+            line = lines[index] if index < count else ""
+
+        entries.append(("line", line.replace("\r", "").replace("\n", "")))
+        index += 1
+
+    return entries
+
+
+def include_file_in_rd_header(
+    filename: str,
+    header_data: RDHeaderStruct,
+    depth: int,
+    pool_pieces: Optional[List[Tuple[str, int, int, str]]] = None,
+) -> RDHeaderStruct:
+    """
+    Appends the code of `filename` to the stages of `header_data`. If `pool_pieces` is given,
+    the lines coming from pooled include files are added to it as `(stage, start, end, name)`.
+    """
+    entries = get_shader_source(filename, preprocess_rd_source)
+    pooled = pool_pieces is not None and depth > 0 and header_data.reading != "" and is_rd_poolable(entries)
+    # Pieces are only started when pooled, so `pool_pieces` is given.
+    pieces = pool_pieces if pool_pieces is not None else []
+    piece_start: Optional[int] = None
+    piece_index = 0
+
+    for kind, value in entries:
+        if piece_start is not None and kind != "line":
+            pieces.append(_get_rd_pool_piece(header_data, piece_start, filename, piece_index))
+            piece_start = None
+            piece_index += 1
+
+        if kind == "line":
+            if pooled and piece_start is None:
+                piece_start = len(getattr(header_data, header_data.reading + "_lines"))
+            if header_data.reading == "vertex":
+                header_data.vertex_lines.append(value)
+            elif header_data.reading == "fragment":
+                header_data.fragment_lines.append(value)
+            elif header_data.reading == "compute":
+                header_data.compute_lines.append(value)
+            header_data.line_offset += 1
 
-            if line.find("#[vertex]") != -1:
-                header_data.reading = "vertex"
-                line = fs.readline()
-                header_data.line_offset += 1
+        elif kind == "section":
+            header_data.reading = value
+            header_data.line_offset += 1
+            if value == "vertex":
                 header_data.vertex_offset = header_data.line_offset
-                continue
-
-            if line.find("#[fragment]") != -1:
-                header_data.reading = "fragment"
-                line = fs.readline()
-                header_data.line_offset += 1
+            elif value == "fragment":
                 header_data.fragment_offset = header_data.line_offset
-                continue
-
-            if line.find("#[compute]") != -1:
-                header_data.reading = "compute"
-                line = fs.readline()
-                header_data.line_offset += 1
+            else:
                 header_data.compute_offset = header_data.line_offset
-                continue
-
-            while line.find("#include ") != -1:
-                includeline = line.replace("#include ", "").strip()[1:-1]
-
-                if includeline.startswith("thirdparty/"):
-                    included_file = os.path.relpath(includeline)
 
-                else:
-                    included_file = os.path.relpath(os.path.dirname(filename) + "/" + includeline)
-
-                if included_file not in header_data.vertex_included_files and header_data.reading == "vertex":
-                    header_data.vertex_included_files += [included_file]
-                    if include_file_in_rd_header(included_file, header_data, depth + 1) is None:
-                        print_error(f'In file "{filename}": #include "{includeline}" could not be found!"')
-                elif included_file not in header_data.fragment_included_files and header_data.reading == "fragment":
-                    header_data.fragment_included_files += [included_file]
-                    if include_file_in_rd_header(included_file, header_data, depth + 1) is None:
-                        print_error(f'In file "{filename}": #include "{includeline}" could not be found!"')
-                elif included_file not in header_data.compute_included_files and header_data.reading == "compute":
-                    header_data.compute_included_files += [included_file]
-                    if include_file_in_rd_header(included_file, header_data, depth + 1) is None:
-                        print_error(f'In file "{filename}": #include "{includeline}" could not be found!"')
+        else:
+            if header_data.reading == "vertex":
+                included_files = header_data.vertex_included_files
+            elif header_data.reading == "fragment":
+                included_files = header_data.fragment_included_files
+            elif header_data.reading == "compute":
+                included_files = header_data.compute_included_files
+            else:
+                continue
 
-                line = fs.readline()
+            if value not in included_files:
+                included_files.append(value)
+                if include_file_in_rd_header(value, header_data, depth + 1, pool_pieces) is None:
+                    print_error(f'In file "{filename}": #include "{value}" could not be found!"')
 
-            line = line.replace("\r", "").replace("\n", "")
+    if piece_start is not None:
+        pieces.append(_get_rd_pool_piece(header_data, piece_start, filename, piece_index))
 
-            if header_data.reading == "vertex":
-                header_data.vertex_lines += [line]
-            if header_data.reading == "fragment":
-                header_data.fragment_lines += [line]
-            if header_data.reading == "compute":
-                header_data.compute_lines += [line]
+    return header_data
 
-            line = fs.readline()
-            header_data.line_offset += 1
 
-    return header_data
+# Header gathering the code of the include files of RD shaders, which their headers
+# reference instead of embedding it when `shader_pool` is enabled. It is built from all
+# the shaders of `servers/rendering/renderer_rd/shaders`.
+RD_POOL_HEADER = "servers/rendering/renderer_rd/shaders/shader_rd_pool.gen.h"
+
+
+def is_rd_poolable(entries: List[Tuple[str, str]]) -> bool:
+    """Returns whether an include file can be pooled, as its code doesn't depend on where it's included."""
+    return all(kind != "section" for kind, _ in entries)
+
+
+def get_rd_pool_name(filename: str, index: int) -> str:
+    """Returns the name of the `index`th piece of the include file `filename` in the pool."""
+    return re.sub(r"[^0-9A-Za-z]", "_", filename) + f"_{index}"
+
+
+def get_rd_pool_pieces(filename: str) -> List[List[str]]:
+    """Returns the pieces of the include file `filename` in the pool: the runs of lines between its includes."""
+    pieces = []
+    lines = []
+    for kind, value in get_shader_source(filename, preprocess_rd_source):
+        if kind == "line":
+            lines.append(value)
+        elif lines:
+            pieces.append(lines)
+            lines = []
+    if lines:
+        pieces.append(lines)
+    return pieces
+
+
+def _get_rd_pool_piece(header_data: RDHeaderStruct, start: int, filename: str, index: int) -> Tuple[str, int, int, str]:
+    end = len(getattr(header_data, header_data.reading + "_lines"))
+    return (header_data.reading, start, end, get_rd_pool_name(filename, index))
+
+
+def get_rd_stage_pieces(
+    lines: List[str], pool_pieces: List[Tuple[int, int, str]]
+) -> List[Tuple[Optional[str], List[str]]]:
+    """
+    Splits the lines of a stage into `(name, lines)` pieces, `name` being the one of the
+    pooled piece they come from, or `None` for code embedded in the shader header.
+    """
+    pieces: List[Tuple[Optional[str], List[str]]] = []
+    position = 0
+    for start, end, name in pool_pieces:
+        if start > position:
+            pieces.append((None, lines[position:start]))
+        pieces.append((name, lines[start:end]))
+        position = end
+    if position < len(lines) or not pieces:
+        pieces.append((None, lines[position:]))
+    return pieces
+
+
+# Variant defines `ShaderRD` subclasses are conventionally initialized with for their
+# default variant. Others are only known at runtime, so they aren't precompiled.
+RD_SPIRV_VARIANT_DEFINES = ["", "\n"]
+# Defines `ShaderRD` adds after the variant ones, when running on Vulkan (see `_build_variant_code`).
+RD_SPIRV_DRIVER_DEFINES = (
+    "#define RENDER_DRIVER_VULKAN\n#define samplerExternalOES sampler2D\n#define textureExternalOES texture2D\n"
+)
+# Code the build can't reproduce: material code and built-in includes get inserted at
+# runtime, and the glslang module defines device-dependent macros.
+RD_SPIRV_RUNTIME_MARKERS = ("#GLOBALS", "#MATERIAL_UNIFORMS", "#CODE", "#include ")
+RD_SPIRV_RUNTIME_MACROS = ("has_GL_KHR_shader_subgroup", "has_VK_KHR_multiview")
+
+
+def get_rd_variant_source(lines: List[str], variant_defines: str) -> Optional[str]:
+    """
+    Returns the source `ShaderRD` compiles for a stage embedded as `lines`, with the given
+    variant defines and no general or custom ones. Returns `None` if it depends on runtime data.
+    """
+    parts = []
+    # The embedded code ends with a newline, which splits into a last empty line.
+    for line in lines + [""]:
+        if line.startswith("#VERSION_DEFINES"):
+            parts.append("\n" + variant_defines + "\n" + RD_SPIRV_DRIVER_DEFINES)
+        elif line.startswith(RD_SPIRV_RUNTIME_MARKERS):
+            return None
+        else:
+            parts.append(line + "\n")
+
+    source = "".join(parts)
+    if not source.isascii() or any(x in source for x in RD_SPIRV_RUNTIME_MACROS):
+        return None
+    return source
+
+
+def precompile_rd_spirv(spirv: SPIRVCompiler, header_data: RDHeaderStruct, stats: Dict[str, int]) -> List[str]:
+    """
+    Compiles the default variants of the shader to SPIR-V, and returns the statements
+    registering them in the generated `ShaderRD` constructor. Cache hits and misses are
+    added to `stats`.
+    """
+    if header_data.compute_lines:
+        stages = [("compute", header_data.compute_lines)]
+    else:
+        stages = [("vertex", header_data.vertex_lines), ("fragment", header_data.fragment_lines)]
+
+    stats["spirv_hits"] = 0
+    stats["spirv_misses"] = 0
+    entries = []
+    for variant_defines in RD_SPIRV_VARIANT_DEFINES:
+        sources: List[Tuple[str, str]] = []
+        for stage, lines in stages:
+            source = get_rd_variant_source(lines, variant_defines)
+            if source is None:
+                break
+            sources.append((stage, source))
+        if len(sources) < len(stages):
+            break
+        for stage, source in sources:
+            data, hit = spirv.compile(stage, source)
+            stats["spirv_hits" if hit else "spirv_misses"] += 1
+            if data is not None:
+                entries.append((stage, hashlib.sha256(source.encode()).hexdigest(), data))
+
+    if not entries:
+        return []
+
+    parts = []
+    for index, (_, _, data) in enumerate(entries):
+        parts.append("static const uint8_t _spirv_%d[] = {\n%s\n\t\t};" % (index, format_buffer(data, 3)))
+    parts.append(
+        "static const PrecompiledSPIRV _precompiled_spirv[] = {\n%s\n\t\t};"
+        % "\n".join(
+            f'\t\t\t{{ RD::SHADER_STAGE_{stage.upper()}, "{digest}", _spirv_{index}, sizeof(_spirv_{index}) }},'
+            for index, (stage, digest, _) in enumerate(entries)
+        )
+    )
+    parts.append(f"set_precompiled_spirv(_precompiled_spirv, {len(entries)});")
+    return parts
 
 
 def build_rd_header(
-    filename: str, optional_output_filename: Optional[str] = None, header_data: Optional[RDHeaderStruct] = None
-) -> None:
+    filename: str,
+    optional_output_filename: Optional[str] = None,
+    header_data: Optional[RDHeaderStruct] = None,
+    minify: bool = False,
+    spirv: Optional[SPIRVCompiler] = None,
+    pool: bool = False,
+) -> Dict[str, int]:
     header_data = header_data or RDHeaderStruct()
-    include_file_in_rd_header(filename, header_data, 0)
+    pool_pieces: Optional[List[Tuple[str, int, int, str]]] = [] if pool else None
+    include_file_in_rd_header(filename, header_data, 0, pool_pieces)
+
+    stats = {}
+    stages = {
+        "vertex": header_data.vertex_lines,
+        "fragment": header_data.fragment_lines,
+        "compute": header_data.compute_lines,
+    }
+    stage_pieces = {
+        stage: get_rd_stage_pieces(lines, [x[1:] for x in pool_pieces or [] if x[0] == stage])
+        for stage, lines in stages.items()
+    }
+    if minify:
+        # Pieces are minified separately, so pooled ones match the pool.
+        stats["code_size"] = get_shader_code_size(*stages.values())
+        for stage, pieces in stage_pieces.items():
+            stage_pieces[stage] = [(name, minify_shader_lines(lines)) for name, lines in pieces]
+            setattr(header_data, stage + "_lines", [x for _, lines in stage_pieces[stage] for x in lines])
+        stats["minified_size"] = get_shader_code_size(
+            header_data.vertex_lines, header_data.fragment_lines, header_data.compute_lines
+        )
 
     if optional_output_filename is None:
         out_file = filename + ".gen.h"
@@ -109,26 +327,37 @@ def build_rd_header(
     out_file_ifdef = out_file_base.replace(".", "_").upper()
     out_file_class = out_file_base.replace(".glsl.gen.h", "").title().replace("_", "").replace(".", "") + "ShaderRD"
 
-    if header_data.compute_lines:
+    if pool:
+        body_parts = []
+        for stage in ["compute"] if header_data.compute_lines else ["vertex", "fragment"]:
+            body_parts += get_rd_pooled_stage_code(stage, stage_pieces[stage])
+    elif header_data.compute_lines:
         body_parts = [
             "static const char _compute_code[] = {\n%s\n\t\t};" % to_raw_cstring(header_data.compute_lines),
-            f'setup(nullptr, nullptr, _compute_code, "{out_file_class}");',
         ]
     else:
         body_parts = [
             "static const char _vertex_code[] = {\n%s\n\t\t};" % to_raw_cstring(header_data.vertex_lines),
             "static const char _fragment_code[] = {\n%s\n\t\t};" % to_raw_cstring(header_data.fragment_lines),
-            f'setup(_vertex_code, _fragment_code, nullptr, "{out_file_class}");',
         ]
 
+    if header_data.compute_lines:
+        body_parts.append(f'setup(nullptr, nullptr, _compute_code, "{out_file_class}");')
+    else:
+        body_parts.append(f'setup(_vertex_code, _fragment_code, nullptr, "{out_file_class}");')
+
+    if spirv is not None:
+        body_parts += precompile_rd_spirv(spirv, header_data, stats)
+
     body_content = "\n\t\t".join(body_parts)
+    pool_include = f'\n#include "{RD_POOL_HEADER}"' if any(name for x in stage_pieces.values() for name, _ in x) else ""
 
     # Intended curly brackets are doubled so f-string doesn't eat them up.
     shader_template = f"""/* WARNING, THIS FILE WAS GENERATED, DO NOT EDIT */
 #ifndef {out_file_ifdef}_RD
 #define {out_file_ifdef}_RD
 
-#include "servers/rendering/renderer_rd/shader_rd.h"
+#include "servers/rendering/renderer_rd/shader_rd.h"{pool_include}
 
 class {out_file_class} : public ShaderRD {{
 
@@ -146,11 +375,82 @@ public:
     with open(out_file, "w", encoding="utf-8", newline="\n") as fd:
         fd.write(shader_template)
 
+    return stats
+
+
+def get_rd_pooled_stage_code(stage: str, pieces: List[Tuple[Optional[str], List[str]]]) -> List[str]:
+    """
+    Returns the statements declaring the code of `stage` as a null-terminated array of
+    its pieces, which `ShaderRD::setup` stitches together.
+    """
+    parts: List[str] = []
+    names = []
+    for name, lines in pieces:
+        if name is None:
+            name = f"_{stage}_code_{len(parts)}"
+            parts.append("static const char %s[] = {\n%s\n\t\t};" % (name, to_raw_cstring(lines)))
+        else:
+            name = "ShaderRDPool::" + name
+        names.append(name)
+    parts.append("static const char *const _%s_code[] = { %s, nullptr };" % (stage, ", ".join(names)))
+    return parts
+
 
 def build_rd_headers(target, source, env):
     env.NoCache(target)
-    for x in source:
-        build_rd_header(filename=str(x))
+    build_shader_headers(
+        env,
+        partial(build_rd_header, minify=env["shader_minify"], spirv=get_spirv_compiler(env), pool=env["shader_pool"]),
+        target,
+        source,
+    )
+
+
+def build_rd_pool_header(filenames: List[str], output_filename: str, minify: bool = False) -> None:
+    """Writes the pool of the pieces of all the include files of the RD shaders `filenames`."""
+    include_files = set()
+    pending = list(filenames)
+    while pending:
+        filename = pending.pop()
+        if not os.path.isfile(filename):
+            continue  # Reported by the shader builder.
+        for kind, value in get_shader_source(filename, preprocess_rd_source):
+            if kind == "include" and value not in include_files:
+                include_files.add(value)
+                pending.append(value)
+
+    parts = []
+    for filename in sorted(include_files):
+        if not os.path.isfile(filename) or not is_rd_poolable(get_shader_source(filename, preprocess_rd_source)):
+            continue
+        for index, lines in enumerate(get_rd_pool_pieces(filename)):
+            if minify:
+                lines = minify_shader_lines(lines)
+            name = get_rd_pool_name(filename, index)
+            parts.append("inline constexpr char %s[] = {\n%s\n};" % (name, to_raw_cstring(lines)))
+
+    pool_content = "\n\n".join(parts)
+
+    shader_template = f"""/* WARNING, THIS FILE WAS GENERATED, DO NOT EDIT */
+#ifndef SHADER_RD_POOL_GEN_H_RD
+#define SHADER_RD_POOL_GEN_H_RD
+
+namespace ShaderRDPool {{
+
+{pool_content}
+
+}} // namespace ShaderRDPool
+
+#endif
+"""
+
+    with open(output_filename, "w", encoding="utf-8", newline="\n") as fd:
+        fd.write(shader_template)
+
+
+def build_rd_pool_headers(target, source, env):
+    env.NoCache(target)
+    build_rd_pool_header([str(x) for x in source], str(target[0]), minify=env["shader_minify"])
 
 
 class RAWHeaderStruct:
@@ -158,21 +458,37 @@ class RAWHeaderStruct:
         self.code = ""
 
 
-def include_file_in_raw_header(filename: str, header_data: RAWHeaderStruct, depth: int) -> None:
-    with open(filename, "r", encoding="utf-8") as fs:
-        line = fs.readline()
+def preprocess_raw_source(filename: str, lines: List[str]) -> List[Tuple[str, str]]:
+    """Splits a raw shader source into `("include", path)` and `("line", text)` entries."""
+    entries = []
+    count = len(lines)
+    index = 0
+    while index < count:
+        line = lines[index]
+        while "#include " in line:
+            includeline = line.replace("#include ", "").strip()[1:-1]
 
-        while line:
-            while line.find("#include ") != -1:
-                includeline = line.replace("#include ", "").strip()[1:-1]
+            included_file = os.path.relpath(os.path.dirname(filename) + "/" + includeline)
+            entries.append(("include", included_file))
+            index += 1
+            line = lines[index] if index < count else ""
 
-                included_file = os.path.relpath(os.path.dirname(filename) + "/" + includeline)
-                include_file_in_raw_header(included_file, header_data, depth + 1)
+        entries.append(("line", line))
+        index += 1
 
-                line = fs.readline()
+    return entries
 
-            header_data.code += line
-            line = fs.readline()
+
+def include_file_in_raw_header(filename: str, header_data: RAWHeaderStruct, depth: int) -> None:
+    code = []
+    for kind, value in get_shader_source(filename, preprocess_raw_source):
+        if kind == "line":
+            code.append(value)
+        else:
+            header_data.code += "".join(code)
+            code = []
+            include_file_in_raw_header(value, header_data, depth + 1)
+    header_data.code += "".join(code)
 
 
 def build_raw_header(
@@ -207,5 +523,4 @@ static const char {out_file_base}[] = {{
 
 def build_raw_headers(target, source, env):
     env.NoCache(target)
-    for x in source:
-        build_raw_header(filename=str(x))
+    build_shader_headers(env, build_raw_header, target, source)
@@ -1,5 +1,7 @@
 """Functions used to generate source files during build time"""
 
+from methods import embed_buffer
+
 
 def make_splash(target, source, env):
     src = str(source[0])
@@ -14,10 +16,7 @@ def make_splash(target, source, env):
         g.write("#define BOOT_SPLASH_H\n")
         # Use a neutral gray color to better fit various kinds of projects.
         g.write("static const Color boot_splash_bg_color = Color(0.14, 0.14, 0.14);\n")
-        g.write("static const unsigned char boot_splash_png[] = {\n")
-        for i in range(len(buf)):
-            g.write(str(buf[i]) + ",\n")
-        g.write("};\n")
+        g.write(embed_buffer(env, dst, "boot_splash_png", buf))
         g.write("#endif")
 
 
@@ -35,10 +34,7 @@ def make_splash_editor(target, source, env):
         # The editor splash background color is taken from the default editor theme's background color.
         # This helps achieve a visually "smoother" transition between the splash screen and the editor.
         g.write("static const Color boot_splash_editor_bg_color = Color(0.125, 0.145, 0.192);\n")
-        g.write("static const unsigned char boot_splash_editor_png[] = {\n")
-        for i in range(len(buf)):
-            g.write(str(buf[i]) + ",\n")
-        g.write("};\n")
+        g.write(embed_buffer(env, dst, "boot_splash_editor_png", buf))
         g.write("#endif")
 
 
@@ -53,8 +49,5 @@ def make_app_icon(target, source, env):
         g.write("/* THIS FILE IS GENERATED DO NOT EDIT */\n")
         g.write("#ifndef APP_ICON_H\n")
         g.write("#define APP_ICON_H\n")
-        g.write("static const unsigned char app_icon_png[] = {\n")
-        for i in range(len(buf)):
-            g.write(str(buf[i]) + ",\n")
-        g.write("};\n")
+        g.write(embed_buffer(env, dst, "app_icon_png", buf))
         g.write("#endif")
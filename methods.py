@@ -1,15 +1,23 @@
 import atexit
 import contextlib
 import glob
+import hashlib
 import math
+import multiprocessing
 import os
 import re
 import subprocess
 import sys
+import tempfile
+import threading
+import time
+import zlib
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import StringIO, TextIOBase
 from pathlib import Path
-from typing import Generator, List, Optional, Union, cast
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, TypeVar, Union, cast
 
 from misc.utility.color import print_error, print_info, print_warning
 
@@ -67,8 +75,12 @@ def add_source_files_scu(self, sources, files, allow_gen=False):
         if section_name not in (_scu_folders):
             return False
 
-        # Add all the gen.cpp files in the SCU directory
-        add_source_files_orig(self, sources, subdir + "scu/scu_*.gen.cpp", True)
+        # Add all the gen files of the same extension in the SCU directory, or build the
+        # files normally if the folder isn't unified for it (e.g. C files next to C++ ones).
+        extension = files.rsplit(".", 1)[1]
+        if not glob.glob(os.path.join(self.Dir(subdir).abspath, "scu", "scu_*.gen." + extension)):
+            return False
+        add_source_files_orig(self, sources, subdir + "scu/scu_*.gen." + extension, True)
         return True
     return False
 
@@ -586,10 +598,21 @@ def CommandNoCache(env, target, sources, command, **args):
     return result
 
 
-def Run(env, function):
+def Run(env, function, batch=False, **kwargs):
     from SCons.Script import Action
 
-    return Action(function, "$GENCOMSTR")
+    if batch:
+        kwargs["batch_key"] = _batch_missing_targets
+    return Action(function, "$GENCOMSTR", **kwargs)
+
+
+def _batch_missing_targets(action, env, target, source):
+    # Targets that don't exist yet (as in clean builds) are passed to a single call of the
+    # action, even across construction environments. Existing ones are left alone to be
+    # rebuilt precisely. The action should call `split_batch_implicit_deps`.
+    if any(os.path.exists(x.get_abspath()) for x in target):
+        return None
+    return id(action)
 
 
 def detect_darwin_sdk_path(platform, env):
@@ -917,6 +940,24 @@ def prepare_timer():
     atexit.register(print_elapsed_time, time.time())
 
 
+def prepare_compile_history(env):
+    if not env["compile_history"] or env["ninja"] or env.GetOption("clean") or env.GetOption("no_exec"):
+        return
+
+    from compile_history import CompileHistory
+
+    history = CompileHistory()
+    env["SPAWN"] = history.wrap_spawn(env["SPAWN"])
+
+    def save_compile_history():
+        try:
+            history.save(" ".join(sys.argv[1:]))
+        except OSError as error:
+            print_warning(f"Failed to save compile history: {error}")
+
+    atexit.register(save_compile_history)
+
+
 def dump(env):
     # Dumps latest build information for debugging purposes and external tools.
     from json import dump
@@ -1520,41 +1561,964 @@ def generated_wrapper(
         file.write("\n")
 
 
-def to_raw_cstring(value: Union[str, List[str]]) -> str:
-    MAX_LITERAL = 16 * 1024
+RAW_CSTRING_MAX_LITERAL = 16 * 1024
+
+
+def _raw_cstring_segments(encoded: bytes) -> Generator[Tuple[int, int], None, None]:
+    """
+    Yields the `(start, end)` byte ranges of `encoded` to put in separate literals, as
+    compilers limit their length (MSVC to 16 KiB).
+    """
+    size = len(encoded)
+    start = 0
+    while start <= size:
+        end = next_start = start + RAW_CSTRING_MAX_LITERAL
+        if end <= size:
+            # Try to segment raw strings at double newlines to keep readable.
+            pretty_break = encoded.rfind(b"\n\n", start, end)
+            if pretty_break != -1:
+                end = next_start = pretty_break + 1
+            # If none found, ensure we end with valid utf8, by not splitting a character
+            # (i.e. not starting the next segment with a continuation byte).
+            else:
+                while end < size and encoded[end] & 0b11000000 == 0b10000000:
+                    end -= 1
+                next_start = end
+        yield start, min(end, size)
+        start = next_start
 
+
+_raw_cstring_cache: Dict[str, str] = {}
+
+
+def write_raw_cstring(file: TextIOBase, value: Union[str, List[str]]) -> None:
+    """
+    Writes `value` (or its lines) to `file` as a sequence of C++ raw string literals.
+    """
+    file.write(to_raw_cstring(value))
+
+
+def to_raw_cstring(value: Union[str, List[str]]) -> str:
+    """
+    Returns `value` (or its lines) as a sequence of C++ raw string literals. Results are
+    cached, as the same sources get embedded by several builders in one run.
+    """
     if isinstance(value, list):
         value = "\n".join(value) + "\n"
 
-    split: List[bytes] = []
-    offset = 0
+    result = _raw_cstring_cache.get(value)
+    if result is not None:
+        return result
+
     encoded = value.encode()
+    # ASCII only, so byte ranges match string indices and decoding can be skipped.
+    ascii_only = len(encoded) == len(value)
+    literals = []
+    for start, end in _raw_cstring_segments(encoded):
+        literals.append('R"<!>(%s)<!>"' % (value[start:end] if ascii_only else encoded[start:end].decode()))
+    result = " ".join(literals)
+    _raw_cstring_cache[value] = result
+    return result
 
-    while offset <= len(encoded):
-        segment = encoded[offset : offset + MAX_LITERAL]
-        offset += MAX_LITERAL
-        if len(segment) == MAX_LITERAL:
-            # Try to segment raw strings at double newlines to keep readable.
-            pretty_break = segment.rfind(b"\n\n")
-            if pretty_break != -1:
-                segment = segment[: pretty_break + 1]
-                offset -= MAX_LITERAL - pretty_break - 1
-            # If none found, ensure we end with valid utf8.
-            # https://github.com/halloleo/unicut/blob/master/truncate.py
-            elif segment[-1] & 0b10000000:
-                last_11xxxxxx_index = [i for i in range(-1, -5, -1) if segment[i] & 0b11000000 == 0b11000000][0]
-                last_11xxxxxx = segment[last_11xxxxxx_index]
-                if not last_11xxxxxx & 0b00100000:
-                    last_char_length = 2
-                elif not last_11xxxxxx & 0b0010000:
-                    last_char_length = 3
-                elif not last_11xxxxxx & 0b0001000:
-                    last_char_length = 4
-
-                if last_char_length > -last_11xxxxxx_index:
-                    segment = segment[:last_11xxxxxx_index]
-                    offset += last_11xxxxxx_index
-
-        split += [segment]
-
-    return " ".join(f'R"<!>({x.decode()})<!>"' for x in split)
+
+# Shader source cache.
+#
+# Shader builders run in the SCons process, and most shaders pull in the same include
+# files. Each file is read and preprocessed once per version (modification time and
+# size) instead of once per shader including it.
+
+_shader_source_cache: Dict[Tuple[str, Callable[[str, List[str]], Any]], Tuple[int, int, Any]] = {}
+
+
+def get_shader_source(filename: str, preprocess: Callable[[str, List[str]], Any]) -> Any:
+    """
+    Returns `preprocess(filename, lines)` for the lines of `filename`, reusing the result
+    as long as the file is unchanged. Results are shared between callers passing the
+    same `preprocess` function, so they must not be modified.
+    """
+    path = os.path.realpath(filename)
+    stat = os.stat(path)
+    key = (path, preprocess)
+    entry = _shader_source_cache.get(key)
+    if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+        return entry[2]
+
+    with open(path, "r", encoding="utf-8") as f:
+        result = preprocess(filename, f.readlines())
+    _shader_source_cache[key] = (stat.st_mtime_ns, stat.st_size, result)
+    return result
+
+
+def get_shader_include_scanner(preprocess: Callable[[str, List[str]], Any]):
+    """
+    Returns an SCons scanner finding the files included by shader sources, as resolved by
+    `preprocess` (which must return `("include", path)` entries among others). Includes
+    are scanned recursively, and SCons stores the results in its signature database.
+    """
+    from SCons.Script import Scanner
+
+    def scan(node, env, path):
+        if not node.exists():
+            return []
+        entries = get_shader_source(node.get_abspath(), preprocess)
+        # Includes in sections the builders skip may not exist, they can't be dependencies.
+        includes = [os.path.abspath(x[1]) for x in entries if x[0] == "include"]
+        return [env.File(x) for x in dict.fromkeys(includes) if os.path.isfile(x)]
+
+    return Scanner(function=scan, name=f"{preprocess.__module__}.{preprocess.__name__}", recursive=True)
+
+
+def split_batch_implicit_deps(env, target, source) -> None:
+    """
+    Gives each target of a batched action (see `Run`) the implicit dependencies of its own
+    source. SCons scans all the sources of a batch for each of its targets, so otherwise
+    the dependencies stored for them wouldn't match the ones found when they're checked
+    one at a time, rebuilding all of them in the next build.
+    """
+    if len(target) < 2:
+        return
+    for node, source_node in zip(target, source):
+        executor = node.get_executor()
+        scanner = node.builder.source_scanner
+        deps = []
+        if scanner:
+            deps = source_node.get_implicit_deps(env, scanner, executor.get_build_scanner_path, executor.get_kw())
+        # `env.Depends` can only add dependencies, not drop the ones of the other sources.
+        # SCons has no public API to replace implicit dependencies, but `add_to_implicit`
+        # starts over (clearing the cached children) when `implicit` is None, as it is
+        # before scanning. `test_batch_node_internals` checks this still holds.
+        node.implicit = None
+        node.add_to_implicit(deps)
+
+
+# Process pools.
+#
+# SCons runs Python actions in threads, which the GIL serializes. Builders handling
+# many independent inputs in one action can spread them over processes instead.
+
+# Workers of the pools currently started by `parallel_map`, across SCons threads.
+_parallel_workers = 0
+_parallel_workers_lock = threading.Lock()
+
+_T = TypeVar("_T")
+
+
+def parallel_map(env, function: Callable[..., _T], tasks: List[Tuple[Any, ...]], description: str) -> List[_T]:
+    """
+    Returns `[function(*task) for task in tasks]`, computed in a process pool when more
+    than one job is allowed. Results keep the order of `tasks`, so the output doesn't
+    depend on the worker count. Falls back to running serially if workers can't start.
+
+    Pools started by concurrent calls share the job count, so they don't start more
+    workers than SCons runs jobs.
+    """
+    global _parallel_workers
+    with _parallel_workers_lock:
+        jobs = min(len(tasks), (env.GetOption("num_jobs") or 1) - _parallel_workers, os.cpu_count() or 1)
+        if jobs > 1:
+            _parallel_workers += jobs
+    if jobs > 1:
+        # SCons only puts the folder of a SConscript in `sys.path` while reading it,
+        # but the spawned workers need it (and the root folder) to import `function`.
+        paths = [os.path.dirname(os.path.abspath(__file__))]
+        module_file = sys.modules[getattr(function, "func", function).__module__].__file__
+        if module_file is not None:
+            paths.append(os.path.dirname(os.path.abspath(module_file)))
+        for path in paths:
+            if path not in sys.path:
+                sys.path.append(path)
+        try:
+            # Spawn workers instead of forking, as SCons may be running other builders in threads.
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(jobs, mp_context=context) as pool:
+                chunksize = max(1, len(tasks) // (jobs * 4))
+                return list(pool.map(function, *zip(*tasks), chunksize=chunksize))
+        except (OSError, BrokenProcessPool) as e:
+            print_warning(
+                "Could not build %s in parallel, falling back to serial: [%s] %s"
+                % (description, e.__class__.__name__, e)
+            )
+        finally:
+            with _parallel_workers_lock:
+                _parallel_workers -= jobs
+
+    return [function(*task) for task in tasks]
+
+
+def _timed_call(function: Callable[..., _T], *args: Any) -> Tuple[float, _T]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def build_shader_headers(env, builder: Callable[[str], Any], target, source) -> None:
+    """
+    Runs `builder` on each of the shader sources, which is parallelized when SCons passes
+    several of them at once (with `shader_batch`). Reports each one's time when verbose,
+    along with the statistics the builder returns (see `_record_shader_stats`).
+    """
+    filenames = [str(x) for x in source]
+    results = parallel_map(env, _timed_call, [(builder, x) for x in filenames], "shader headers")
+    split_batch_implicit_deps(env, target, source)
+    for _, stats in results:
+        if stats:
+            _record_shader_stats(stats)
+
+    if env["verbose"]:
+        for filename, (elapsed, stats) in sorted(zip(filenames, results), key=lambda x: -x[1][0]):
+            details = []
+            if stats and "minified_size" in stats:
+                details.append(f"{stats['code_size'] - stats['minified_size']} bytes minified")
+            if stats and "spirv_hits" in stats:
+                details.append(f"SPIR-V {stats['spirv_hits']}/{stats['spirv_hits'] + stats['spirv_misses']} cached")
+            print_info(f"{elapsed * 1000:8.1f} ms  {filename}" + (f" ({', '.join(details)})" if details else ""))
+        if len(filenames) > 1:
+            print_info(
+                f"Generated {len(filenames)} shader headers in {sum(x[0] for x in results):.2f} s of builder time."
+            )
+
+
+# Shader statistics, summed over the headers generated in this run and reported once
+# the build is done. Builders may return:
+# - `code_size` and `minified_size`: bytes of embedded code before and after minification.
+# - `spirv_hits` and `spirv_misses`: SPIR-V cache lookups (see `SPIRVCompiler`).
+
+_shader_stats: Dict[str, int] = {}
+
+
+def _record_shader_stats(stats: Dict[str, int]) -> None:
+    if not _shader_stats:
+        atexit.register(_report_shader_stats)
+    for key, value in stats.items():
+        _shader_stats[key] = _shader_stats.get(key, 0) + value
+    if "minified_size" in stats:
+        _shader_stats["minified_shaders"] = _shader_stats.get("minified_shaders", 0) + 1
+
+
+def _report_shader_stats() -> None:
+    if "minified_size" in _shader_stats:
+        original = _shader_stats["code_size"]
+        saved = original - _shader_stats["minified_size"]
+        print_info(
+            f"Shader minification saved {convert_size(saved)} of {convert_size(original)} "
+            f"({saved / max(original, 1):.1%}) across {_shader_stats['minified_shaders']} shaders."
+        )
+    if "spirv_hits" in _shader_stats:
+        hits = _shader_stats["spirv_hits"]
+        total = hits + _shader_stats["spirv_misses"]
+        print_info(f"SPIR-V cache: {hits} hits, {total - hits} misses ({hits / max(total, 1):.1%} hit rate).")
+
+
+# Shader minification.
+#
+# With `shader_minify`, comments and redundant whitespace are stripped from the shader
+# code embedded in generated headers. Lines are kept (if empty), so line numbers in
+# shader compiler errors still match the sources.
+
+_SHADER_COMMENT_START = re.compile(r"//|/\*")
+
+
+def minify_shader_lines(lines: List[str]) -> List[str]:
+    """Returns `lines` without comments and redundant whitespace, one output line per input line."""
+    result = []
+    in_comment = False
+    for line in lines:
+        parts = []
+        index = 0
+        while index < len(line):
+            if in_comment:
+                end = line.find("*/", index)
+                if end == -1:
+                    break
+                in_comment = False
+                # A block comment is equivalent to a space.
+                parts.append(" ")
+                index = end + 2
+                continue
+            match = _SHADER_COMMENT_START.search(line, index)
+            if match is None:
+                parts.append(line[index:])
+                break
+            parts.append(line[index : match.start()])
+            if match.group() == "//":
+                break
+            in_comment = True
+            index = match.end()
+
+        text = "".join(parts)
+        minified = " ".join(text.split())
+        if minified.endswith("\\") and not text.endswith("\\"):
+            # A backslash followed by whitespace doesn't continue the line, keep it that way.
+            minified += " "
+        if minified.startswith("#") and text[:1].isspace():
+            # Keep indented directives apart from the markers the engine looks for at line start.
+            minified = " " + minified
+        result.append(minified)
+    return result
+
+
+def get_shader_code_size(*stages: List[str]) -> int:
+    """Returns the size in bytes of the code embedded for the given stage lines."""
+    return sum(len(line.encode()) + 1 for lines in stages for line in lines)
+
+
+# SPIR-V precompilation.
+#
+# RD shaders are compiled to SPIR-V at runtime, which stalls the first run. With
+# `spirv_precompile`, the variants the build can reproduce are compiled ahead of time
+# with glslangValidator, and embedded next to the GLSL code so `ShaderRD` can use them
+# when the source it builds matches. Results are cached on disk, keyed by the digest of
+# the source along with the stage, target and compiler version.
+
+# Vulkan 1.1 (SPIR-V 1.3) is accepted by every device the RD renderers support but
+# Vulkan 1.0 ones, which `ShaderRD` checks for.
+SPIRV_TARGET_ENV = "vulkan1.1"
+SPIRV_STAGES = {"vertex": "vert", "fragment": "frag", "compute": "comp"}
+
+_spirv_compilers = {}
+
+
+class SPIRVCompiler:
+    def __init__(self, glslang: str, version: str, cache_path: Optional[str]):
+        self.glslang = glslang
+        self.version = version
+        self.cache_path = cache_path
+
+    def compile(self, stage: str, source: str) -> Tuple[Optional[bytes], bool]:
+        """
+        Compiles the GLSL `source` of `stage` to SPIR-V, reusing the result stored in the
+        cache by a previous build if there is one. Safe to call from multiple processes.
+        Returns the SPIR-V (`None` if compilation failed), and whether it was cached.
+        """
+        header = f"{self.version}\n{SPIRV_TARGET_ENV}\n{stage}\n".encode()
+        digest = hashlib.sha256(header + source.encode()).hexdigest()
+        entry = os.path.join(self.cache_path, f"{digest}.spv") if self.cache_path else None
+        if entry:
+            try:
+                with open(entry, "rb") as file:
+                    data = file.read()
+                # Refresh the entry, like compression cache ones.
+                os.utime(entry)
+                return data, True
+            except OSError:
+                pass
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "shader.spv")
+            result = subprocess.run(
+                [self.glslang, "-V", "--target-env", SPIRV_TARGET_ENV, "-S", SPIRV_STAGES[stage], "--stdin"]
+                + ["-o", output],
+                input=source.encode(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            )
+            if result.returncode != 0:
+                print_warning(f"Failed to precompile {stage} shader:\n{result.stdout.decode(errors='replace')}")
+                return None, False
+            with open(output, "rb") as file:
+                data = file.read()
+
+        if entry:
+            try:
+                os.makedirs(os.path.dirname(entry), exist_ok=True)
+                temp = f"{entry}.{os.getpid()}.tmp"
+                with open(temp, "wb") as file:
+                    file.write(data)
+                os.replace(temp, entry)
+            except OSError:
+                print_warning(f'Failed to write SPIR-V cache entry "{entry}".')
+        return data, False
+
+
+def get_spirv_compiler(env) -> Optional[SPIRVCompiler]:
+    """
+    Returns the compiler used to precompile RD shaders with `spirv_precompile`, caching
+    results in `spirv_cache_path` (or a `spirv` folder in `cache_path` by default).
+    Returns `None` if disabled, or if glslangValidator can't be found.
+    """
+    if not env.get("spirv_precompile", False):
+        return None
+
+    glslang = env.WhereIs("glslangValidator")
+    if glslang not in _spirv_compilers:
+        compiler = None
+        if glslang:
+            try:
+                output = subprocess.run([glslang, "--version"], stdout=subprocess.PIPE, check=True).stdout
+                path = env.get("spirv_cache_path", "")
+                if not path and env.get("cache_path"):
+                    path = os.path.join(env["cache_path"], "spirv")
+                version = output.decode(errors="replace").strip()
+                compiler = SPIRVCompiler(glslang, version, os.path.abspath(path) if path else None)
+            except (OSError, subprocess.CalledProcessError):
+                pass
+        if compiler is None:
+            print_warning("glslangValidator was not found, RD shaders won't be precompiled to SPIR-V.")
+        _spirv_compilers[glslang] = compiler
+    return _spirv_compilers[glslang]
+
+
+# Binary data embedding.
+#
+# Generated sources used to write embedded data one byte per line, which made the
+# largest blobs (ICU data, fonts, compressed docs) slow to both generate and compile.
+# Buffers are now formatted in bulk, and the embedding form is chosen per toolchain.
+
+EMBED_MODES = ("auto", "array", "string", "incbin")
+EMBED_BYTES_PER_LINE = 32
+
+_EMBED_ARRAY_TABLE = [f"{x}," for x in range(256)]
+_EMBED_CSTRING_TABLE = {x: chr(x) if 32 <= x < 127 and chr(x) not in '"\\?' else f"\\{x:03o}" for x in range(256)}
+_embed_mode_warnings = set()
+
+
+def get_embed_mode(env) -> str:
+    """
+    Resolves the `embed_mode` option into the form binary data should be embedded
+    with for the current toolchain:
+
+    - `array`: A brace-enclosed byte initializer; supported everywhere.
+    - `string`: A string literal initializer; much faster to parse, but MSVC
+    limits the size of string literals.
+    - `incbin`: An assembler `.incbin` stub referencing a file written next to the
+    generated source; skips the compiler front end entirely (GCC/Clang without LTO).
+    """
+    mode = str(env.get("embed_mode", "auto"))
+    msvc = bool(getattr(env, "msvc", False)) and not using_clang(env)
+    gnu_asm = not msvc and not (env.get("CC") and using_emcc(env))
+
+    if mode == "auto":
+        return "array" if msvc else "string"
+    if mode == "string" and msvc:
+        fallback = "array"
+    elif mode == "incbin" and (not gnu_asm or env.get("lto", "none") != "none"):
+        # LTO merges top-level assembly from all translation units, duplicating the symbols.
+        fallback = "array" if msvc else "string"
+    else:
+        return mode
+
+    if mode not in _embed_mode_warnings:
+        _embed_mode_warnings.add(mode)
+        print_warning(f'Embed mode "{mode}" is not supported by the current toolchain; using "{fallback}" instead.')
+    return fallback
+
+
+def format_buffer(buffer: bytes, indent: int = 1) -> str:
+    """Formats `buffer` as the contents of a C array initializer, many bytes per line."""
+    prefix = "\t" * indent
+    table = _EMBED_ARRAY_TABLE
+    return "\n".join(
+        prefix + "".join([table[x] for x in buffer[offset : offset + EMBED_BYTES_PER_LINE]])
+        for offset in range(0, len(buffer), EMBED_BYTES_PER_LINE)
+    )
+
+
+def format_cstring_buffer(buffer: bytes, indent: int = 1) -> str:
+    """Formats `buffer` as a sequence of adjacent C string literals, escaping any byte that isn't printable ASCII."""
+    if not buffer:
+        return "\t" * indent + '""'
+    prefix = "\t" * indent + '"'
+    table = _EMBED_CSTRING_TABLE
+    # Octal escapes always use 3 digits, so they can't merge with a following digit.
+    return "\n".join(
+        prefix + buffer[offset : offset + EMBED_BYTES_PER_LINE].decode("latin-1").translate(table) + '"'
+        for offset in range(0, len(buffer), EMBED_BYTES_PER_LINE)
+    )
+
+
+_INCBIN_PREAMBLE = """\
+#ifndef GODOT_INCBIN
+#define GODOT_INCBIN_STR_IMPL(m_x) #m_x
+#define GODOT_INCBIN_STR(m_x) GODOT_INCBIN_STR_IMPL(m_x)
+#define GODOT_INCBIN_SYM(m_name) GODOT_INCBIN_STR(__USER_LABEL_PREFIX__) GODOT_INCBIN_STR(m_name)
+#if defined(__APPLE__)
+#define GODOT_INCBIN_SECTION(m_name) ".const_data\\n.weak_definition " GODOT_INCBIN_SYM(m_name) "\\n"
+#define GODOT_INCBIN_END ".text\\n"
+#elif defined(_WIN32)
+#define GODOT_INCBIN_SECTION(m_name) ".section .rdata$" GODOT_INCBIN_STR(m_name) ",\\"dr\\"\\n.linkonce discard\\n"
+#define GODOT_INCBIN_END ".text\\n"
+#else
+#define GODOT_INCBIN_SECTION(m_name) ".pushsection .rodata." GODOT_INCBIN_STR(m_name) ",\\"aG\\",%progbits," GODOT_INCBIN_STR(m_name) ",comdat\\n"
+#define GODOT_INCBIN_END ".popsection\\n"
+#endif
+#define GODOT_INCBIN(m_name, m_path) __asm__(GODOT_INCBIN_SECTION(m_name) ".globl " GODOT_INCBIN_SYM(m_name) "\\n.balign 16\\n" GODOT_INCBIN_SYM(m_name) ":\\n.incbin \\"" m_path "\\"\\n.byte 0\\n" GODOT_INCBIN_END)
+#endif // GODOT_INCBIN
+"""
+
+
+def write_file_if_changed(path: str, content: Union[str, bytes]) -> bool:
+    """Writes `content` to `path` unless the file already holds it, to avoid needlessly bumping its mtime."""
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    try:
+        with open(path, "rb") as file:
+            if file.read() == data:
+                return False
+    except OSError:
+        pass
+    with open(path, "wb") as file:
+        file.write(data)
+    return True
+
+
+def get_embed_bin_path(path: str, name: str) -> str:
+    """Returns the path of the file the `incbin` mode of `embed_buffer` writes `name`'s data to."""
+    return f"{os.path.splitext(str(path))[0]}.{name.strip('_').lower()}.bin"
+
+
+def embed_buffer(
+    env,
+    path: str,
+    name: str,
+    buffer: bytes,
+    linkage: str = "static",
+    objects: Optional[List[Tuple[str, bytes]]] = None,
+    symbol: str = "",
+) -> str:
+    """
+    Returns the C++ definition of a `const unsigned char name[]` array holding
+    `buffer`, in the form returned by `get_embed_mode`.
+
+    - `path`: The path of the generated source the definition will be written to.
+    Only used by the `incbin` mode, which writes the data to a sibling file.
+    - `linkage`: Storage class and linkage specifiers of the array. Non-static
+    arrays keep their exact symbol name, so they can be referenced externally.
+    - `objects`: If set, only a declaration is returned, and the data is appended
+    to this list for `write_embed_object` to write instead.
+    - `symbol`: The symbol `name` expands to, if it's a macro. Only used for
+    non-static arrays written to an object file.
+
+    Only the `array` and `string` forms can be used in constant expressions, and
+    the `string` form has an extra null terminator; use an explicit size.
+    """
+    if objects is not None:
+        if linkage == "static":
+            symbol = "godot_{}_{}".format(os.path.basename(str(path)).split(".")[0], name.strip("_"))
+            objects.append((symbol, buffer))
+            return (
+                f'extern "C" const unsigned char {symbol}[{len(buffer)}];\n'
+                f"static const unsigned char (&{name})[{len(buffer)}] = {symbol};\n"
+            )
+        objects.append((symbol or name, buffer))
+        return f"{linkage} const unsigned char {name}[{len(buffer)}];\n"
+
+    mode = get_embed_mode(env)
+
+    if mode == "array":
+        return f"{linkage} const unsigned char {name}[] = {{\n{format_buffer(buffer)}\n}};\n"
+    if mode == "string":
+        return f"{linkage} const unsigned char {name}[] =\n{format_cstring_buffer(buffer)};\n"
+
+    digest = hashlib.sha256(buffer).hexdigest()
+    bin_path = get_embed_bin_path(path, name)
+    write_file_if_changed(bin_path, buffer)
+    bin_path = os.path.abspath(bin_path).replace("\\", "/").replace('"', '\\"')
+
+    if linkage == "static":
+        # Unique per content, so identical blobs embedded by different headers get merged.
+        symbol = f"godot_incbin_{digest[:16]}"
+        declaration = f"extern const unsigned char {name}[] __asm__(GODOT_INCBIN_SYM({symbol}));"
+    else:
+        symbol = name
+        declaration = f"{linkage} const unsigned char {name}[];"
+
+    # The digest makes the header change whenever the data does, so the compiler and ccache notice.
+    return f"""\
+{_INCBIN_PREAMBLE}
+// {os.path.basename(bin_path)} (sha256: {digest})
+GODOT_INCBIN({symbol}, "{bin_path}");
+{declaration}
+"""
+
+
+# Direct object file output.
+#
+# Embedding builders can skip the C++ compiler entirely by writing the data into a
+# relocatable object file, along with a header only holding the declarations.
+
+EMBED_OBJECT_BUILDERS = ("doc", "fonts", "icu")
+
+# platform -> arch -> (format, machine)
+_EMBED_OBJECT_MACHINES = {
+    "linuxbsd": {"x86_64": ("elf64", 62), "x86_32": ("elf32", 3), "arm64": ("elf64", 183), "rv64": ("elf64", 243)},
+    "android": {"x86_64": ("elf64", 62), "x86_32": ("elf32", 3), "arm64": ("elf64", 183)},
+    "windows": {"x86_64": ("coff", 0x8664), "x86_32": ("coff", 0x14C), "arm64": ("coff", 0xAA64)},
+    "macos": {"x86_64": ("macho", 0x01000007), "arm64": ("macho", 0x0100000C)},
+    "ios": {"x86_64": ("macho", 0x01000007), "arm64": ("macho", 0x0100000C)},
+}
+_embed_object_warnings = set()
+
+
+def get_embed_object_format(env) -> Optional[Tuple[str, int]]:
+    """Returns the object file format and machine type for the current target, or `None` if unsupported."""
+    return _EMBED_OBJECT_MACHINES.get(env.get("platform", ""), {}).get(env.get("arch", ""))
+
+
+def use_embed_object(env, builder: str) -> bool:
+    """Returns whether the `embed_object` option requests `builder` to write its data as an object file."""
+    requested = [x.strip() for x in env.get("embed_object", "").split(",") if x.strip()]
+    if builder not in requested and "all" not in requested:
+        return False
+    if get_embed_object_format(env) is None:
+        if builder not in _embed_object_warnings:
+            _embed_object_warnings.add(builder)
+            print_warning(
+                f'Object file embedding is not supported for platform "{env.get("platform")}" and arch '
+                f'"{env.get("arch")}"; "{builder}" data will be embedded in generated sources instead.'
+            )
+        return False
+    return True
+
+
+def get_embed_object_targets(env, builder: str, header: str) -> List[str]:
+    """
+    Returns the targets of an embedding builder generating `header`: the header
+    alone, or followed by an object file if `use_embed_object` allows it. The
+    builder should then pass a list to `embed_buffer`'s `objects` argument, and
+    write it to the second target with `write_embed_object`.
+    """
+    if not use_embed_object(env, builder):
+        return [header]
+    return [header, header.rsplit(".", 1)[0] + env.subst("$OBJSUFFIX")]
+
+
+def _embed_object_symbol(env, symbol: str) -> str:
+    object_format, machine = cast(Tuple[str, int], get_embed_object_format(env))
+    # C symbols get an underscore prefix on Mach-O and 32-bit Windows.
+    if object_format == "macho" or (object_format == "coff" and machine == 0x14C):
+        return "_" + symbol
+    return symbol
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) & ~(alignment - 1)
+
+
+def _pack_embed_section(symbols: List[Tuple[str, bytes]], alignment: int = 16) -> Tuple[bytes, List[int]]:
+    data = bytearray()
+    offsets = []
+    for _, buffer in symbols:
+        data += bytes(_align(len(data), alignment) - len(data))
+        offsets.append(len(data))
+        data += buffer
+    return bytes(data), offsets
+
+
+def _make_string_table(names: List[str], initial: bytes = b"\0") -> Tuple[bytes, List[int]]:
+    table = bytearray(initial)
+    offsets = []
+    for name in names:
+        offsets.append(len(table))
+        table += name.encode("utf-8") + b"\0"
+    return bytes(table), offsets
+
+
+def _write_elf_object(bits: int, machine: int, symbols: List[Tuple[str, bytes]]) -> bytes:
+    import struct
+
+    is64 = bits == 64
+    data, offsets = _pack_embed_section(symbols)
+    strtab, name_offsets = _make_string_table([name for name, _ in symbols])
+    shstrtab, section_names = _make_string_table([".rodata", ".note.GNU-stack", ".symtab", ".strtab", ".shstrtab"])
+
+    symtab = bytearray(24 if is64 else 16)  # Null symbol.
+    for (_, buffer), name_offset, offset in zip(symbols, name_offsets, offsets):
+        info = (1 << 4) | 1  # STB_GLOBAL, STT_OBJECT.
+        if is64:
+            symtab += struct.pack("<IBBHQQ", name_offset, info, 0, 1, offset, len(buffer))
+        else:
+            symtab += struct.pack("<IIIBBH", name_offset, offset, len(buffer), info, 0, 1)
+
+    ehsize = 64 if is64 else 52
+    shentsize = 64 if is64 else 40
+    # (name, type, flags, contents, link, info, alignment, entsize)
+    sections = [
+        (section_names[0], 1, 2, data, 0, 0, 16, 0),  # SHT_PROGBITS, SHF_ALLOC.
+        (section_names[1], 1, 0, b"", 0, 0, 1, 0),  # Marks the stack as non-executable.
+        (section_names[2], 2, 0, bytes(symtab), 4, 1, 8 if is64 else 4, 24 if is64 else 16),  # SHT_SYMTAB.
+        (section_names[3], 3, 0, strtab, 0, 0, 1, 0),  # SHT_STRTAB.
+        (section_names[4], 3, 0, shstrtab, 0, 0, 1, 0),
+    ]
+
+    body = bytearray()
+    headers = bytearray(shentsize)  # Null section.
+    for name, type, flags, contents, link, info, alignment, entsize in sections:
+        offset = _align(ehsize + len(body), alignment)
+        body += bytes(offset - ehsize - len(body)) + contents
+        fmt = "<IIQQQQIIQQ" if is64 else "<IIIIIIIIII"
+        headers += struct.pack(fmt, name, type, flags, 0, offset, len(contents), link, info, alignment, entsize)
+
+    shoff = _align(ehsize + len(body), 8)
+    body += bytes(shoff - ehsize - len(body))
+    ident = b"\x7fELF" + bytes([2 if is64 else 1, 1, 1, 0]) + bytes(8)
+    # RISC-V objects need to declare the double-float ABI and compressed instructions to link with the rest.
+    flags = 0x5 if machine == 243 else 0
+    fmt = "<16sHHIQQQIHHHHHH" if is64 else "<16sHHIIIIIHHHHHH"
+    header = struct.pack(
+        fmt, ident, 1, machine, 1, 0, 0, shoff, flags, ehsize, 0, 0, shentsize, len(sections) + 1, len(sections)
+    )
+    return header + bytes(body) + bytes(headers)
+
+
+def _write_coff_object(machine: int, symbols: List[Tuple[str, bytes]]) -> bytes:
+    import struct
+
+    data, offsets = _pack_embed_section(symbols)
+    string_table = bytearray(4)
+    symbol_table = bytearray()
+
+    def add_symbol(name: str, value: int, section: int, storage_class: int):
+        nonlocal string_table, symbol_table
+        encoded = name.encode("utf-8")
+        if len(encoded) <= 8:
+            short_name = encoded.ljust(8, b"\0")
+        else:
+            short_name = struct.pack("<II", 0, len(string_table))
+            string_table += encoded + b"\0"
+        symbol_table += struct.pack("<8sIhHBB", short_name, value, section, 0, storage_class, 0)
+
+    if machine == 0x14C:
+        # Declares the object as SAFESEH-compatible, which MSVC requires for 32-bit images.
+        add_symbol("@feat.00", 1, -1, 3)  # IMAGE_SYM_ABSOLUTE, IMAGE_SYM_CLASS_STATIC.
+    for (name, _), offset in zip(symbols, offsets):
+        add_symbol(name, offset, 1, 2)  # IMAGE_SYM_CLASS_EXTERNAL.
+    string_table[0:4] = struct.pack("<I", len(string_table))
+
+    header_size = 20 + 40
+    data_offset = header_size
+    symbol_offset = data_offset + len(data)
+    # IMAGE_SCN_CNT_INITIALIZED_DATA | IMAGE_SCN_ALIGN_16BYTES | IMAGE_SCN_MEM_READ.
+    characteristics = 0x00000040 | 0x00500000 | 0x40000000
+    file_header = struct.pack("<HHIIIHH", machine, 1, 0, symbol_offset, len(symbol_table) // 18, 0, 0)
+    section_header = struct.pack("<8sIIIIIIHHI", b".rdata", 0, 0, len(data), data_offset, 0, 0, 0, 0, characteristics)
+    return file_header + section_header + data + bytes(symbol_table) + bytes(string_table)
+
+
+def _write_macho_object(env, cputype: int, symbols: List[Tuple[str, bytes]]) -> bytes:
+    import struct
+
+    data, offsets = _pack_embed_section(symbols)
+    # Symbols defined in the same section should be sorted by address, which the packing order already does.
+    strtab, name_offsets = _make_string_table([name for name, _ in symbols], b" \0")
+    strtab += bytes(_align(len(strtab), 8) - len(strtab))
+
+    if env.get("platform") == "ios":
+        platform, minos = (7, 12 << 16) if env.get("ios_simulator") else (2, 12 << 16)
+    else:
+        platform, minos = 1, (11 << 16) if env.get("arch") == "arm64" else ((10 << 16) | (13 << 8))
+
+    segment_size = 72 + 80
+    commands_size = segment_size + 24 + 24 + 80
+    data_offset = _align(32 + commands_size, 16)
+    symbol_offset = _align(data_offset + len(data), 8)
+    string_offset = symbol_offset + 16 * len(symbols)
+    cpusubtype = 3 if cputype == 0x01000007 else 0
+
+    # MH_OBJECT, MH_SUBSECTIONS_VIA_SYMBOLS.
+    header = struct.pack("<IiiIIIII", 0xFEEDFACF, cputype, cpusubtype, 1, 4, commands_size, 0x2000, 0)
+    segment = struct.pack("<II16sQQQQiiII", 0x19, segment_size, b"", 0, len(data), data_offset, len(data), 7, 7, 1, 0)
+    section = struct.pack("<16s16sQQIIIIIIII", b"__const", b"__TEXT", 0, len(data), data_offset, 4, 0, 0, 0, 0, 0, 0)
+    build_version = struct.pack("<IIIIII", 0x32, 24, platform, minos, 0, 0)
+    symtab = struct.pack("<IIIIII", 0x2, 24, symbol_offset, len(symbols), string_offset, len(strtab))
+    dysymtab = struct.pack("<II18I", 0xB, 80, 0, 0, 0, len(symbols), len(symbols), 0, *([0] * 12))
+
+    nlist = bytearray()
+    for name_offset, offset in zip(name_offsets, offsets):
+        nlist += struct.pack("<IBBHQ", name_offset, 0xF, 1, 0, offset)  # N_SECT | N_EXT.
+
+    output = bytearray(header + segment + section + build_version + symtab + dysymtab)
+    output += bytes(data_offset - len(output)) + data
+    output += bytes(symbol_offset - len(output)) + nlist + strtab
+    return bytes(output)
+
+
+def write_embed_object(env, path, symbols: List[Tuple[str, bytes]]) -> None:
+    """Writes a relocatable object file for the current target, defining a read-only array for each symbol."""
+    if not isinstance(path, str):
+        path = path.get_abspath() if hasattr(path, "get_abspath") else str(path)
+    object_format, machine = cast(Tuple[str, int], get_embed_object_format(env))
+    symbols = [(_embed_object_symbol(env, name), buffer) for name, buffer in symbols]
+
+    if object_format == "coff":
+        output = _write_coff_object(machine, symbols)
+    elif object_format == "macho":
+        output = _write_macho_object(env, machine, symbols)
+    else:
+        output = _write_elf_object(64 if object_format == "elf64" else 32, machine, symbols)
+
+    with open(path, "wb") as file:
+        file.write(output)
+
+
+# Compression cache.
+#
+# Embedded data is compressed at the maximum level, which is slow and repeated by
+# every build of the same sources. Results are cached on disk, keyed by the digest
+# of the input along with the codec and level, so they can be shared across builds
+# and build directories.
+
+_compression_caches = {}
+_compression_caches_lock = threading.Lock()
+
+# Codecs selectable with `embed_codec`, with the level used to compress embedded data,
+# and the matching `Compression::Mode` used to decompress it at runtime.
+EMBED_CODECS = {
+    "deflate": (zlib.Z_BEST_COMPRESSION, "Compression::MODE_DEFLATE"),
+    "zstd": (19, "Compression::MODE_ZSTD"),
+}
+
+
+def _get_zstd_compress() -> Optional[Callable[[bytes, int], bytes]]:
+    try:
+        import zstandard  # type: ignore
+
+        return lambda buffer, level: zstandard.ZstdCompressor(level=level).compress(buffer)
+    except ImportError:
+        pass
+    try:
+        # Part of the standard library since Python 3.14.
+        from compression import zstd  # type: ignore
+
+        return lambda buffer, level: zstd.compress(buffer, level)
+    except ImportError:
+        return None
+
+
+def is_embed_codec_available(codec: str) -> bool:
+    return codec == "deflate" or (codec == "zstd" and _get_zstd_compress() is not None)
+
+
+def compress_raw(buffer: bytes, codec: str = "deflate", level: int = zlib.Z_BEST_COMPRESSION) -> bytes:
+    if codec == "deflate":
+        return zlib.compress(buffer, level)
+    if codec == "zstd":
+        compress = _get_zstd_compress()
+        if compress is None:
+            raise ValueError('Compressing with zstd requires the "zstandard" Python module.')
+        return compress(buffer, level)
+    raise ValueError(f'Unsupported compression codec "{codec}".')
+
+
+def compress_cached(
+    cache_path: str, buffer: bytes, codec: str = "deflate", level: int = zlib.Z_BEST_COMPRESSION
+) -> Tuple[bytes, bool]:
+    """
+    Compresses `buffer`, reusing the result stored in `cache_path` by a previous
+    call if there is one. Safe to call from multiple threads and processes.
+    Returns the compressed data, and whether it was found in the cache.
+    """
+    entry = os.path.join(cache_path, f"{hashlib.sha256(buffer).hexdigest()}.{codec}{level}")
+    try:
+        with open(entry, "rb") as file:
+            data = file.read()
+        # Refresh the entry, so least recently used ones get evicted first.
+        os.utime(entry)
+        return data, True
+    except OSError:
+        pass
+
+    data = compress_raw(buffer, codec, level)
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        # Write to a temporary file first, so concurrent readers never see a partial entry.
+        temp = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "wb") as file:
+            file.write(data)
+        os.replace(temp, entry)
+    except OSError:
+        print_warning(f'Failed to write compression cache entry "{entry}".')
+    return data, False
+
+
+class CompressionCache:
+    def __init__(self, path: str, limit: int, verbose: bool):
+        self.path = path
+        self.limit = limit
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def compress(self, buffer: bytes, codec: str = "deflate", level: int = zlib.Z_BEST_COMPRESSION) -> bytes:
+        data, hit = compress_cached(self.path, buffer, codec, level)
+        self.record(hit)
+        return data
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def finish(self) -> None:
+        if self.verbose and (self.hits or self.misses):
+            print_info(f"Compression cache: {self.hits} hits, {self.misses} misses (path: {self.path}).")
+        if not self.limit:
+            return
+
+        stats = []
+        for entry in glob.glob(os.path.join(self.path, "*.*")):
+            try:
+                stats.append((entry, *os.stat(entry)[6:9:2]))  # Size, mtime.
+            except OSError:
+                pass
+
+        # Keep the most recently used entries that fit in the limit.
+        stats.sort(key=lambda x: x[2], reverse=True)
+        total = 0
+        purged = 0
+        for entry, size, _ in stats:
+            total += size
+            if total > self.limit:
+                try:
+                    os.remove(entry)
+                    purged += 1
+                except OSError:
+                    print_error(f'Failed to remove compression cache entry "{entry}"; skipping.')
+        if self.verbose and purged:
+            print_info(f"Purged {purged} entr{'ies' if purged > 1 else 'y'} from the compression cache.")
+
+
+def get_compression_cache(env) -> Optional[CompressionCache]:
+    """
+    Returns the compression cache configured by `compression_cache_path`, or a
+    `compressed` folder in `cache_path` by default. Returns `None` if disabled.
+    """
+    path = env.get("compression_cache_path", "")
+    if not path and env.get("cache_path"):
+        path = os.path.join(env["cache_path"], "compressed")
+    if not path:
+        return None
+
+    path = os.path.abspath(path)
+    with _compression_caches_lock:
+        if path not in _compression_caches:
+            # Convert MiB to bytes; treat negative numbers as 0 (unlimited).
+            limit = max(0, int(float(env.get("compression_cache_limit", "0")) * 1024 * 1024))
+            cache = CompressionCache(path, limit, bool(env.get("verbose", False)))
+            _compression_caches[path] = cache
+            atexit.register(cache.finish)
+        return _compression_caches[path]
+
+
+def get_embed_codec(env) -> Tuple[str, int]:
+    """Returns the codec selected by `embed_codec`, and the level to compress embedded data with."""
+    codec = env.get("embed_codec", "deflate")
+    return codec, EMBED_CODECS[codec][0]
+
+
+def get_embed_compression_mode(env) -> str:
+    """Returns the `Compression::Mode` that decompresses data returned by `compress_buffer`."""
+    return EMBED_CODECS[get_embed_codec(env)[0]][1]
+
+
+def compress_buffer(env, buffer: bytes) -> bytes:
+    """
+    Compresses `buffer` with the codec selected by `embed_codec`, at the level set in
+    `EMBED_CODECS`, reusing previous results from the compression cache.
+    """
+    codec, level = get_embed_codec(env)
+    cache = get_compression_cache(env)
+    if cache is None:
+        return compress_raw(buffer, codec, level)
+    return cache.compress(buffer, codec, level)
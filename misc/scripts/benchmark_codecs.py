@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the codecs selectable with `embed_codec` on the data the engine embeds
+compressed, reporting the compression ratio and decompression throughput of each.
+
+Usage: misc/scripts/benchmark_codecs.py [--repeat=N]
+
+Decompression runs through the Python bindings of zlib and zstd, which wrap the same
+libraries as `Compression::decompress`, so relative throughput carries over.
+zstd is skipped if neither the `zstandard` module nor Python 3.14+ is available.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "editor"))
+
+from editor_builders import compile_po  # noqa: E402
+
+from methods import EMBED_CODECS, compress_raw, convert_size, is_embed_codec_available  # noqa: E402
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def get_inputs():
+    # Same grouping as the builders, which compress each translation separately.
+    docs = sorted(glob.glob(os.path.join(ROOT, "doc", "classes", "*.xml")))
+    docs += sorted(glob.glob(os.path.join(ROOT, "modules", "*", "doc_classes", "*.xml")))
+    inputs = [("class reference", [b"".join(read(x) for x in docs)])]
+    for category, folder in [("editor", "editor/translations/editor"), ("doc", "doc/translations")]:
+        po_files = sorted(glob.glob(os.path.join(ROOT, folder, "*.po")))
+        inputs.append((f"{category} translations", [compile_po(read(x)) for x in po_files]))
+    inputs.append(("certificates", [read(os.path.join(ROOT, "thirdparty", "certs", "ca-certificates.crt"))]))
+    inputs.append(("extension interface", [read(os.path.join(ROOT, "core", "extension", "gdextension_interface.h"))]))
+    return [(name, buffers) for name, buffers in inputs if buffers]
+
+
+def get_decompress(codec):
+    if codec == "deflate":
+        return zlib.decompress
+    try:
+        import zstandard  # type: ignore
+
+        return zstandard.ZstdDecompressor().decompress
+    except ImportError:
+        from compression import zstd  # type: ignore
+
+        return zstd.decompress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs for each decompression measurement.")
+    args = parser.parse_args()
+
+    codecs = [codec for codec in EMBED_CODECS if is_embed_codec_available(codec)]
+    for codec in EMBED_CODECS:
+        if codec not in codecs:
+            print(f'Skipping {codec}, install the "zstandard" Python module to include it.')
+
+    print(f"{'input':<22} {'codec':<8} {'raw':>12} {'compressed':>12} {'ratio':>7} {'compress':>10} {'decode':>12}")
+    for name, buffers in get_inputs():
+        raw_size = sum(len(x) for x in buffers)
+        for codec in codecs:
+            level = EMBED_CODECS[codec][0]
+            start = time.perf_counter()
+            compressed = [compress_raw(x, codec, level) for x in buffers]
+            compress_time = time.perf_counter() - start
+            compressed_size = sum(len(x) for x in compressed)
+
+            decompress = get_decompress(codec)
+            decode_time = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for x in compressed:
+                    decompress(x)
+                decode_time = min(decode_time, time.perf_counter() - start)
+
+            print(
+                f"{name:<22} {codec:<8} {convert_size(raw_size):>12} {convert_size(compressed_size):>12} "
+                f"{raw_size / compressed_size:>7.2f} {compress_time:>9.2f}s "
+                f"{raw_size / decode_time / 1024 / 1024:>7.0f} MiB/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the generation and compile time of the binary data embedding forms
+supported by `methods.embed_buffer`, against the legacy one-byte-per-line form.
+
+Usage: misc/scripts/benchmark_embed.py [--compile] [--cxx=c++] [files...]
+
+Defaults to the largest blobs embedded by the editor (fonts and ICU data).
+"""
+
+import argparse
+import glob
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from methods import convert_size, embed_buffer  # noqa: E402
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+DEFAULT_INPUTS = [
+    "thirdparty/icu4c/icudt_godot.dat",
+    "thirdparty/fonts/DroidSansFallback.woff2",
+    "thirdparty/fonts/JetBrainsMono_Regular.woff2",
+]
+MODES = ["legacy", "array", "string", "incbin"]
+
+
+def generate_legacy(path, name, buf):
+    with open(path, "w", encoding="utf-8", newline="\n") as g:
+        g.write("static const unsigned char " + name + "[] = {\n")
+        for i in range(len(buf)):
+            g.write("\t" + str(buf[i]) + ",\n")
+        g.write("};\n")
+
+
+def generate(mode, path, name, buf):
+    if mode == "legacy":
+        generate_legacy(path, name, buf)
+        return
+    with open(path, "w", encoding="utf-8", newline="\n") as g:
+        g.write(embed_buffer({"embed_mode": mode, "CC": "cc"}, path, name, buf))
+
+
+def compile_source(cxx, header, directory):
+    source = os.path.join(directory, "embed_benchmark.cpp")
+    with open(source, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f'#include "{os.path.basename(header)}"\n')
+        f.write("const unsigned char *embed_benchmark_data() { return _embed_benchmark; }\n")
+    start = time.perf_counter()
+    result = subprocess.run(
+        shlex.split(cxx) + ["-std=gnu++17", "-c", source, "-o", source + ".o"],
+        cwd=directory,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stdout.decode(errors="replace"))
+        return None
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="Binary files to embed.")
+    parser.add_argument("--compile", action="store_true", help="Also measure the time taken to compile each form.")
+    parser.add_argument("--cxx", default=os.environ.get("CXX", "c++"), help="C++ compiler used with --compile.")
+    args = parser.parse_args()
+
+    files = args.files or [os.path.join(ROOT, x) for x in DEFAULT_INPUTS if glob.glob(os.path.join(ROOT, x))]
+    if not files:
+        print("No input files found.")
+        sys.exit(1)
+
+    print(f"{'file':<32} {'mode':<8} {'input':>12} {'output':>12} {'generate':>10} {'compile':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for file in files:
+            with open(file, "rb") as f:
+                buf = f.read()
+            for mode in MODES:
+                header = os.path.join(directory, f"embed_benchmark_{mode}.gen.h")
+                start = time.perf_counter()
+                generate(mode, header, "_embed_benchmark", buf)
+                generate_time = time.perf_counter() - start
+                output_size = sum(
+                    os.path.getsize(x) for x in glob.glob(os.path.join(directory, f"embed_benchmark_{mode}.gen*"))
+                )
+
+                compile_time = ""
+                if args.compile:
+                    elapsed = compile_source(args.cxx, header, directory)
+                    compile_time = "failed" if elapsed is None else f"{elapsed:.3f}s"
+
+                print(
+                    f"{os.path.basename(file):<32} {mode:<8} {convert_size(len(buf)):>12} "
+                    f"{convert_size(output_size):>12} {generate_time:>9.3f}s {compile_time:>10}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Runs each shader builder over every shader of the tree it applies to, reporting the
+wall time, peak memory and output size of each, and comparing the generated headers
+against the golden digests stored in `tests/python_build/fixtures/shader_builders_golden.json`.
+
+Usage: misc/scripts/benchmark_shader_builders.py [--repeat=N] [--update] [--verbose]
+
+Exits with an error if any output differs from its golden digest. Use `--update` after
+intended changes of the output, to store the new digests.
+
+Sources are reparsed on each run, unlike in the build where they are shared between
+builders (see `methods.get_shader_source`), so times don't depend on the order of runs.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, ROOT)
+
+import gles3_builders  # noqa: E402
+import glsl_builders  # noqa: E402
+import methods  # noqa: E402
+
+GOLDEN_PATH = os.path.join(ROOT, "tests", "python_build", "fixtures", "shader_builders_golden.json")
+
+# Builders, with the patterns (relative to the root) of the shaders they're used for.
+BUILDERS = {
+    "gles3": (
+        partial(gles3_builders.build_gles3_header, include="drivers/gles3/shader_gles3.h", class_suffix="GLES3"),
+        ["drivers/gles3/shaders/**/*.glsl"],
+    ),
+    "rd": (glsl_builders.build_rd_header, ["servers/rendering/renderer_rd/shaders/**/*.glsl"]),
+    "raw": (glsl_builders.build_raw_header, ["modules/betsy/*.glsl", "modules/lightmapper_rd/*.glsl"]),
+}
+
+
+def get_shaders(builder):
+    """Returns the shaders `builder` applies to, relative to the root, excluding includes."""
+    shaders = []
+    for pattern in BUILDERS[builder][1]:
+        shaders += [os.path.relpath(x, ROOT) for x in glob.glob(os.path.join(ROOT, pattern), recursive=True)]
+    return sorted(x.replace("\\", "/") for x in shaders if not x.endswith("_inc.glsl"))
+
+
+def run_builder(builder, directory, trace_memory=False):
+    """
+    Runs `builder` on each of its shaders, writing the headers to `directory`. Must be
+    called from the root. Returns the digest of each header, the total time taken, the
+    peak memory allocated by the builder (if traced, which slows it down), and the total
+    size of the headers.
+    """
+    function = BUILDERS[builder][0]
+    methods._shader_source_cache.clear()
+
+    outputs = {}
+    elapsed = 0.0
+    peak = 0
+    for shader in get_shaders(builder):
+        output = os.path.join(directory, builder, shader + ".gen.h")
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        function(shader, optional_output_filename=output)
+        elapsed += time.perf_counter() - start
+        if trace_memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        outputs[shader] = output
+
+    digests = {}
+    size = 0
+    for shader, output in outputs.items():
+        with open(output, "rb") as file:
+            data = file.read()
+        digests[shader] = hashlib.sha256(data).hexdigest()
+        size += len(data)
+    return digests, elapsed, peak, size
+
+
+def load_golden():
+    with open(GOLDEN_PATH, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def compare_digests(expected, actual):
+    """Returns the shaders whose output differs, was added, or was removed."""
+    return sorted(x for x in set(expected) | set(actual) if expected.get(x) != actual.get(x))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs for each builder, keeping the fastest.")
+    parser.add_argument("--update", action="store_true", help="Store the digests of the outputs as golden ones.")
+    parser.add_argument("--verbose", action="store_true", help="List the shaders whose output differs.")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    golden = {} if args.update else load_golden()
+    results = {}
+    failed = False
+
+    print(f"{'builder':<8} {'shaders':>8} {'time':>10} {'peak memory':>12} {'output':>12}  golden")
+    with tempfile.TemporaryDirectory() as directory:
+        for builder in BUILDERS:
+            digests, _, peak, size = run_builder(builder, directory, trace_memory=True)
+            elapsed = min(run_builder(builder, directory)[1] for _ in range(max(1, args.repeat)))
+            results[builder] = digests
+
+            if args.update:
+                status = "updated"
+            else:
+                mismatches = compare_digests(golden.get(builder, {}), digests)
+                failed |= bool(mismatches)
+                status = f"{len(mismatches)} mismatches" if mismatches else "ok"
+                if args.verbose:
+                    for shader in mismatches:
+                        status += f"\n    {shader}"
+
+            print(
+                f"{builder:<8} {len(digests):>8} {elapsed * 1000:>8.1f}ms {methods.convert_size(peak):>12} "
+                f"{methods.convert_size(size):>12}  {status}"
+            )
+
+    if args.update:
+        with open(GOLDEN_PATH, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(results, file, indent=4, sort_keys=True)
+            file.write("\n")
+    elif failed:
+        print("Generated shader headers differ from the golden digests, use --update if this is intended.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
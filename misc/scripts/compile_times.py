@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Queries the compile and link times recorded by the build in `.scons_compile_history.json`
+(see the `compile_history` build option), which keeps the targets built by the latest builds.
+
+Usage: misc/scripts/compile_times.py [--history=PATH] <command> [options]
+
+Commands:
+    builds        Lists the recorded builds, from the oldest to the latest.
+    slowest       Lists the slowest targets, from their latest build.
+    regressions   Compares the targets built with the same flags in two builds.
+    dirs          Sums the times of the targets of each directory, from their latest build.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+sys.path.insert(0, ROOT)
+
+import compile_history  # noqa: E402
+import methods  # noqa: E402
+
+
+def format_rss(rss):
+    return methods.convert_size(rss) if rss else "-"
+
+
+def list_builds(builds, args):
+    print(f"{'build':>6} {'started':<20} {'compiles':>9} {'links':>6} {'total':>10}  command")
+    for index, build in enumerate(builds):
+        targets = build["targets"]
+        compiles = sum(x["kind"] == "compile" for x in targets)
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(build["started"]))
+        total = sum(x["time"] for x in targets)
+        print(
+            f"{index - len(builds):>6} {started:<20} {compiles:>9} {len(targets) - compiles:>6} {total:>9.1f}s  "
+            f"{build['command']}"
+        )
+
+
+def list_slowest(builds, args):
+    targets = compile_history.get_latest_targets(builds, args.kind)
+    slowest = sorted(targets.values(), key=lambda x: (-x["time"], x["path"]))[: args.count]
+    print(f"{'time':>9} {'peak RSS':>12} {'kind':<8} path")
+    for target in slowest:
+        print(f"{target['time']:>8.2f}s {format_rss(target['rss']):>12} {target['kind']:<8} {target['path']}")
+
+
+def list_regressions(builds, args):
+    try:
+        old, new = builds[args.old], builds[args.new]
+    except IndexError:
+        print(f"Only {len(builds)} builds are recorded, see the `builds` command.")
+        sys.exit(1)
+
+    changes = compile_history.compare_builds(old, new)
+    if not changes:
+        print("No target was built with the same flags in both builds.")
+        return
+    print(f"{'old':>9} {'new':>9} {'change':>8} {'kind':<8} path")
+    for kind, path, old_time, new_time in changes:
+        if abs(new_time - old_time) < args.threshold * max(old_time, 0.001):
+            continue
+        change = (new_time - old_time) / max(old_time, 0.001)
+        print(f"{old_time:>8.2f}s {new_time:>8.2f}s {change:>+8.0%} {kind:<8} {path}")
+    old_total = sum(x[2] for x in changes)
+    new_total = sum(x[3] for x in changes)
+    print(f"{len(changes)} targets in both builds, {old_total:.1f}s before and {new_total:.1f}s after.")
+
+
+def list_directories(builds, args):
+    targets = compile_history.get_latest_targets(builds, args.kind)
+    totals = compile_history.get_directory_totals(targets, args.depth)
+    print(f"{'time':>10} {'targets':>8} directory")
+    for directory, (count, total) in sorted(totals.items(), key=lambda x: (-x[1][1], x[0])):
+        print(f"{total:>9.1f}s {count:>8} {directory}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default=compile_history.get_history_path(), help="Path to the history file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("builds", help="List the recorded builds.").set_defaults(function=list_builds)
+
+    slowest = subparsers.add_parser("slowest", help="List the slowest targets.")
+    slowest.add_argument("--count", type=int, default=20, help="Number of targets to list.")
+    slowest.add_argument("--kind", choices=["compile", "link"], help="Only list targets of this kind.")
+    slowest.set_defaults(function=list_slowest)
+
+    regressions = subparsers.add_parser("regressions", help="Compare two builds.")
+    regressions.add_argument("--old", type=int, default=-2, help="Index of the old build (negative from the latest).")
+    regressions.add_argument("--new", type=int, default=-1, help="Index of the new build (negative from the latest).")
+    regressions.add_argument("--threshold", type=float, default=0.1, help="Minimum relative change to list.")
+    regressions.set_defaults(function=list_regressions)
+
+    directories = subparsers.add_parser("dirs", help="Sum the times of each directory.")
+    directories.add_argument("--depth", type=int, default=2, help="Number of directory levels to group by.")
+    directories.add_argument("--kind", choices=["compile", "link"], default="compile", help="Kind of targets to sum.")
+    directories.set_defaults(function=list_directories)
+
+    args = parser.parse_args()
+    builds = compile_history.load_builds(args.history)
+    if not builds:
+        print(f'No build recorded in "{args.history}", build with `compile_history=yes` to record one.')
+        sys.exit(1)
+    args.function(builds, args)
+
+
+if __name__ == "__main__":
+    main()
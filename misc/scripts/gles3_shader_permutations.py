@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ranks the GLES3 shaders by the number of programs they can compile to at runtime, from
+the manifest the build generates in `drivers/gles3/shaders/shader_manifest.gen.json`.
+
+Usage: misc/scripts/gles3_shader_permutations.py [--manifest=PATH] [--verbose]
+
+All variants are compiled with the default specializations when a shader version is
+created, and each other combination of specialization bits is compiled on first use,
+stalling the frame that needs it. Shaders with materials (such as `scene`) get one
+version per material, so their counts apply to each material.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+MANIFEST_PATH = os.path.join(ROOT, "drivers", "gles3", "shaders", "shader_manifest.gen.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="Path to the manifest generated by the build.")
+    parser.add_argument("--verbose", action="store_true", help="List the specializations of each shader.")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.manifest):
+        print(f'Manifest "{args.manifest}" not found, build with the GLES3 driver enabled to generate it.')
+        sys.exit(1)
+    with open(args.manifest, "r", encoding="utf-8") as file:
+        shaders = json.load(file)["shaders"]
+
+    shaders.sort(key=lambda x: (-x["worst_case_permutations"], x["file"]))
+    print(f"{'shader':<56} {'variants':>8} {'spec bits':>9} {'uniforms':>8} {'worst case':>14}")
+    for shader in shaders:
+        print(
+            f"{shader['file']:<56} {shader['compiled_per_version']:>8} {len(shader['specializations']):>9} "
+            f"{shader['uniforms']:>8} {shader['worst_case_permutations']:>14,}"
+        )
+        if args.verbose:
+            for specialization in shader["specializations"]:
+                default = " (default)" if specialization["default"] else ""
+                print(f"    {specialization['bit']:>10}  {specialization['name']}{default}")
+
+    print(
+        f"{len(shaders)} shaders, {sum(x['compiled_per_version'] for x in shaders)} programs compiled per version, "
+        f"{sum(x['worst_case_permutations'] for x in shaders):,} in the worst case."
+    )
+
+
+if __name__ == "__main__":
+    main()
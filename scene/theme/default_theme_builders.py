@@ -3,6 +3,8 @@
 import os
 import os.path
 
+from methods import embed_buffer, write_embed_object
+
 
 def make_fonts_header(target, source, env):
     dst = str(target[0])
@@ -12,6 +14,9 @@ def make_fonts_header(target, source, env):
         g.write("#ifndef _DEFAULT_FONTS_H\n")
         g.write("#define _DEFAULT_FONTS_H\n")
 
+        # The data is written to an object file instead if one was requested as second target.
+        objects = [] if len(target) > 1 else None
+
         # Saving uncompressed, since FreeType will reference from memory pointer.
         for i in range(len(source)):
             file = str(source[i])
@@ -21,10 +26,9 @@ def make_fonts_header(target, source, env):
             name = os.path.splitext(os.path.basename(file))[0]
 
             g.write("static const int _font_" + name + "_size = " + str(len(buf)) + ";\n")
-            g.write("static const unsigned char _font_" + name + "[] = {\n")
-            for j in range(len(buf)):
-                g.write("\t" + str(buf[j]) + ",\n")
-
-            g.write("};\n")
+            g.write(embed_buffer(env, dst, "_font_" + name, buf, objects=objects))
 
         g.write("#endif")
+
+    if objects is not None:
+        write_embed_object(env, target[1], objects)
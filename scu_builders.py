@@ -1,9 +1,12 @@
 """Functions used to generate scu build source files during build time"""
 
-import glob
+import json
 import math
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Tuple, Union
 
 from methods import print_error
 
@@ -12,48 +15,87 @@ base_folder_only = os.path.basename(os.path.normpath(base_folder_path))
 _verbose = False  # Set manually for debug prints
 _scu_folders = set()
 _max_includes_per_scu = 1024
-
-
-def clear_out_stale_files(output_folder, extension, fresh_files):
-    output_folder = os.path.abspath(output_folder)
-    # print("clear_out_stale_files from folder: " + output_folder)
-
-    if not os.path.isdir(output_folder):
-        # folder does not exist or has not been created yet,
-        # no files to clearout. (this is not an error)
-        return
-
-    for file in glob.glob(output_folder + "/*." + extension):
-        file = Path(file)
-        if file not in fresh_files:
-            # print("removed stale file: " + str(file))
-            os.remove(file)
+# Compile time (in seconds) of source files, by path relative to the root, when known.
+_compile_times: Dict[str, float] = {}
+# Cost added to the size of a file for each of its includes, as headers to parse are
+# what usually dominates compile time.
+_include_cost = 4096
+# Symbols of source files which could collide in SCU files (see `get_file_symbols`), by
+# path, with the modification time and size of the file they were found in. They're
+# stored between builds, as finding them for the whole tree takes about a second.
+# Entries are `[mtime_ns, size, symbols]`, as read back from JSON.
+_symbols_cache_path = base_folder_path + ".scons_scu_symbols.json"
+_symbols_cache: Dict[str, List[Union[int, List[List[str]]]]] = {}
+_symbols_cache_changed = False
+
+# Comments, string and character literals (replaced to simplify the analysis of symbols),
+# and the tokens left in code once preprocessor directives are removed.
+_re_strip = re.compile(
+    r'//[^\n]*|/\*.*?\*/|R"([^(\s]*)\(.*?\)\1"|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.DOTALL
+)
+_re_define = re.compile(r"^[ \t]*#[ \t]*(define|undef)[ \t]+(\w+)(.*)$", re.MULTILINE)
+_re_directive = re.compile(r"^[ \t]*#.*$", re.MULTILINE)
+_re_token = re.compile(r"\w+|::|\S")
+_re_delimiter = re.compile(r"[{};]")
+_declaration_ends = {"(", "=", "[", ";", "{", ",", ":"}
+_type_keywords = {"class", "struct", "union", "enum"}
+# Sources added to the build with a pattern, such as `env.add_source_files(sources, "*.cpp")`,
+# which are those that can be replaced by SCU files (see `methods.add_source_files_scu`).
+_re_add_source_files = re.compile(r"""\.add_source_files\([^,()]+,\s*["']([\w/]*?)\*\.(cpp|c)["']\s*[,)]""")
+# Files unified and excluded (as exceptions) in each SCU folder, by folder.
+_scu_file_counts: Dict[str, Tuple[int, int]] = {}
+
+
+def get_abs_path(path):
+    """Returns the absolute path of `path`, relative to the root unless it's already absolute."""
+    return path if os.path.isabs(path) else base_folder_path + path
+
+
+def get_folder_key(path):
+    """
+    Returns the key of the folder at (absolute) `path` in SCU folders, which is its path
+    relative to the root, or its absolute path for folders outside of it (like custom
+    modules), as given by SCons for the folders of source files.
+    """
+    path = os.path.normpath(path)
+    relative = os.path.relpath(path, base_folder_path)
+    if relative.startswith(".."):
+        return path.replace("\\", "/")
+    return relative.replace("\\", "/")
 
 
 def folder_not_found(folder):
-    abs_folder = base_folder_path + folder + "/"
+    abs_folder = get_abs_path(folder) + "/"
     return not os.path.isdir(abs_folder)
 
 
-def find_files_in_folder(folder, sub_folder, include_list, extension, sought_exceptions, found_exceptions):
-    abs_folder = base_folder_path + folder + "/" + sub_folder
+def find_files_in_folder(folder, sub_folder, extension, sought_exceptions):
+    """
+    Returns the includes of the source files (with `extension`) of `sub_folder` in `folder`,
+    and those of the files listed in `sought_exceptions`. Paths are absolute rather than
+    relative to the working directory, so folders can be scanned from several threads.
+    """
+    abs_folder = get_abs_path(folder) + "/" + sub_folder
+    include_list = []
+    found_exceptions = []
 
-    if not os.path.isdir(abs_folder):
+    try:
+        with os.scandir(abs_folder) as it:
+            files = sorted(entry.name for entry in it if entry.is_file())
+    except OSError:
         print_error(f'SCU: "{abs_folder}" not found.')
         return include_list, found_exceptions
 
-    os.chdir(abs_folder)
-
     sub_folder_slashed = ""
     if sub_folder != "":
         sub_folder_slashed = sub_folder + "/"
 
-    for file in glob.glob("*." + extension):
-        simple_name = Path(file).stem
-
-        if file.endswith(".gen.cpp"):
+    for file in files:
+        # Hidden files are skipped, like `glob` does.
+        if file.startswith(".") or not file.endswith("." + extension) or file.endswith(".gen.cpp"):
             continue
 
+        simple_name = Path(file).stem
         li = '#include "' + folder + "/" + sub_folder_slashed + file + '"'
 
         if simple_name not in sought_exceptions:
@@ -64,74 +106,376 @@ def find_files_in_folder(folder, sub_folder, include_list, extension, sought_exc
     return include_list, found_exceptions
 
 
-def write_output_file(file_count, include_list, start_line, end_line, output_folder, output_filename_prefix, extension):
-    output_folder = os.path.abspath(output_folder)
-
-    if not os.path.isdir(output_folder):
-        # create
-        os.mkdir(output_folder)
-        if not os.path.isdir(output_folder):
-            print_error(f'SCU: "{output_folder}" could not be created.')
-            return
-        if _verbose:
-            print("SCU: Creating folder: %s" % output_folder)
-
-    file_text = ""
+def estimate_compile_cost(path):
+    """Returns the estimated cost of compiling the file at `path`, from its size and includes."""
+    try:
+        with open(path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return 0
+    return len(data) + _include_cost * data.count(b"#include")
 
-    for i in range(start_line, end_line):
-        if i < len(include_list):
-            line = include_list[i]
-            li = line + "\n"
-            file_text += li
 
-    num_string = ""
-    if file_count > 0:
-        num_string = "_" + str(file_count)
+def get_include_costs(include_list):
+    """
+    Returns the cost of each include of `include_list`: its compile time if known, or
+    its estimated cost scaled to compile times (by the files where both are known).
+    """
+    paths = {li: li[len('#include "') : -1] for li in include_list}
+    estimates = {li: estimate_compile_cost(get_abs_path(path)) for li, path in paths.items()}
+    measured = {li: _compile_times[path] for li, path in paths.items() if path in _compile_times}
+    if not measured:
+        return estimates
 
-    short_filename = output_filename_prefix + num_string + ".gen." + extension
-    output_filename = output_folder + "/" + short_filename
-    output_path = Path(output_filename)
+    scale = sum(measured.values()) / max(sum(estimates[li] for li in measured), 1)
+    return {li: measured[li] if li in measured else estimates[li] * scale for li in include_list}
 
-    if not output_path.exists() or output_path.read_text() != file_text:
-        if _verbose:
-            print("SCU: Generating: %s" % short_filename)
-        output_path.write_text(file_text, encoding="utf8")
-    elif _verbose:
-        print("SCU: Generation not needed for: " + short_filename)
 
-    return output_path
+def _strip_code(match):
+    # Keep the line breaks of comments, so preprocessor directives stay on their own lines.
+    text = match.group(0)
+    if text.startswith("/"):
+        return " " + "\n" * text.count("\n")
+    return '""'
 
 
-def write_exception_output_file(file_count, exception_string, output_folder, output_filename_prefix, extension):
-    output_folder = os.path.abspath(output_folder)
-    if not os.path.isdir(output_folder):
-        print_error(f"SCU: {output_folder} does not exist.")
-        return
+def _qualify(scopes, name):
+    return "::".join(x for x in scopes + [name] if x and x != "extern")
 
-    file_text = exception_string + "\n"
 
+def _get_signature(tokens):
+    """Returns the parameter types of the parameter list starting `tokens`, without names or default values."""
+    signature = []
+    depth = 0
+    default = False
+    for i, token in enumerate(tokens):
+        depth += (token in "(<[") - (token in ")>]")
+        if depth == 0:
+            break
+        if depth == 1 and token == ",":
+            default = False
+        elif default or (depth == 1 and token == "="):
+            default = True
+            continue
+        # Skip parameter names, which are followed by the end of the parameter.
+        if token.isidentifier() and tokens[i + 1] in (",", ")", "=", "[") and signature[-1:] not in (["("], [","]):
+            continue
+        signature.append(token)
+    return " ".join(signature) + " )"
+
+
+def _get_declared_name(tokens, local, definition):
+    """
+    Returns the name declared by the statement `tokens` at namespace scope if it could
+    collide with the same name in another file, with the parameter types of functions
+    (which can be overloaded), or `None`. That's the case for types and aliases, when
+    they're defined, and for functions and variables with internal linkage, which all
+    names in anonymous namespaces (if `local`) have.
+    """
+    if tokens[:1] == ["template"]:
+        # Skip the template parameters.
+        depth = 0
+        for i, token in enumerate(tokens):
+            depth += (token == "<") - (token == ">")
+            if token == ">" and depth == 0:
+                tokens = tokens[i + 1 :]
+                break
+    if not tokens or tokens[0] in ("friend", "extern", "namespace", "static_assert", "using"):
+        return None
+    if tokens[0] == "typedef":
+        # Also handles function pointers, `typedef void (*name)(...)`.
+        names = [tokens[i + 2] for i in range(len(tokens) - 2) if tokens[i : i + 2] == ["(", "*"]]
+        names += [x for x in tokens if x.isidentifier()]
+        return (names[0] if tokens[-1] == ")" else names[-1]), ""
+    if tokens[0] in _type_keywords:
+        if not definition:
+            return None
+        end = next((i for i, x in enumerate(tokens) if x in (":", "{")), len(tokens))
+        names = [x for x in tokens[1:end] if x.isidentifier() and x not in ("class", "struct", "final")]
+        return (names[-1], "") if names else None
+
+    qualifiers = set()
+    for token in tokens:
+        if token not in ("static", "inline", "const", "constexpr", "thread_local"):
+            break
+        qualifiers.add(token)
+    # The declarator ends at the first of these tokens outside of template arguments.
+    depth = 0
+    end = len(tokens)
+    for i, token in enumerate(tokens):
+        depth = max(depth + (token == "<") - (token == ">"), 0)
+        if depth == 0 and token in _declaration_ends:
+            end = i
+            break
+    if end == 0 or not tokens[end - 1].isidentifier() or tokens[end - 1] == "operator":
+        return None
+    if end > 1 and tokens[end - 2] == "::":
+        # Definitions of members declared elsewhere.
+        return None
+    is_function = end < len(tokens) and tokens[end] == "("
+    signature = _get_signature(tokens[end:]) if is_function else ""
+    if local or "static" in qualifiers:
+        return tokens[end - 1], signature
+    # Constant variables have internal linkage, unless they're inline.
+    if qualifiers & {"const", "constexpr"} and "inline" not in qualifiers and not is_function:
+        return tokens[end - 1], signature
+    return None
+
+
+def get_file_symbols(path):
+    """
+    Returns the symbols of the source file at `path` which could collide with those of
+    other files of the same SCU file, as tuples starting with their kind:
+
+    - `("symbol", name, parameters)` for names declared at namespace scope with internal
+      linkage (such as static functions, constants, and anything in anonymous namespaces),
+      and types and aliases defined there, qualified by their named namespaces. Parameters
+      are the types of those of functions, and empty for other symbols.
+    - `("macro", name, definition)` for macros still defined at the end of the file.
+    - `("using", name, target)` for `using` declarations at namespace scope.
+
+    This is a lexical analysis, so it's conservative: it ignores preprocessor conditions,
+    and may report symbols which wouldn't collide. Names made visible by `using namespace`
+    aren't known, so these directives are ignored.
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as file:
+            text = file.read()
+    except OSError:
+        return set()
+
+    text = _re_strip.sub(_strip_code, text.replace("\\\r\n", "").replace("\\\n", ""))
+
+    macros = {}
+    for directive, name, definition in _re_define.findall(text):
+        if directive == "define":
+            macros[name] = " ".join(definition.split())
+        else:
+            macros.pop(name, None)
+    symbols = {("macro", name, definition) for name, definition in macros.items()}
+
+    # Named namespaces (by name), anonymous ones (""), and linkage specifications ("extern").
+    scopes = []
+    statement = []
+    # Whether the symbol of the current statement was recorded (when its body started),
+    # and whether that's a function, whose body ends the statement.
+    recorded = False
+    is_function = False
+    # Only statements at namespace scope are tokenized, bodies are skipped.
+    code = _re_directive.sub("", text)
+    start = 0
+    while True:
+        match = _re_delimiter.search(code, start)
+        if not match:
+            break
+        delimiter = match.group(0)
+        statement += _re_token.findall(code, start, match.start())
+        start = match.end()
+        if delimiter == "{":
+            if statement[:1] == ["namespace"]:
+                scopes.append(_qualify([], "::".join(x for x in statement[1:] if x.isidentifier() and x != "inline")))
+                statement = []
+            elif statement[:2] == ["extern", '""']:
+                scopes.append("extern")
+                statement = []
+            else:
+                if not recorded:
+                    declared = _get_declared_name(statement, "" in scopes, True)
+                    if declared:
+                        symbols.add(("symbol", _qualify(scopes, declared[0]), declared[1]))
+                    recorded = True
+                    is_function = (
+                        "(" in statement
+                        and "=" not in statement[: statement.index("(")]
+                        and statement[0] not in _type_keywords
+                    )
+                # Skip the body, counting the braces it contains to find its end.
+                depth = 1
+                while depth:
+                    end = code.find("}", start)
+                    if end < 0:
+                        return symbols
+                    depth += code.count("{", start, end) - 1
+                    start = end + 1
+                if is_function:
+                    statement = []
+                    recorded = False
+                else:
+                    statement.append("}")
+        elif delimiter == "}":
+            if scopes:
+                scopes.pop()
+            statement = []
+            recorded = False
+        else:
+            if not recorded and statement[:1] == ["using"] and len(statement) > 3 and statement[1] != "namespace":
+                if statement[2] == "=":
+                    symbols.add(("symbol", _qualify(scopes, statement[1]), ""))
+                else:
+                    symbols.add(("using", _qualify(scopes, statement[-1]), "".join(statement[1:])))
+            elif not recorded:
+                declared = _get_declared_name(statement, "" in scopes, False)
+                if declared:
+                    symbols.add(("symbol", _qualify(scopes, declared[0]), declared[1]))
+            statement = []
+            recorded = False
+    return symbols
+
+
+def get_cached_file_symbols(path):
+    """Returns `get_file_symbols(path)`, from the cache if the file didn't change since."""
+    global _symbols_cache_changed
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return set()
+    cached = _symbols_cache.get(path)
+    if cached and cached[:2] == [stat.st_mtime_ns, stat.st_size]:
+        return {tuple(x) for x in cached[2]}
+    symbols = get_file_symbols(path)
+    _symbols_cache[path] = [stat.st_mtime_ns, stat.st_size, sorted(symbols)]
+    _symbols_cache_changed = True
+    return symbols
+
+
+def load_symbols_cache():
+    global _symbols_cache, _symbols_cache_changed
+    _symbols_cache_changed = False
+    try:
+        with open(_symbols_cache_path, "r", encoding="utf-8") as file:
+            _symbols_cache = json.load(file)
+    except (OSError, ValueError):
+        _symbols_cache = {}
+
+
+def save_symbols_cache():
+    try:
+        with open(_symbols_cache_path, "w", encoding="utf-8", newline="\n") as file:
+            json.dump(_symbols_cache, file, separators=(",", ":"))
+    except OSError:
+        print_error(f'SCU: "{_symbols_cache_path}" could not be written.')
+
+
+def get_include_conflicts(include_list):
+    """
+    Returns the includes of `include_list` each one conflicts with (for those which do), as
+    they define the same symbol, macros with different definitions, a macro with the name
+    of a symbol, or `using` declarations of the same name with different targets.
+    """
+    symbols = {}
+    macros = {}
+    usings = {}
+    names = {}
+    for li in include_list:
+        for symbol in get_cached_file_symbols(get_abs_path(li[len('#include "') : -1])):
+            if symbol[0] == "symbol":
+                symbols.setdefault(symbol[1], {}).setdefault(symbol[2], set()).add(li)
+                names.setdefault(symbol[1].split("::")[-1], set()).add(li)
+            elif symbol[0] == "macro":
+                macros.setdefault(symbol[1], {}).setdefault(symbol[2], set()).add(li)
+            else:
+                usings.setdefault(symbol[1], {}).setdefault(symbol[2], set()).add(li)
+
+    # Pairs of sets of includes, where each include of a set conflicts with those of the other.
+    pairs = []
+    for signatures in symbols.values():
+        # Functions with different parameters are overloads, anything else is a redefinition.
+        for signature, includes in signatures.items():
+            pairs += [(includes, y) for x, y in signatures.items() if x == signature or not (x and signature)]
+    for name, definitions in macros.items():
+        pairs += [(x, y) for x in definitions.values() for y in definitions.values() if x is not y]
+        pairs.append((set().union(*definitions.values()), names.get(name, set())))
+    for targets in usings.values():
+        pairs += [(x, y) for x in targets.values() for y in targets.values() if x is not y]
+
+    conflicts = {}
+    for first, second in pairs:
+        for li in first:
+            for other in second - {li}:
+                conflicts.setdefault(li, set()).add(other)
+                conflicts.setdefault(other, set()).add(li)
+    return conflicts
+
+
+def partition_includes(include_list, costs, num_output_files, includes_per_scu, conflicts={}):
+    """
+    Splits `include_list` into `num_output_files` sorted lists of at most `includes_per_scu`
+    includes, balancing the sum of their `costs`. Includes are assigned from the most
+    costly to the least costly one, each to the least loaded list (longest processing
+    time first), so the result only depends on the arguments. Includes are never put in
+    the same list as those they conflict with (by `conflicts`), adding lists if needed.
+    """
+    groups = [[] for _ in range(num_output_files)]
+    totals = [0] * num_output_files
+    for li in sorted(include_list, key=lambda x: (-costs[x], x)):
+        others = conflicts.get(li, set())
+        candidates = [
+            i for i in range(len(groups)) if len(groups[i]) < includes_per_scu and others.isdisjoint(groups[i])
+        ]
+        if not candidates:
+            groups.append([])
+            totals.append(0)
+            candidates = [len(groups) - 1]
+        index = min(candidates, key=lambda i: (totals[i], len(groups[i]), i))
+        groups[index].append(li)
+        totals[index] += costs[li]
+    return [sorted(x) for x in groups]
+
+
+def get_output_filename(file_count, output_filename_prefix, extension, suffix=""):
     num_string = ""
     if file_count > 0:
         num_string = "_" + str(file_count)
 
-    short_filename = output_filename_prefix + "_exception" + num_string + ".gen." + extension
-    output_filename = output_folder + "/" + short_filename
+    return output_filename_prefix + suffix + num_string + ".gen." + extension
+
+
+def write_output_files(output_folder, output_files, extension):
+    """
+    Writes the `output_files` (contents by filename) of `output_folder` which changed, and
+    removes the stale SCU files (with `extension`) of the folder, so as to not compile them.
+    Existing files are only read when their size matches, to compare their content.
+    """
+    if not os.path.isdir(output_folder):
+        # create
+        try:
+            os.mkdir(output_folder)
+        except OSError:
+            print_error(f'SCU: "{output_folder}" could not be created.')
+            return
+        if _verbose:
+            print("SCU: Creating folder: %s" % output_folder)
+
+    with os.scandir(output_folder) as it:
+        existing_sizes = {
+            entry.name: entry.stat().st_size for entry in it if entry.is_file() and entry.name.endswith("." + extension)
+        }
 
-    output_path = Path(output_filename)
+    for short_filename, file_text in output_files.items():
+        output_filename = output_folder + short_filename
+        data = file_text.encode("utf-8")
+
+        if existing_sizes.get(short_filename) == len(data):
+            with open(output_filename, "rb") as file:
+                if file.read() == data:
+                    if _verbose:
+                        print("SCU: Generation not needed for: " + short_filename)
+                    continue
 
-    if not output_path.exists() or output_path.read_text() != file_text:
         if _verbose:
-            print("SCU: Generating: " + short_filename)
-        output_path.write_text(file_text, encoding="utf8")
-    elif _verbose:
-        print("SCU: Generation not needed for: " + short_filename)
+            print("SCU: Generating: %s" % short_filename)
+        with open(output_filename, "wb") as file:
+            file.write(data)
 
-    return output_path
+    for short_filename in existing_sizes:
+        if short_filename not in output_files:
+            # print("removed stale file: " + short_filename)
+            os.remove(output_folder + short_filename)
 
 
 def find_section_name(sub_folder):
     # Construct a useful name for the section from the path for debug logging
-    section_path = os.path.abspath(base_folder_path + sub_folder) + "/"
+    section_path = os.path.abspath(get_abs_path(sub_folder)) + "/"
 
     folders = []
     folder = ""
@@ -154,6 +498,75 @@ def find_section_name(sub_folder):
     return section_name
 
 
+def find_source_folders(folder):
+    """
+    Returns the folders whose sources are added to the build with a pattern in the `SCsub`
+    files of `folder` and its subfolders, by their key (see `get_folder_key`), with the
+    extension of their sources. Third-party code is skipped.
+    """
+    source_folders = {}
+    for dirpath, dirnames, filenames in os.walk(get_abs_path(folder)):
+        dirnames[:] = sorted(x for x in dirnames if not x.startswith(".") and x not in ("thirdparty", "scu"))
+        if "SCsub" not in filenames:
+            continue
+        try:
+            with open(os.path.join(dirpath, "SCsub"), "r", encoding="utf-8") as file:
+                text = file.read()
+        except OSError:
+            continue
+        for sub_folder, extension in _re_add_source_files.findall(text):
+            if os.path.isdir(os.path.join(dirpath, sub_folder)):
+                source_folders[get_folder_key(os.path.join(dirpath, sub_folder))] = extension
+    return source_folders
+
+
+def discover_sections(folders, excluded_folders):
+    """
+    Returns the arguments of `process_folder` for the folders of sources added with a
+    pattern in `folders` (and their subfolders), except the folders which are in (or
+    inside) `excluded_folders`, and those with less than 2 files to unify.
+    """
+    excluded = [get_folder_key(get_abs_path(x)) + "/" for x in excluded_folders]
+    sections = []
+    for folder in folders:
+        for source_folder, extension in find_source_folders(folder).items():
+            if any((source_folder + "/").startswith(x) for x in excluded):
+                continue
+            if len(find_files_in_folder(source_folder, "", extension, [])[0]) < 2:
+                continue
+            sections.append(([source_folder], [], 0, extension))
+    return sections
+
+
+def print_coverage_report(folders):
+    """
+    Prints the number of source files unified by SCU files for the folders of sources added
+    with a pattern in `folders` (and their subfolders), grouped by module, driver, platform,
+    or top-level folder.
+    """
+    areas = {}
+    for folder in folders:
+        for source_folder, extension in find_source_folders(folder).items():
+            parts = source_folder.split("/")
+            area = "/".join(parts[:2]) if parts[0] in ("drivers", "modules", "platform") else parts[0]
+            if os.path.isabs(source_folder):
+                area = get_folder_key(get_abs_path(folder))
+            total = len(find_files_in_folder(source_folder, "", extension, [])[0])
+            if not total:
+                continue
+            unified = _scu_file_counts.get(source_folder, (0, 0))[0]
+            counts = areas.setdefault(area, [0, 0])
+            counts[0] += unified
+            counts[1] += total
+
+    print("SCU: Coverage (unified files / source files added with a pattern):")
+    for area, (unified, total) in sorted(areas.items()):
+        print(f"    {area:<40} {unified:>5} / {total:<5} {unified * 100 // max(total, 1):>3}%")
+    unified = sum(x[0] for x in areas.values())
+    total = sum(x[1] for x in areas.values())
+    print(f"    {'total':<40} {unified:>5} / {total:<5} {unified * 100 // max(total, 1):>3}%")
+
+
 # "folders" is a list of folders to add all the files from to add to the SCU
 # "section (like a module)". The name of the scu file will be derived from the first folder
 # (thus e.g. scene/3d becomes scu_scene_3d.gen.cpp)
@@ -172,34 +585,25 @@ def find_section_name(sub_folder):
 
 # "extension" will usually be cpp, but can also be set to c (for e.g. third party libraries that use c)
 def process_folder(folders, sought_exceptions=[], includes_per_scu=0, extension="cpp"):
-    if len(folders) == 0:
-        return
-
+    """
+    Returns the output folder of the section of `folders`, and the contents of its SCU files
+    by filename. Only reads the tree, so sections can be processed from several threads.
+    """
     # Construct the filename prefix from the FIRST folder name
     # e.g. "scene_3d"
     out_filename = find_section_name(folders[0])
 
-    found_includes = []
-    found_exceptions = []
-
     main_folder = folders[0]
-    abs_main_folder = base_folder_path + main_folder
-
-    # Keep a record of all folders that have been processed for SCU,
-    # this enables deciding what to do when we call "add_source_files()"
-    global _scu_folders
-    _scu_folders.add(main_folder)
+    abs_main_folder = get_abs_path(main_folder)
 
     # main folder (first)
-    found_includes, found_exceptions = find_files_in_folder(
-        main_folder, "", found_includes, extension, sought_exceptions, found_exceptions
-    )
+    found_includes, found_exceptions = find_files_in_folder(main_folder, "", extension, sought_exceptions)
 
     # sub folders
     for d in range(1, len(folders)):
-        found_includes, found_exceptions = find_files_in_folder(
-            main_folder, folders[d], found_includes, extension, sought_exceptions, found_exceptions
-        )
+        includes, exceptions = find_files_in_folder(main_folder, folders[d], extension, sought_exceptions)
+        found_includes += includes
+        found_exceptions += exceptions
 
     found_includes = sorted(found_includes)
 
@@ -217,158 +621,180 @@ def process_folder(folders, sought_exceptions=[], includes_per_scu=0, extension=
 
     num_output_files = max(math.ceil(total_lines / float(includes_per_scu)), 1)
 
-    lines_per_file = math.ceil(total_lines / float(num_output_files))
-    lines_per_file = max(lines_per_file, 1)
-
-    start_line = 0
+    # Files whose symbols would collide once included together are put in separate
+    # output files, which are added if needed.
+    conflicts = get_include_conflicts(found_includes)
+    if _verbose and conflicts:
+        print("SCU: Conflicting files in %s: %s" % (main_folder, sorted(conflicts)))
+
+    # Balance the cost of the output files rather than their number of includes, as
+    # the slowest one bounds the time taken to build the folder.
+    if num_output_files > 1 or conflicts:
+        output_includes = partition_includes(
+            found_includes, get_include_costs(found_includes), num_output_files, includes_per_scu, conflicts
+        )
+        num_output_files = len(output_includes)
+    else:
+        output_includes = [found_includes]
 
     # These do not vary throughout the loop
     output_folder = abs_main_folder + "/scu/"
     output_filename_prefix = "scu_" + out_filename
 
-    fresh_files = set()
+    output_files = {}
 
     for file_count in range(0, num_output_files):
-        end_line = start_line + lines_per_file
-
-        # special case to cover rounding error in final file
-        if file_count == (num_output_files - 1):
-            end_line = len(found_includes)
-
-        fresh_file = write_output_file(
-            file_count, found_includes, start_line, end_line, output_folder, output_filename_prefix, extension
-        )
-
-        fresh_files.add(fresh_file)
-
-        start_line = end_line
+        short_filename = get_output_filename(file_count, output_filename_prefix, extension)
+        output_files[short_filename] = "".join(li + "\n" for li in output_includes[file_count])
 
     # Write the exceptions each in their own scu gen file,
     # so they can effectively compile in "old style / normal build".
     for exception_count in range(len(found_exceptions)):
-        fresh_file = write_exception_output_file(
-            exception_count, found_exceptions[exception_count], output_folder, output_filename_prefix, extension
-        )
-
-        fresh_files.add(fresh_file)
+        short_filename = get_output_filename(exception_count, output_filename_prefix, extension, "_exception")
+        output_files[short_filename] = found_exceptions[exception_count] + "\n"
 
-    # Clear out any stale file (usually we will be overwriting if necessary,
-    # but we want to remove any that are pre-existing that will not be
-    # overwritten, so as to not compile anything stale).
-    clear_out_stale_files(output_folder, extension, fresh_files)
+    return output_folder, output_files, extension
 
 
-def generate_scu_files(max_includes_per_scu):
-    global _max_includes_per_scu
+def generate_scu_files(max_includes_per_scu, compile_times=None, discover_folders=[], excluded_folders=[]):
+    """
+    Generates the SCU files of the folders listed below, and those discovered in
+    `discover_folders` (such as drivers and enabled modules), except in `excluded_folders`
+    (for modules opting out of SCU builds). Returns the folders (relative to the root when
+    inside it).
+    """
+    global _max_includes_per_scu, _compile_times
     _max_includes_per_scu = max_includes_per_scu
+    _compile_times = compile_times or {}
 
     print("SCU: Generating build files... (max includes per SCU: %d)" % _max_includes_per_scu)
 
-    curr_folder = os.path.abspath("./")
-
     # check we are running from the correct folder
     if folder_not_found("core") or folder_not_found("platform") or folder_not_found("scene"):
         raise RuntimeError("scu_builders.py must be run from the godot folder.")
         return
 
-    process_folder(["core"])
-    process_folder(["core/crypto"])
-    process_folder(["core/debugger"])
-    process_folder(["core/extension"])
-    process_folder(["core/input"])
-    process_folder(["core/io"])
-    process_folder(["core/math"])
-    process_folder(["core/object"])
-    process_folder(["core/os"])
-    process_folder(["core/string"])
-    process_folder(["core/variant"], ["variant_utility"])
-
-    process_folder(["drivers/unix"])
-    process_folder(["drivers/png"])
-
-    process_folder(["drivers/gles3/effects"])
-    process_folder(["drivers/gles3/storage"])
-
-    process_folder(["editor"], ["file_system_dock", "editor_resource_preview"], 32)
-    process_folder(["editor/debugger"])
-    process_folder(["editor/debugger/debug_adapter"])
-    process_folder(["editor/export"])
-    process_folder(["editor/gui"])
-    process_folder(["editor/themes"])
-    process_folder(["editor/project_manager"])
-    process_folder(["editor/import"])
-    process_folder(["editor/import/3d"])
-    process_folder(["editor/plugins"])
-    process_folder(["editor/plugins/gizmos"])
-    process_folder(["editor/plugins/tiles"])
-
-    process_folder(["platform/android/export"])
-    process_folder(["platform/ios/export"])
-    process_folder(["platform/linuxbsd/export"])
-    process_folder(["platform/macos/export"])
-    process_folder(["platform/web/export"])
-    process_folder(["platform/windows/export"])
-
-    process_folder(["modules/lightmapper_rd"])
-    process_folder(["modules/gltf"])
-    process_folder(["modules/gltf/structures"])
-    process_folder(["modules/gltf/editor"])
-    process_folder(["modules/gltf/extensions"])
-    process_folder(["modules/gltf/extensions/physics"])
-    process_folder(["modules/navigation"])
-    process_folder(["modules/navigation/2d"])
-    process_folder(["modules/navigation/3d"])
-    process_folder(["modules/webrtc"])
-    process_folder(["modules/websocket"])
-    process_folder(["modules/gridmap"])
-    process_folder(["modules/multiplayer"])
-    process_folder(["modules/multiplayer/editor"])
-    process_folder(["modules/openxr"], ["register_types"])
-    process_folder(["modules/openxr/action_map"])
-    process_folder(["modules/openxr/editor"])
-    process_folder(["modules/openxr/extensions"])
-    process_folder(["modules/openxr/scene"])
-    process_folder(["modules/godot_physics_2d"])
-    process_folder(["modules/godot_physics_3d"])
-    process_folder(["modules/godot_physics_3d/joints"])
-
-    process_folder(["modules/csg"])
-    process_folder(["modules/gdscript"])
-    process_folder(["modules/gdscript/editor"])
-    process_folder(["modules/gdscript/language_server"])
-
-    process_folder(["scene/2d"])
-    process_folder(["scene/2d/physics"])
-    process_folder(["scene/2d/physics/joints"])
-    process_folder(["scene/3d"])
-    process_folder(["scene/3d/physics"])
-    process_folder(["scene/3d/physics/joints"])
-    process_folder(["scene/animation"])
-    process_folder(["scene/gui"])
-    process_folder(["scene/main"])
-    process_folder(["scene/theme"])
-    process_folder(["scene/resources"])
-    process_folder(["scene/resources/2d"])
-    process_folder(["scene/resources/2d/skeleton"])
-    process_folder(["scene/resources/3d"])
-
-    process_folder(["servers"])
-    process_folder(["servers/rendering"])
-    process_folder(["servers/rendering/dummy/storage"])
-    process_folder(["servers/rendering/storage"])
-    process_folder(["servers/rendering/renderer_rd"])
-    process_folder(["servers/rendering/renderer_rd/effects"])
-    process_folder(["servers/rendering/renderer_rd/environment"])
-    process_folder(["servers/rendering/renderer_rd/storage_rd"])
-    process_folder(["servers/rendering/renderer_rd/forward_clustered"])
-    process_folder(["servers/rendering/renderer_rd/forward_mobile"])
-    process_folder(["servers/audio"])
-    process_folder(["servers/audio/effects"])
-    process_folder(["servers/navigation"])
-    process_folder(["servers/xr"])
-
-    # Finally change back the path to the calling folder
-    os.chdir(curr_folder)
+    # Arguments of `process_folder` for each section.
+    sections = [
+        (["core"],),
+        (["core/crypto"],),
+        (["core/debugger"],),
+        (["core/extension"],),
+        (["core/input"],),
+        (["core/io"],),
+        (["core/math"],),
+        (["core/object"],),
+        (["core/os"],),
+        (["core/string"],),
+        (["core/variant"], ["variant_utility"]),
+        (["drivers/unix"],),
+        (["drivers/png"],),
+        (["drivers/gles3/effects"],),
+        (["drivers/gles3/storage"],),
+        (["editor"], ["file_system_dock", "editor_resource_preview"], 32),
+        (["editor/debugger"],),
+        (["editor/debugger/debug_adapter"],),
+        (["editor/export"],),
+        (["editor/gui"],),
+        (["editor/themes"],),
+        (["editor/project_manager"],),
+        (["editor/import"],),
+        (["editor/import/3d"],),
+        (["editor/plugins"],),
+        (["editor/plugins/gizmos"],),
+        (["editor/plugins/tiles"],),
+        (["platform/android/export"],),
+        (["platform/ios/export"],),
+        (["platform/linuxbsd/export"],),
+        (["platform/macos/export"],),
+        (["platform/web/export"],),
+        (["platform/windows/export"],),
+        (["modules/lightmapper_rd"],),
+        (["modules/gltf"],),
+        (["modules/gltf/structures"],),
+        (["modules/gltf/editor"],),
+        (["modules/gltf/extensions"],),
+        (["modules/gltf/extensions/physics"],),
+        (["modules/navigation"],),
+        (["modules/navigation/2d"],),
+        (["modules/navigation/3d"],),
+        (["modules/webrtc"],),
+        (["modules/websocket"],),
+        (["modules/gridmap"],),
+        (["modules/multiplayer"],),
+        (["modules/multiplayer/editor"],),
+        (["modules/openxr"], ["register_types"]),
+        (["modules/openxr/action_map"],),
+        (["modules/openxr/editor"],),
+        (["modules/openxr/extensions"],),
+        (["modules/openxr/scene"],),
+        (["modules/godot_physics_2d"],),
+        (["modules/godot_physics_3d"],),
+        (["modules/godot_physics_3d/joints"],),
+        (["modules/csg"],),
+        (["modules/gdscript"],),
+        (["modules/gdscript/editor"],),
+        (["modules/gdscript/language_server"],),
+        (["scene/2d"],),
+        (["scene/2d/physics"],),
+        (["scene/2d/physics/joints"],),
+        (["scene/3d"],),
+        (["scene/3d/physics"],),
+        (["scene/3d/physics/joints"],),
+        (["scene/animation"],),
+        (["scene/gui"],),
+        (["scene/main"],),
+        (["scene/theme"],),
+        (["scene/resources"],),
+        (["scene/resources/2d"],),
+        (["scene/resources/2d/skeleton"],),
+        (["scene/resources/3d"],),
+        (["servers"],),
+        (["servers/rendering"],),
+        (["servers/rendering/dummy/storage"],),
+        (["servers/rendering/storage"],),
+        (["servers/rendering/renderer_rd"],),
+        (["servers/rendering/renderer_rd/effects"],),
+        (["servers/rendering/renderer_rd/environment"],),
+        (["servers/rendering/renderer_rd/storage_rd"],),
+        (["servers/rendering/renderer_rd/forward_clustered"],),
+        (["servers/rendering/renderer_rd/forward_mobile"],),
+        (["servers/audio"],),
+        (["servers/audio/effects"],),
+        (["servers/navigation"],),
+        (["servers/xr"],),
+    ]
+
+    excluded = [get_folder_key(get_abs_path(x)) + "/" for x in excluded_folders]
+    sections = [x for x in sections if not any((x[0][0] + "/").startswith(y) for y in excluded)]
+
+    # Add the other folders whose sources are added with a pattern.
+    known_folders = set(x[0][0] for x in sections)
+    discovered = [x for x in discover_sections(discover_folders, excluded_folders) if x[0][0] not in known_folders]
+    sections += discovered
+
+    # Keep a record of all folders that have been processed for SCU,
+    # this enables deciding what to do when we call "add_source_files()"
+    for section in sections:
+        _scu_folders.add(section[0][0])
+
+    load_symbols_cache()
+
+    # Sections are scanned in parallel, as this mostly waits for the file system, then the
+    # SCU files are written (when they changed) folder by folder, also in parallel.
+    with ThreadPoolExecutor() as executor:
+        outputs = list(executor.map(lambda section: process_folder(*section), sections))
+        list(executor.map(lambda output: write_output_files(*output), outputs))
+
+    if _symbols_cache_changed:
+        save_symbols_cache()
+
+    for section, (_, output_files, _) in zip(sections, outputs):
+        exceptions = sum("_exception" in x for x in output_files)
+        unified = sum(x.count("\n") for x in output_files.values()) - exceptions
+        _scu_file_counts[section[0][0]] = (unified, exceptions)
+
+    print("SCU: Generated files for %d folders (%d discovered)." % (len(sections), len(discovered)))
 
     if _verbose:
         print("SCU: Processed folders: %s" % sorted(_scu_folders))
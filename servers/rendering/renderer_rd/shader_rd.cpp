@@ -30,6 +30,7 @@
 
 #include "shader_rd.h"
 
+#include "core/config/engine.h"
 #include "core/io/dir_access.h"
 #include "core/io/file_access.h"
 #include "core/object/worker_thread_pool.h"
@@ -39,8 +40,8 @@
 
 #define ENABLE_SHADER_CACHE 1
 
-void ShaderRD::_add_stage(const char *p_code, StageType p_stage_type) {
-	Vector<String> lines = String(p_code).split("\n");
+void ShaderRD::_add_stage(const String &p_code, StageType p_stage_type) {
+	Vector<String> lines = p_code.split("\n");
 
 	String text;
 
@@ -131,6 +132,50 @@ void ShaderRD::_add_stage(const char *p_code, StageType p_stage_type) {
 	}
 }
 
+// Whether `_add_stage` would keep the code as is: it only processes lines starting with
+// these markers, and reencodes non-ASCII characters.
+static bool _is_static_stage_code(const char *p_code) {
+	static const char *markers[] = { "#VERSION_DEFINES", "#GLOBALS", "#MATERIAL_UNIFORMS", "#CODE", "#include " };
+
+	bool line_start = true;
+	for (const char *c = p_code; *c; c++) {
+		if ((uint8_t)*c >= 0x80) {
+			return false;
+		}
+		if (line_start && *c == '#') {
+			for (const char *marker : markers) {
+				if (strncmp(c, marker, strlen(marker)) == 0) {
+					return false;
+				}
+			}
+		}
+		line_start = *c == '\n';
+	}
+	return true;
+}
+
+void ShaderRD::_add_stage_pieces(const char *const *p_pieces, StageType p_stage_type) {
+	// Same chunks as `_add_stage` gives for the concatenated pieces, which all end with a newline.
+	for (const char *const *piece = p_pieces; *piece; piece++) {
+		if (_is_static_stage_code(*piece)) {
+			// The code is static, so it can be referenced rather than copied.
+			StageTemplate::Chunk text_chunk;
+			text_chunk.type = StageTemplate::Chunk::TYPE_TEXT;
+			text_chunk.static_text = *piece;
+			stage_templates[p_stage_type].chunks.push_back(text_chunk);
+		} else {
+			// `_add_stage` ends each line with a newline, including the last one.
+			_add_stage(String(*piece).substr(0, strlen(*piece) - 1), p_stage_type);
+		}
+	}
+
+	// The last line of the concatenated code, which is empty.
+	StageTemplate::Chunk text_chunk;
+	text_chunk.type = StageTemplate::Chunk::TYPE_TEXT;
+	text_chunk.static_text = "\n";
+	stage_templates[p_stage_type].chunks.push_back(text_chunk);
+}
+
 void ShaderRD::setup(const char *p_vertex_code, const char *p_fragment_code, const char *p_compute_code, const char *p_name) {
 	name = p_name;
 
@@ -147,6 +192,37 @@ void ShaderRD::setup(const char *p_vertex_code, const char *p_fragment_code, con
 		}
 	}
 
+	_set_base_sha256(p_vertex_code ? p_vertex_code : "", p_fragment_code ? p_fragment_code : "", p_compute_code ? p_compute_code : "");
+}
+
+static String _join_stage_pieces(const char *const *p_pieces) {
+	StringBuilder code;
+	for (const char *const *piece = p_pieces; piece && *piece; piece++) {
+		code.append(*piece);
+	}
+	return code.as_string();
+}
+
+void ShaderRD::setup(const char *const *p_vertex_code, const char *const *p_fragment_code, const char *const *p_compute_code, const char *p_name) {
+	name = p_name;
+
+	if (p_compute_code) {
+		_add_stage_pieces(p_compute_code, STAGE_TYPE_COMPUTE);
+		is_compute = true;
+	} else {
+		is_compute = false;
+		if (p_vertex_code) {
+			_add_stage_pieces(p_vertex_code, STAGE_TYPE_VERTEX);
+		}
+		if (p_fragment_code) {
+			_add_stage_pieces(p_fragment_code, STAGE_TYPE_FRAGMENT);
+		}
+	}
+
+	_set_base_sha256(_join_stage_pieces(p_vertex_code), _join_stage_pieces(p_fragment_code), _join_stage_pieces(p_compute_code));
+}
+
+void ShaderRD::_set_base_sha256(const String &p_vertex_code, const String &p_fragment_code, const String &p_compute_code) {
 	StringBuilder tohash;
 	tohash.append("[GodotVersionNumber]");
 	tohash.append(VERSION_NUMBER);
@@ -157,15 +233,41 @@ void ShaderRD::setup(const char *p_vertex_code, const char *p_fragment_code, con
 	tohash.append("[BinaryCacheKey]");
 	tohash.append(RenderingDevice::get_singleton()->shader_get_binary_cache_key());
 	tohash.append("[Vertex]");
-	tohash.append(p_vertex_code ? p_vertex_code : "");
+	tohash.append(p_vertex_code);
 	tohash.append("[Fragment]");
-	tohash.append(p_fragment_code ? p_fragment_code : "");
+	tohash.append(p_fragment_code);
 	tohash.append("[Compute]");
-	tohash.append(p_compute_code ? p_compute_code : "");
+	tohash.append(p_compute_code);
 
 	base_sha256 = tohash.as_string().sha256_text();
 }
 
+void ShaderRD::set_precompiled_spirv(const PrecompiledSPIRV *p_spirv, uint32_t p_count) {
+	precompiled_spirv = p_spirv;
+	precompiled_spirv_count = p_count;
+}
+
+Vector<uint8_t> ShaderRD::_compile_stage_spirv(RD::ShaderStage p_stage, const String &p_source, String *r_error) const {
+	if (precompiled_spirv_count > 0 && !Engine::get_singleton()->is_generate_spirv_debug_info_enabled()) {
+		// Precompiled SPIR-V targets Vulkan 1.1, see `SPIRV_TARGET_ENV` in `methods.py`.
+		const RDD::Capabilities &capabilities = RD::get_singleton()->get_device_capabilities();
+		if (capabilities.device_family != RDD::DEVICE_VULKAN || capabilities.version_major > 1 || capabilities.version_minor >= 1) {
+			const String source_sha256 = p_source.sha256_text();
+			for (uint32_t i = 0; i < precompiled_spirv_count; i++) {
+				const PrecompiledSPIRV &precompiled = precompiled_spirv[i];
+				if (precompiled.stage == p_stage && source_sha256 == precompiled.source_sha256) {
+					Vector<uint8_t> spirv;
+					spirv.resize(precompiled.spirv_size);
+					memcpy(spirv.ptrw(), precompiled.spirv, precompiled.spirv_size);
+					return spirv;
+				}
+			}
+		}
+	}
+
+	return RD::get_singleton()->shader_compile_spirv_from_source(p_stage, p_source, RD::SHADER_LANGUAGE_GLSL, r_error);
+}
+
 RID ShaderRD::version_create() {
 	//initialize() was never called
 	ERR_FAIL_COND_V(group_to_variant_map.is_empty(), RID());
@@ -254,7 +356,7 @@ void ShaderRD::_build_variant_code(StringBuilder &builder, uint32_t p_variant, c
 				}
 			} break;
 			case StageTemplate::Chunk::TYPE_TEXT: {
-				builder.append(chunk.text.get_data());
+				builder.append(chunk.static_text ? chunk.static_text : chunk.text.get_data());
 			} break;
 		}
 	}
@@ -282,7 +384,7 @@ void ShaderRD::_compile_variant(uint32_t p_variant, CompileData p_data) {
 
 		current_source = builder.as_string();
 		RD::ShaderStageSPIRVData stage;
-		stage.spirv = RD::get_singleton()->shader_compile_spirv_from_source(RD::SHADER_STAGE_VERTEX, current_source, RD::SHADER_LANGUAGE_GLSL, &error);
+		stage.spirv = _compile_stage_spirv(RD::SHADER_STAGE_VERTEX, current_source, &error);
 		if (stage.spirv.size() == 0) {
 			build_ok = false;
 		} else {
@@ -300,7 +402,7 @@ void ShaderRD::_compile_variant(uint32_t p_variant, CompileData p_data) {
 
 		current_source = builder.as_string();
 		RD::ShaderStageSPIRVData stage;
-		stage.spirv = RD::get_singleton()->shader_compile_spirv_from_source(RD::SHADER_STAGE_FRAGMENT, current_source, RD::SHADER_LANGUAGE_GLSL, &error);
+		stage.spirv = _compile_stage_spirv(RD::SHADER_STAGE_FRAGMENT, current_source, &error);
 		if (stage.spirv.size() == 0) {
 			build_ok = false;
 		} else {
@@ -319,7 +421,7 @@ void ShaderRD::_compile_variant(uint32_t p_variant, CompileData p_data) {
 		current_source = builder.as_string();
 
 		RD::ShaderStageSPIRVData stage;
-		stage.spirv = RD::get_singleton()->shader_compile_spirv_from_source(RD::SHADER_STAGE_COMPUTE, current_source, RD::SHADER_LANGUAGE_GLSL, &error);
+		stage.spirv = _compile_stage_spirv(RD::SHADER_STAGE_COMPUTE, current_source, &error);
 		if (stage.spirv.size() == 0) {
 			build_ok = false;
 		} else {
@@ -52,6 +52,14 @@ public:
 		}
 	};
 
+	// SPIR-V compiled at build time (see `spirv_precompile`), used for any stage whose source matches.
+	struct PrecompiledSPIRV {
+		RD::ShaderStage stage;
+		const char *source_sha256;
+		const uint8_t *spirv;
+		uint32_t spirv_size;
+	};
+
 private:
 	//versions
 	CharString general_defines;
@@ -113,6 +121,7 @@ private:
 			Type type;
 			StringName code;
 			CharString text;
+			const char *static_text = nullptr; // Used instead of `text` for code embedded as is.
 		};
 		LocalVector<Chunk> chunks;
 	};
@@ -126,6 +135,9 @@ private:
 	String base_sha256;
 	LocalVector<String> group_sha256;
 
+	const PrecompiledSPIRV *precompiled_spirv = nullptr;
+	uint32_t precompiled_spirv_count = 0;
+
 	static String shader_cache_dir;
 	static bool shader_cache_cleanup_on_start;
 	static bool shader_cache_save_compressed;
@@ -144,7 +156,10 @@ private:
 
 	void _build_variant_code(StringBuilder &p_builder, uint32_t p_variant, const Version *p_version, const StageTemplate &p_template);
 
-	void _add_stage(const char *p_code, StageType p_stage_type);
+	void _add_stage(const String &p_code, StageType p_stage_type);
+	void _add_stage_pieces(const char *const *p_pieces, StageType p_stage_type);
+	void _set_base_sha256(const String &p_vertex_code, const String &p_fragment_code, const String &p_compute_code);
+	Vector<uint8_t> _compile_stage_spirv(RD::ShaderStage p_stage, const String &p_source, String *r_error) const;
 
 	String _version_get_sha1(Version *p_version) const;
 	String _get_cache_file_path(Version *p_version, int p_group);
@@ -155,6 +170,9 @@ private:
 protected:
 	ShaderRD();
 	void setup(const char *p_vertex_code, const char *p_fragment_code, const char *p_compute_code, const char *p_name);
+	// Takes the code of each stage as null-terminated arrays of pieces, as generated with `shader_pool`.
+	void setup(const char *const *p_vertex_code, const char *const *p_fragment_code, const char *const *p_compute_code, const char *p_name);
+	void set_precompiled_spirv(const PrecompiledSPIRV *p_spirv, uint32_t p_count);
 
 public:
 	RID version_create();
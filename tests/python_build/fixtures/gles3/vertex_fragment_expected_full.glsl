@@ -6,9 +6,9 @@
 #include "drivers/gles3/shader_gles3.h"
 
 
-class VertexFragmentShaderGLES3 : public ShaderGLES3 {
-
-public:
+struct VertexFragmentShaderGLES3Enums {
+	enum Uniforms {
+	};
 
 	enum ShaderVariant {
 		MODE_NINEPATCH,
@@ -17,8 +17,9 @@ public:
 	enum Specializations {
 		DISABLE_LIGHTING=1,
 	};
+};
 
-	_FORCE_INLINE_ bool version_bind_shader(RID p_version,ShaderVariant p_variant,uint64_t p_specialization=0) { return _version_bind_shader(p_version,p_variant,p_specialization); }
+class VertexFragmentShaderGLES3 : public ShaderGLES3Typed<VertexFragmentShaderGLES3Enums,0> {
 
 protected:
 
@@ -0,0 +1,46 @@
+import compile_history
+from compile_history import (
+    CompileHistory,
+    compare_builds,
+    get_compile_times,
+    get_directory_totals,
+    get_latest_targets,
+    load_builds,
+    parse_command,
+)
+
+
+def test_parse_command():
+    compile_args = ["g++", "-o", "core/os/os.o", "-c", "-O2", "core/os/os.cpp"]
+    kind, path, flags = parse_command(compile_args)
+    assert (kind, path) == ("compile", "core/os/os.cpp")
+    # Objects of other sources built with the same flags share their hash, unlike with other flags.
+    assert parse_command(["g++", "-o", "core/os/main.o", "-c", "-O2", "core/os/main.cpp"])[2] == flags
+    assert parse_command(["g++", "-o", "core/os/os.o", "-c", "-O3", "core/os/os.cpp"])[2] != flags
+
+    assert parse_command(["cl", "/Focore/os/os.obj", "/c", "core/os/os.cpp"])[:2] == ("compile", "core/os/os.cpp")
+    assert parse_command(["g++", "-o", "bin/godot", "core/os/os.o", "core/libcore.a"])[:2] == ("link", "bin/godot")
+    assert parse_command(["link", "/FORCE:MULTIPLE", "/OUT:bin/godot.exe", "a.obj"])[:2] == ("link", "bin/godot.exe")
+    # Archives and commands in response files aren't recorded.
+    assert parse_command(["ar", "rc", "core/libcore.a", "core/os/os.o"]) is None
+    assert parse_command(["cl", "@response_file"]) is None
+
+
+def test_compile_history(monkeypatch, tmp_path):
+    path = str(tmp_path / "history.json")
+    monkeypatch.setattr(compile_history, "MAX_BUILDS", 2)
+
+    for times in [{"a/b/x.cpp": 3.0, "a/y.cpp": 1.0}, {"a/b/x.cpp": 2.0, "a/y.cpp": 4.0}, {"a/y.cpp": 5.0}]:
+        history = CompileHistory(path)
+        for source, duration in times.items():
+            history.add("compile", source, "flags", duration)
+        history.add("link", "bin/godot", "flags", 10.0, 1024)
+        history.save()
+
+    # Only the latest builds are kept.
+    builds = load_builds(path)
+    assert len(builds) == 2
+    assert get_compile_times(path) == {"a/b/x.cpp": 2.0, "a/y.cpp": 5.0}
+    assert compare_builds(builds[0], builds[1]) == [("compile", "a/y.cpp", 4.0, 5.0), ("link", "bin/godot", 10.0, 10.0)]
+    assert get_directory_totals(get_latest_targets(builds, "compile"), 1) == {"a": (2, 7.0)}
+    assert get_directory_totals(get_latest_targets(builds), 2) == {"a/b": (1, 2.0), "a": (1, 5.0), "bin": (1, 10.0)}
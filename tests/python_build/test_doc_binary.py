@@ -0,0 +1,33 @@
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT / "doc" / "tools"))
+
+from make_doc_binary import DocBinary, pack_classes, parse_classes  # noqa: E402
+
+CLASSES = ["@GlobalScope", "Node", "Vector2", "Control", "Object"]
+
+
+def to_dict(value):
+    if isinstance(value, dict):
+        return {k: to_dict(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_dict(v) for v in value]
+    if hasattr(value, "__dict__"):
+        # The path of the XML file isn't stored.
+        return {k: to_dict(v) for k, v in vars(value).items() if k != "filepath"}
+    return value
+
+
+def test_doc_binary_round_trip():
+    classes = parse_classes([os.path.join(ROOT, "doc", "classes", f"{name}.xml") for name in CLASSES])
+    doc = DocBinary(pack_classes(classes))
+
+    assert doc.class_names() == sorted(CLASSES)
+    for name in CLASSES:
+        assert to_dict(doc.get_class(name)) == to_dict(classes[name])
+    assert doc.get_class("Nonexistent") is None
+    assert doc.get_class("") is None
+    assert doc.get_class("Zzz") is None
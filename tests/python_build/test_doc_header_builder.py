@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from editor.editor_builders import make_doc_header
+
+
+@pytest.mark.parametrize("embed_mode", ["string", "incbin"])
+def test_make_doc_header_unchanged(tmp_path, embed_mode):
+    sources = []
+    for name in ["Node", "Object"]:
+        (tmp_path / f"{name}.xml").write_text(f'<class name="{name}">\n</class>\n')
+        sources.append(str(tmp_path / f"{name}.xml"))
+    header = tmp_path / "doc_data_compressed.gen.h"
+    env = {"embed_mode": embed_mode, "doc_chunk_size": "0"}
+
+    make_doc_header([str(header)], sources, env)
+    os.utime(header, (0, 0))
+    bin_files = list(tmp_path.glob("*.bin"))
+    assert len(bin_files) == (embed_mode == "incbin")
+
+    # Regenerating the same docs leaves the header untouched.
+    make_doc_header([str(header)], sources, env)
+    assert os.stat(header).st_mtime == 0
+
+    # Unless the data it embeds is missing.
+    for path in bin_files:
+        path.unlink()
+        make_doc_header([str(header)], sources, env)
+        assert os.stat(header).st_mtime != 0
+        assert path.is_file()
@@ -1,8 +1,9 @@
 import json
+from pathlib import Path
 
 import pytest
 
-from gles3_builders import GLES3HeaderStruct, build_gles3_header
+from gles3_builders import GLES3HeaderStruct, build_gles3_header, build_gles3_manifest
 
 
 @pytest.mark.parametrize(
@@ -19,7 +20,7 @@ def test_gles3_builder(shader_files, builder, header_struct):
 
     with open(shader_files["path_expected_parts"], "r", encoding="utf-8") as f:
         expected_parts = json.load(f)
-        assert expected_parts == header.__dict__
+        assert expected_parts == header.to_dict()
 
     with open(shader_files["path_output"], "r", encoding="utf-8") as f:
         actual_output = f.read()
@@ -29,3 +30,18 @@ def test_gles3_builder(shader_files, builder, header_struct):
         expected_output = f.read()
 
     assert actual_output == expected_output
+
+
+def test_gles3_manifest(tmp_path):
+    build_gles3_manifest(
+        [str(Path(__file__).parent / "fixtures" / "gles3" / "vertex_fragment.glsl")], str(tmp_path / "manifest.json")
+    )
+
+    with open(tmp_path / "manifest.json", "r", encoding="utf-8") as f:
+        (entry,) = json.load(f)["shaders"]
+
+    assert entry["class"] == "VertexFragmentShaderGLES3"
+    assert entry["variants"] == ["MODE_NINEPATCH"]
+    assert entry["specializations"] == [{"name": "DISABLE_LIGHTING", "bit": 1, "default": False}]
+    assert entry["compiled_per_version"] == 1
+    assert entry["worst_case_permutations"] == 2
@@ -0,0 +1,27 @@
+import glob
+from pathlib import Path
+
+import pytest
+
+from gles3_builders import GLES3HeaderStruct, build_gles3_header
+
+pytest.importorskip("pytest_benchmark")
+
+ROOT = Path(__file__).parent.parent.parent
+SHADERS = sorted(glob.glob(str(ROOT / "drivers" / "gles3" / "shaders" / "**" / "*.glsl"), recursive=True))
+
+
+def build_all(directory):
+    for index, shader in enumerate(SHADERS):
+        build_gles3_header(
+            shader,
+            "drivers/gles3/shader_gles3.h",
+            "GLES3",
+            optional_output_filename=str(directory / f"shader_{index}.glsl.gen.h"),
+            header_data=GLES3HeaderStruct(),
+        )
+
+
+def test_gles3_builder_benchmark(benchmark, tmp_path):
+    assert SHADERS
+    benchmark(build_all, tmp_path)
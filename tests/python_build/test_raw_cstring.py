@@ -0,0 +1,74 @@
+import io
+
+import pytest
+
+import methods
+from methods import RAW_CSTRING_MAX_LITERAL, to_raw_cstring, write_raw_cstring
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    methods._raw_cstring_cache.clear()
+    yield
+    methods._raw_cstring_cache.clear()
+
+
+def literals(*segments):
+    return " ".join(f'R"<!>({x})<!>"' for x in segments)
+
+
+def check(value, expected):
+    assert to_raw_cstring(value) == expected
+    # Cached result.
+    assert to_raw_cstring(value) == expected
+    methods._raw_cstring_cache.clear()
+    file = io.StringIO()
+    write_raw_cstring(file, value)
+    assert file.getvalue() == expected
+
+
+def test_raw_cstring_small():
+    check("", literals(""))
+    check('void main() {\n\tcolor = "é";\n}\n', literals('void main() {\n\tcolor = "é";\n}\n'))
+
+
+def test_raw_cstring_lines():
+    check(["a", "b"], literals("a\nb\n"))
+    check([], literals("\n"))
+
+
+def test_raw_cstring_exact_size():
+    # A full segment is always followed by another, possibly empty, literal.
+    value = "x" * RAW_CSTRING_MAX_LITERAL
+    check(value, literals(value, ""))
+    check(value + "y", literals(value, "y"))
+
+
+def test_raw_cstring_breaks_at_double_newline():
+    head = "a" * 100 + "\n\n"
+    tail = "b" * RAW_CSTRING_MAX_LITERAL
+    check(head + tail, literals(head[:-1], "\n" + tail[: RAW_CSTRING_MAX_LITERAL - 1], tail[-1]))
+
+
+@pytest.mark.parametrize("char", ["é", "€", "😀"])
+def test_raw_cstring_multibyte_boundary(char):
+    # Put a multibyte character across the segment boundary, it must not be split.
+    head = "x" * (RAW_CSTRING_MAX_LITERAL - 1)
+    check(head + char + "y", literals(head, char + "y"))
+
+
+def test_raw_cstring_multibyte_only():
+    value = "é" * RAW_CSTRING_MAX_LITERAL
+    half = "é" * (RAW_CSTRING_MAX_LITERAL // 2)
+    check(value, literals(half, half, ""))
+
+
+def test_raw_cstring_write_cached(monkeypatch):
+    calls = []
+    segments = methods._raw_cstring_segments
+    monkeypatch.setattr(methods, "_raw_cstring_segments", lambda encoded: calls.append(encoded) or segments(encoded))
+    file = io.StringIO()
+    write_raw_cstring(file, ["a", "b"])
+    write_raw_cstring(file, ["a", "b"])
+    assert file.getvalue() == literals("a\nb\n") * 2
+    assert len(calls) == 1
@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+import methods
+from methods import RAW_CSTRING_MAX_LITERAL, write_raw_cstring
+
+pytest.importorskip("pytest_benchmark")
+
+INPUTS = {
+    # Typical shader or SVG source.
+    "ascii": ("uniform vec4 color;\n\nvoid main() {\n\tgl_FragColor = color;\n}\n" * 4096),
+    # Translated strings and comments.
+    "multibyte": ("Ouvrir le fichier sélectionné… 打开文件 😀\n" * 8192),
+    # No line breaks, with a multibyte character straddling every segment boundary.
+    "pathological": (("x" * (RAW_CSTRING_MAX_LITERAL - 1) + "€") * 64),
+}
+
+
+def encode(value):
+    methods._raw_cstring_cache.clear()
+    file = io.StringIO()
+    write_raw_cstring(file, value)
+    return file
+
+
+@pytest.mark.parametrize("name", INPUTS)
+def test_raw_cstring_benchmark(benchmark, name):
+    value = INPUTS[name]
+    file = benchmark(encode, value)
+    assert file.getvalue().startswith('R"<!>(')
+
+
+def test_raw_cstring_benchmark_cached(benchmark):
+    value = INPUTS["ascii"]
+    methods.to_raw_cstring(value)
+    result = benchmark(methods.to_raw_cstring, value)
+    assert result is methods.to_raw_cstring(value)
@@ -0,0 +1,168 @@
+import os
+
+import scu_builders
+from scu_builders import find_files_in_folder, get_include_costs, partition_includes, write_output_files
+
+
+def test_partition_includes():
+    costs = {"a": 10, "b": 1, "c": 1, "d": 1, "e": 7, "f": 2}
+    groups = partition_includes(list(costs), costs, 2, 4)
+
+    # Costs are balanced, unlike with 3 files in each group ("a" with "e").
+    assert groups == [["a", "c"], ["b", "d", "e", "f"]]
+    # The result doesn't depend on the order of the includes.
+    assert partition_includes(list(reversed(costs)), costs, 2, 4) == groups
+
+
+def test_partition_includes_limit():
+    costs = {"a": 100, "b": 1, "c": 1, "d": 1}
+    # Groups are limited in size even when it's unbalanced, as the limit bounds memory use.
+    assert partition_includes(list(costs), costs, 2, 2) == [["a", "d"], ["b", "c"]]
+    # No group is left empty.
+    assert partition_includes(["a", "b"], {"a": 0, "b": 0}, 2, 8) == [["a"], ["b"]]
+
+
+def test_include_costs(monkeypatch, tmp_path):
+    (tmp_path / "small.cpp").write_text("int a;\n")
+    (tmp_path / "large.cpp").write_text('#include "a.h"\n' + "int b;\n" * 1000)
+    (tmp_path / "measured.cpp").write_text("int c;\n")
+    monkeypatch.setattr(scu_builders, "base_folder_path", str(tmp_path) + "/")
+    includes = ['#include "small.cpp"', '#include "large.cpp"', '#include "measured.cpp"']
+
+    costs = get_include_costs(includes)
+    assert costs[includes[1]] > costs[includes[0]] == costs[includes[2]]
+
+    # Known compile times are used as is, and estimates are scaled to match them.
+    monkeypatch.setattr(scu_builders, "_compile_times", {"measured.cpp": 2.0})
+    costs = get_include_costs(includes)
+    assert costs[includes[2]] == 2.0
+    assert costs[includes[0]] == 2.0
+
+
+def test_find_files_in_folder(monkeypatch, tmp_path):
+    (tmp_path / "folder" / "sub").mkdir(parents=True)
+    for name in ["b.cpp", "a.cpp", "skip.cpp", "a.gen.cpp", ".hidden.cpp", "a.h"]:
+        (tmp_path / "folder" / "sub" / name).write_text("")
+    monkeypatch.setattr(scu_builders, "base_folder_path", str(tmp_path) + "/")
+
+    includes, exceptions = find_files_in_folder("folder", "sub", "cpp", ["skip"])
+    assert includes == ['#include "folder/sub/a.cpp"', '#include "folder/sub/b.cpp"']
+    assert exceptions == ['#include "folder/sub/skip.cpp"']
+
+
+def test_write_output_files(tmp_path):
+    output_folder = str(tmp_path / "scu") + "/"
+    write_output_files(output_folder, {"scu_a.gen.cpp": "a\n", "scu_b.gen.cpp": "b\n"}, "cpp")
+    os.utime(output_folder + "scu_a.gen.cpp", (0, 0))
+    os.utime(output_folder + "scu_b.gen.cpp", (0, 0))
+
+    # Unchanged files aren't rewritten, changed ones are even when their size is the same,
+    # and stale ones are removed.
+    write_output_files(output_folder, {"scu_a.gen.cpp": "a\n", "scu_c.gen.cpp": "c\n"}, "cpp")
+    assert os.stat(output_folder + "scu_a.gen.cpp").st_mtime == 0
+    assert sorted(os.listdir(output_folder)) == ["scu_a.gen.cpp", "scu_c.gen.cpp"]
+    write_output_files(output_folder, {"scu_a.gen.cpp": "b\n", "scu_c.gen.cpp": "c\n"}, "cpp")
+    assert (tmp_path / "scu" / "scu_a.gen.cpp").read_text() == "b\n"
+
+
+def test_partition_includes_conflicts():
+    costs = {"a": 1, "b": 1, "c": 1}
+    # Conflicting includes are split, even if it takes more groups than requested.
+    assert partition_includes(list(costs), costs, 1, 8, {"a": {"b"}, "b": {"a"}}) == [["a", "c"], ["b"]]
+
+
+def test_file_symbols(tmp_path):
+    (tmp_path / "a.cpp").write_text(
+        """#include "a.h"
+#define LOCAL_MACRO(x) (x + 1)
+#define UNDEFINED_MACRO 1
+#undef UNDEFINED_MACRO
+
+static int counter = 0; // static int commented;
+const float RATIO = 0.5f;
+static void helper(const String &p_name, int p_count = 2) {
+	static int inner = 1;
+}
+static void helper(float p_value);
+void Node::method() {}
+struct Local {
+	static int member;
+};
+struct Declared;
+namespace {
+int anonymous_value = 1;
+}
+namespace Named {
+typedef int (*Callback)(int);
+using Alias = int;
+} // namespace Named
+using Other::name;
+"""
+    )
+    assert scu_builders.get_file_symbols(str(tmp_path / "a.cpp")) == {
+        ("macro", "LOCAL_MACRO", "(x) (x + 1)"),
+        ("symbol", "counter", ""),
+        ("symbol", "RATIO", ""),
+        ("symbol", "helper", "( const String & , int )"),
+        ("symbol", "helper", "( float )"),
+        ("symbol", "Local", ""),
+        ("symbol", "anonymous_value", ""),
+        ("symbol", "Named::Callback", ""),
+        ("symbol", "Named::Alias", ""),
+        ("using", "name", "Other::name"),
+    }
+
+
+def test_include_conflicts(monkeypatch, tmp_path):
+    files = {
+        "a.cpp": "static void helper(int p_value) {}\n#define SIZE 1\n",
+        "b.cpp": "static void helper(float p_value) {}\n#define SIZE 1\n",
+        "c.cpp": "static void helper(int p_other);\n",
+        "d.cpp": "#define SIZE 2\n",
+        "e.cpp": "static const int SIZE = 3;\n",
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+    monkeypatch.setattr(scu_builders, "base_folder_path", str(tmp_path) + "/")
+    monkeypatch.setattr(scu_builders, "_symbols_cache", {})
+
+    includes = {name: f'#include "{name}"' for name in files}
+    conflicts = scu_builders.get_include_conflicts(list(includes.values()))
+    # Overloads and identical macros don't conflict, unlike the same function or a macro
+    # with another definition or with the name of a symbol.
+    assert conflicts == {
+        includes["a.cpp"]: {includes["c.cpp"], includes["d.cpp"], includes["e.cpp"]},
+        includes["b.cpp"]: {includes["d.cpp"], includes["e.cpp"]},
+        includes["c.cpp"]: {includes["a.cpp"]},
+        includes["d.cpp"]: {includes["a.cpp"], includes["b.cpp"], includes["e.cpp"]},
+        includes["e.cpp"]: {includes["a.cpp"], includes["b.cpp"], includes["d.cpp"]},
+    }
+
+
+def test_discover_sections(monkeypatch, tmp_path):
+    module = tmp_path / "modules" / "example"
+    for folder in ["", "editor", "single", "thirdparty"]:
+        (module / folder).mkdir(parents=True, exist_ok=True)
+        for name in ["a.cpp", "b.cpp"] if folder != "single" else ["a.cpp"]:
+            (module / folder / name).write_text("")
+    (module / "SCsub").write_text(
+        'env_example.add_source_files(env.modules_sources, "*.cpp")\n'
+        'env_example.add_source_files(env.modules_sources, "editor/*.cpp")\n'
+        'env_example.add_source_files(env.modules_sources, "single/*.cpp")\n'
+        'env_example.add_source_files(env.modules_sources, "missing/*.cpp")\n'
+        'env_example.add_source_files(env.modules_sources, ["listed.cpp"])\n'
+    )
+    (module / "thirdparty" / "SCsub").write_text('env.add_source_files(env.modules_sources, "*.cpp")\n')
+    monkeypatch.setattr(scu_builders, "base_folder_path", str(tmp_path) + "/")
+
+    assert scu_builders.find_source_folders("modules") == {
+        "modules/example": "cpp",
+        "modules/example/editor": "cpp",
+        "modules/example/single": "cpp",
+    }
+    # Folders with a single file aren't worth unifying.
+    assert scu_builders.discover_sections(["modules/example"], []) == [
+        (["modules/example"], [], 0, "cpp"),
+        (["modules/example/editor"], [], 0, "cpp"),
+    ]
+    assert scu_builders.discover_sections(["modules/example"], ["modules/example"]) == []
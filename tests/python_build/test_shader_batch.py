@@ -0,0 +1,67 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("SCons")
+
+ROOT = Path(__file__).parent.parent.parent
+
+SCONSTRUCT = f"""\
+import sys
+sys.path.insert(0, {str(ROOT)!r})
+import glsl_builders
+import methods
+
+env = Environment(verbose=False)
+# Files are changed within the same second as the previous build, unlike with MD5-timestamp.
+env.Decider("content")
+env.Append(
+    BUILDERS={{
+        "GLSL_HEADER": env.Builder(
+            action=methods.Run(env, glsl_builders.build_raw_headers, batch=True),
+            source_scanner=methods.get_shader_include_scanner(glsl_builders.preprocess_raw_source),
+            suffix="glsl.gen.h",
+            src_suffix=".glsl",
+        )
+    }}
+)
+for name in ["a", "b", "c"]:
+    env.Clone().GLSL_HEADER(name + ".glsl")
+"""
+
+
+def build(path):
+    output = subprocess.run(
+        [sys.executable, "-m", "SCons", "-Q", "-j4"], cwd=path, capture_output=True, text=True, check=True
+    ).stdout
+    return sorted(line.split("(", 1)[1].split("]", 1)[0] for line in output.splitlines() if "build_raw_headers" in line)
+
+
+def test_batch_implicit_deps(tmp_path):
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.glsl").write_text(f'#include "{name}_inc.glsl"\nvoid main() {{}}\n')
+        (tmp_path / f"{name}_inc.glsl").write_text(f"// {name}\n")
+    (tmp_path / "SConstruct").write_text(SCONSTRUCT)
+
+    # Missing headers are generated by a single action.
+    assert build(tmp_path) == ['["a.glsl.gen.h", "b.glsl.gen.h", "c.glsl.gen.h"']
+    # Each keeps only the includes of its own source, so they're all up to date...
+    assert build(tmp_path) == []
+    # ...and only rebuilt when one of these changes.
+    (tmp_path / "b_inc.glsl").write_text("// changed\n")
+    assert build(tmp_path) == ['["b.glsl.gen.h"']
+
+
+def test_batch_node_internals():
+    # `methods.split_batch_implicit_deps` relies on these.
+    from SCons.Node import Node
+
+    node, first, second = Node(), Node(), Node()
+    node.add_to_implicit([first])
+    assert node.children(scan=False) == [first]
+    node.implicit = None
+    node.add_to_implicit([second])
+    assert node.implicit == [second]
+    assert node.children(scan=False) == [second]
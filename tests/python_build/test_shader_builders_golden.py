@@ -0,0 +1,13 @@
+import pytest
+
+from misc.scripts.benchmark_shader_builders import BUILDERS, ROOT, compare_digests, load_golden, run_builder
+
+
+@pytest.mark.parametrize("builder", list(BUILDERS))
+def test_shader_builders_golden(builder, tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    digests = run_builder(builder, str(tmp_path))[0]
+    assert digests
+
+    # Run `misc/scripts/benchmark_shader_builders.py --update` after intended changes of the output.
+    assert compare_digests(load_golden()[builder], digests) == []
@@ -0,0 +1,55 @@
+from methods import get_shader_code_size, minify_shader_lines
+
+
+def test_minify_shader_lines():
+    lines = [
+        "#version 450",
+        "",
+        "/* Block comment",
+        "   spanning lines. */",
+        "layout(set = 0, binding = 0) uniform sampler2D source; // Input.",
+        "",
+        "void main() {",
+        "\tvec4 color = texture(source, uv) /* inline */ * 2.0;",
+        "\t#ifdef USE_ALPHA",
+        "\tcolor.a = 1.0;",
+        "\t#endif",
+        "}",
+    ]
+    minified = minify_shader_lines(lines)
+
+    # Lines are kept so compiler errors point to the right place.
+    assert len(minified) == len(lines)
+    assert minified == [
+        "#version 450",
+        "",
+        "",
+        "",
+        "layout(set = 0, binding = 0) uniform sampler2D source;",
+        "",
+        "void main() {",
+        "vec4 color = texture(source, uv) * 2.0;",
+        " #ifdef USE_ALPHA",
+        "color.a = 1.0;",
+        " #endif",
+        "}",
+    ]
+    assert get_shader_code_size(minified) < get_shader_code_size(lines)
+
+
+def test_minify_shader_lines_continuation():
+    lines = [
+        "#define SQUARE(x) \\",
+        "\t((x) * (x))",
+        "#define NOT_CONTINUED \\ ",
+    ]
+    assert minify_shader_lines(lines) == [
+        "#define SQUARE(x) \\",
+        "((x) * (x))",
+        "#define NOT_CONTINUED \\ ",
+    ]
+
+
+def test_minify_shader_lines_comment_tokens():
+    # Comments separate tokens, and comment markers inside comments are ignored.
+    assert minify_shader_lines(["int/**/a; /* // */ int b; // /* c", "int d;"]) == ["int a; int b;", "int d;"]
@@ -0,0 +1,49 @@
+import os
+
+from glsl_builders import (
+    RD_POOL_HEADER,
+    RDHeaderStruct,
+    build_rd_header,
+    build_rd_pool_header,
+    get_rd_pool_name,
+    get_rd_pool_pieces,
+    get_rd_stage_pieces,
+)
+from methods import to_raw_cstring
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "rd_glsl")
+
+
+def test_rd_stage_pieces():
+    lines = ["a", "b", "c", "d"]
+    assert get_rd_stage_pieces(lines, [(1, 3, "x_0")]) == [(None, ["a"]), ("x_0", ["b", "c"]), (None, ["d"])]
+    assert get_rd_stage_pieces(lines, [(0, 4, "x_0")]) == [("x_0", lines)]
+    # Like the embedded code of an empty stage, which is a newline.
+    assert get_rd_stage_pieces([], []) == [(None, [])]
+
+
+def test_rd_pool(tmp_path):
+    shader = os.path.join(FIXTURES, "vertex_fragment.glsl")
+    included = os.path.relpath(os.path.join(FIXTURES, "_included.glsl"))
+    name = get_rd_pool_name(included, 0)
+
+    plain = RDHeaderStruct()
+    build_rd_header(shader, str(tmp_path / "plain.glsl.gen.h"), plain)
+    pooled = RDHeaderStruct()
+    build_rd_header(shader, str(tmp_path / "pooled.glsl.gen.h"), pooled, pool=True)
+    assert pooled.__dict__ == plain.__dict__
+
+    output = (tmp_path / "pooled.glsl.gen.h").read_text()
+    assert f'#include "{RD_POOL_HEADER}"' in output
+    assert (
+        f"static const char *const _vertex_code[] = {{ _vertex_code_0, ShaderRDPool::{name}, _vertex_code_1, nullptr }};"
+        in output
+    )
+    assert "static const char *const _fragment_code[] = { _fragment_code_0, nullptr };" in output
+
+    build_rd_pool_header([shader], str(tmp_path / "pool.gen.h"))
+    assert get_rd_pool_pieces(included) == [["#define M_PI 3.14159265359"]]
+    assert (
+        f"inline constexpr char {name}[] = {{\n{to_raw_cstring(['#define M_PI 3.14159265359'])}\n}};"
+        in (tmp_path / "pool.gen.h").read_text()
+    )
@@ -0,0 +1,40 @@
+import os
+
+from glsl_builders import RDHeaderStruct, include_file_in_rd_header
+from methods import get_shader_source
+
+
+def test_shader_source_cache(tmp_path):
+    calls = []
+
+    def preprocess(filename, lines):
+        calls.append(filename)
+        return lines
+
+    path = tmp_path / "shader.glsl"
+    path.write_text("void main() {}\n", encoding="utf-8")
+
+    assert get_shader_source(str(path), preprocess) == ["void main() {}\n"]
+    assert get_shader_source(str(path), preprocess) == ["void main() {}\n"]
+    assert len(calls) == 1
+
+    # Changes are picked up from the modification time and size.
+    path.write_text("void main() { return; }\n", encoding="utf-8")
+    assert get_shader_source(str(path), preprocess) == ["void main() { return; }\n"]
+    assert len(calls) == 2
+
+
+def test_shader_source_cache_shared_include(tmp_path):
+    include = tmp_path / "common_inc.glsl"
+    include.write_text("#define A 1\n", encoding="utf-8")
+    for name in ["a.glsl", "b.glsl"]:
+        (tmp_path / name).write_text('#[compute]\n#include "common_inc.glsl"\nvoid main() {}\n', encoding="utf-8")
+
+    a = include_file_in_rd_header(str(tmp_path / "a.glsl"), RDHeaderStruct(), 0)
+    assert a.compute_lines == ["#define A 1", "void main() {}"]
+    assert a.compute_included_files == [os.path.relpath(include)]
+
+    include.write_text("#define A 2\n", encoding="utf-8")
+    os.utime(include, ns=(0, 0))
+    b = include_file_in_rd_header(str(tmp_path / "b.glsl"), RDHeaderStruct(), 0)
+    assert b.compute_lines == ["#define A 2", "void main() {}"]
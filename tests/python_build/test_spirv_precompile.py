@@ -0,0 +1,40 @@
+import shutil
+
+import pytest
+
+from glsl_builders import RD_SPIRV_DRIVER_DEFINES, get_rd_variant_source
+from methods import SPIRVCompiler
+
+
+def test_rd_variant_source():
+    lines = ["#version 450", "", "#VERSION_DEFINES", "", "void main() {}"]
+
+    # Matches the source `ShaderRD::_build_variant_code` builds from the embedded code.
+    assert get_rd_variant_source(lines, "\n#define MODE_A\n") == (
+        "#version 450\n\n" + "\n\n#define MODE_A\n\n" + RD_SPIRV_DRIVER_DEFINES + "\nvoid main() {}\n\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "#CODE : FRAGMENT",
+        "#MATERIAL_UNIFORMS",
+        '#include "built_in.glsl"',
+        "#ifdef has_VK_KHR_multiview",
+    ],
+)
+def test_rd_variant_source_runtime_dependent(line):
+    assert get_rd_variant_source(["#version 450", "#VERSION_DEFINES", line, "void main() {}"], "") is None
+
+
+@pytest.mark.skipif(shutil.which("glslangValidator") is None, reason="glslangValidator not found")
+def test_spirv_compiler_cache(tmp_path):
+    source = get_rd_variant_source(
+        ["#version 450", "#VERSION_DEFINES", "layout(local_size_x = 1) in;", "void main() {}"], ""
+    )
+    compiler = SPIRVCompiler(shutil.which("glslangValidator"), "test", str(tmp_path))
+
+    spirv, hit = compiler.compile("compute", source)
+    assert spirv[:4] == b"\x03\x02\x23\x07" and not hit
+    assert compiler.compile("compute", source) == (spirv, True)
@@ -0,0 +1,47 @@
+import gettext
+import io
+import struct
+from pathlib import Path
+
+from editor.editor_builders import compile_po, parse_po
+
+SAMPLE_PO = Path(__file__).parent / "fixtures" / "translations" / "sample.po"
+
+
+def test_parse_po():
+    with open(SAMPLE_PO, "rb") as f:
+        messages = parse_po(f.read())
+
+    assert messages[b"Open"] == b"Ouvrir"
+    assert messages[b"Locale\x04Language"] == b"Langue"
+    assert messages[b"%d file\0%d files"] == b"%d fichier\0%d fichiers"
+    assert messages[b'Multi-line "quoted"\nmessage'] == 'Message "cité"\nsur plusieurs lignes\tavec tabulation'.encode()
+    assert messages[b""].startswith(b"Project-Id-Version: Godot Engine editor interface\n")
+    # Fuzzy, untranslated and obsolete messages are left out.
+    assert len(messages) == 5
+
+
+def test_compile_po():
+    with open(SAMPLE_PO, "rb") as f:
+        mo = compile_po(f.read())
+
+    magic, revision, count, originals, translations, hash_size, hash_offset = struct.unpack("<7I", mo[:28])
+    assert (magic, revision, count, originals, translations) == (0x950412DE, 0, 5, 28, 68)
+    # No hash table, like `msgfmt --no-hash`.
+    assert hash_size == 0
+    assert hash_offset == 108
+
+    # Originals are sorted, so they can be looked up with a binary search.
+    keys = []
+    for i in range(count):
+        length, offset = struct.unpack("<2I", mo[originals + i * 8 : originals + i * 8 + 8])
+        assert mo[offset + length] == 0
+        keys.append(mo[offset : offset + length])
+    assert keys == sorted(keys)
+
+    translation = gettext.GNUTranslations(io.BytesIO(mo))
+    assert translation.gettext("Open") == "Ouvrir"
+    assert translation.pgettext("Locale", "Language") == "Langue"
+    assert translation.ngettext("%d file", "%d files", 2) == "%d fichiers"
+    assert translation.gettext("Save") == "Save"
+    assert translation.gettext("Quit") == "Quit"